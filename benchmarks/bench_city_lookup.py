@@ -0,0 +1,205 @@
+# benchmarks/bench_city_lookup.py
+"""
+Measure latest-snapshot lookup latency with a long update history, before
+and after the case-insensitive and (city_id, date) indexes, and against the
+denormalized city_latest_costs table.
+
+The data is seeded into a scratch schema (numbeo_bench by default) created
+from sql/numbeo_data/schema/init.sql, so numbeo_col is left untouched. The
+scratch schema is dropped afterwards unless --keep is given.
+
+    python -m benchmarks.bench_city_lookup --cities 10000 --updates 100
+"""
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from src.data.numbeo.fetcher import LATEST_SNAPSHOT_QUERY
+from src.utils.database import close_db_pools, get_numbeo_db_connection
+
+SCHEMA_PATH = Path(__file__).parent.parent / 'sql' / 'numbeo_data' / 'schema' / 'init.sql'
+
+# The lookup as it was before the indexes: MAX(update_id) over every update
+# of the city, then one join per cost table
+LEGACY_QUERY = """
+    WITH latest_update AS (
+        SELECT c.city_id, MAX(u.update_id) as update_id
+        FROM numbeo_col.cities c
+        JOIN numbeo_col.updates u ON c.city_id = u.city_id
+        WHERE LOWER(c.city_name) = LOWER(%s)
+        AND LOWER(c.country) = LOWER(%s)
+        GROUP BY c.city_id
+    )
+    SELECT 
+        c.city_name,
+        c.country,
+        c.region,
+        r.cheap_meal_for_one,
+        m.milk_one_liter,
+        t.monthly_transit_pass,
+        ut.all_basic as utilities_basic,
+        rent.apt_one_bdrm_ctr as rent_1br_center,
+        u.date as last_updated
+    FROM latest_update lu
+    JOIN numbeo_col.cities c ON lu.city_id = c.city_id
+    JOIN numbeo_col.updates u ON lu.update_id = u.update_id
+    LEFT JOIN numbeo_col.restaurant_cost_sets r ON lu.update_id = r.update_id
+    LEFT JOIN numbeo_col.market_cost_sets m ON lu.update_id = m.update_id
+    LEFT JOIN numbeo_col.transportation_cost_sets t ON lu.update_id = t.update_id
+    LEFT JOIN numbeo_col.utilities_cost_sets ut ON lu.update_id = ut.update_id
+    LEFT JOIN numbeo_col.rent_cost_sets rent ON lu.update_id = rent.update_id
+    WHERE c.city_id = (
+        SELECT city_id FROM latest_update
+    )
+"""
+
+# The lookup before city_latest_costs: newest update per city through
+# idx_updates_city_date, then one join per cost table
+LATERAL_QUERY = """
+    SELECT 
+        c.city_name,
+        c.country,
+        c.region,
+        r.cheap_meal_for_one,
+        m.milk_one_liter,
+        t.monthly_transit_pass,
+        ut.all_basic as utilities_basic,
+        rent.apt_one_bdrm_ctr as rent_1br_center,
+        u.date as last_updated
+    FROM numbeo_col.cities c
+    CROSS JOIN LATERAL (
+        SELECT update_id, date
+        FROM numbeo_col.updates
+        WHERE city_id = c.city_id
+        ORDER BY date DESC, update_id DESC
+        LIMIT 1
+    ) u
+    LEFT JOIN numbeo_col.restaurant_cost_sets r ON u.update_id = r.update_id
+    LEFT JOIN numbeo_col.market_cost_sets m ON u.update_id = m.update_id
+    LEFT JOIN numbeo_col.transportation_cost_sets t ON u.update_id = t.update_id
+    LEFT JOIN numbeo_col.utilities_cost_sets ut ON u.update_id = ut.update_id
+    LEFT JOIN numbeo_col.rent_cost_sets rent ON u.update_id = rent.update_id
+    WHERE LOWER(c.city_name) = LOWER(%s)
+    AND LOWER(c.country) = LOWER(%s)
+"""
+
+NEW_INDEXES = ['idx_cities_name_country_key', 'idx_updates_city_date']
+
+def in_schema(statement: str, schema: str) -> str:
+    return statement.replace('numbeo_col', schema)
+
+def schema_statements(schema: str) -> Tuple[str, List[str], str]:
+    """
+    init.sql retargeted at the scratch schema, without the new indexes or
+    the city_latest_costs backfill, which are returned separately
+    """
+    ddl = in_schema(SCHEMA_PATH.read_text(), schema)
+    # Drop the CREATE INDEX statements; they are added by the benchmark itself
+    create_indexes = re.findall(r'CREATE (?:UNIQUE )?INDEX IF NOT EXISTS [^;]+;', ddl)
+    for statement in create_indexes:
+        ddl = ddl.replace(statement, '')
+    # The backfill only has something to copy once the data is seeded
+    backfill = re.search(rf'INSERT INTO {schema}\.city_latest_costs [^;]+;', ddl).group(0)
+    ddl = ddl.replace(backfill, '')
+    return ddl, create_indexes, backfill
+
+async def seed(cur, schema: str, cities: int, updates: int) -> None:
+    await cur.execute(f"""
+        INSERT INTO {schema}.cities (city_name, country, region)
+        SELECT 'City ' || i, 'Country ' || (i %% 200), ''
+        FROM generate_series(1, %s) i
+    """, (cities,))
+    await cur.execute(f"""
+        INSERT INTO {schema}.updates (city_id, date)
+        SELECT c.city_id, TIMESTAMP '2020-01-01' + n * INTERVAL '1 day' + c.city_id * INTERVAL '1 second'
+        FROM {schema}.cities c, generate_series(1, %s) n
+    """, (updates,))
+    for table, columns in (('restaurant_cost_sets', 'cheap_meal_for_one'),
+                           ('rent_cost_sets', 'apt_one_bdrm_ctr')):
+        await cur.execute(f"""
+            INSERT INTO {schema}.{table} (update_id, {columns})
+            SELECT update_id, (update_id % 90) + 5 FROM {schema}.updates
+        """)
+
+async def time_lookups(cur, query: str, names: List[tuple]) -> List[float]:
+    latencies = []
+    # Prepared, as in get_local_city_data
+    for city, country in names:
+        start = time.perf_counter()
+        await cur.execute(query, (city, country), prepare=True)
+        await cur.fetchone()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def summary(name: str, latencies: List[float]) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    return (
+        f"{name:<32} mean {statistics.mean(latencies) * 1000:8.3f} ms   "
+        f"p95 {p95 * 1000:8.3f} ms"
+    )
+
+async def execute(*statements: str) -> None:
+    """Run statements in autocommit mode"""
+    async with get_numbeo_db_connection() as conn:
+        await conn.set_autocommit(True)
+        async with conn.cursor() as cur:
+            for statement in statements:
+                await cur.execute(statement)
+
+async def timed_phase(label: str, queries: dict, names: List[tuple]) -> None:
+    """Time each query on a fresh connection, so no plans carry over"""
+    for name, query in queries.items():
+        await close_db_pools()
+        async with get_numbeo_db_connection() as conn:
+            async with conn.cursor() as cur:
+                print(summary(f"{label}: {name}", await time_lookups(cur, query, names)))
+
+async def main(schema: str, cities: int, updates: int, lookups: int, keep: bool) -> None:
+    ddl, create_indexes, backfill = schema_statements(schema)
+    queries = {
+        'legacy query': in_schema(LEGACY_QUERY, schema),
+        'LATERAL query': in_schema(LATERAL_QUERY, schema),
+        'city_latest_costs': in_schema(LATEST_SNAPSHOT_QUERY, schema),
+    }
+    names = [(f"city {i}", f"COUNTRY {i % 200}")
+             for i in random.sample(range(1, cities + 1), min(lookups, cities))]
+    analyze = [f"VACUUM ANALYZE {schema}.{table}"
+               for table in ('cities', 'updates', 'city_latest_costs')]
+
+    try:
+        await execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE", ddl)
+        print(f"Seeding {cities} cities x {updates} updates into {schema}...")
+        async with get_numbeo_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await seed(cur, schema, cities, updates)
+        await execute(backfill, *analyze)
+        await timed_phase("before", queries, names)
+
+        await execute(*create_indexes, *analyze)
+        await timed_phase("after", queries, names)
+
+        async with get_numbeo_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("EXPLAIN " + queries['city_latest_costs'], names[0])
+                plan = "\n".join(row[0] for row in await cur.fetchall())
+        print(f"\nPlan with indexes:\n{plan}")
+    finally:
+        if not keep:
+            await execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        await close_db_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark latest-snapshot lookups")
+    parser.add_argument('--schema', default='numbeo_bench')
+    parser.add_argument('--cities', type=int, default=10000)
+    parser.add_argument('--updates', type=int, default=100)
+    parser.add_argument('--lookups', type=int, default=500)
+    parser.add_argument('--keep', action='store_true', help="keep the scratch schema")
+    args = parser.parse_args()
+    asyncio.run(main(args.schema, args.cities, args.updates, args.lookups, args.keep))
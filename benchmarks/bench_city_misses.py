@@ -0,0 +1,85 @@
+# benchmarks/bench_city_misses.py
+"""
+Time repeated lookups of cities Numbeo has no page for, with and without
+the negative cache in front of the scraper.
+
+--cities made-up cities are each looked up --repeat times against the
+local stub of Numbeo, which answers them with a 404 after --numbeo-latency
+seconds. Without the cache every lookup scrapes again, as before; with it
+the first lookup scrapes and records the miss, and the others are answered
+from the in-process cache, or from numbeo_col.city_misses by a process
+that has not seen the miss yet. Runs in the scratch databases of
+bench_e2e.
+
+    python -m benchmarks.bench_city_misses --cities 20 --repeat 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List, Tuple
+
+from benchmarks.bench_e2e import scratch_databases
+from benchmarks.stub_numbeo import StubNumbeoServer
+from src.data.numbeo import fetcher, scraper
+
+async def timed_lookups(lookup: Callable[[str, str], Awaitable[object]],
+                        cities: List[Tuple[str, str]], repeat: int) -> List[float]:
+    """Look every city up repeat times, one after the other; returns the latencies"""
+    times = []
+    for _ in range(repeat):
+        for city, country in cities:
+            start = time.perf_counter()
+            result = await lookup(city, country)
+            times.append(time.perf_counter() - start)
+            assert result is None, city
+    return times
+
+async def uncached_lookup(city: str, country: str) -> object:
+    """What fetch_city_data did for a city it could not find, before the cache"""
+    await fetcher.get_local_city_data(city, country)
+    return (await scraper.scrape_city(city))[1]
+
+def report(name: str, times: List[float], requests: int) -> None:
+    times = sorted(times)
+    p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+    print(f"{name:<36} {statistics.median(times) * 1000:9.3f} {p99 * 1000:9.3f} "
+          f"{requests / len(times):10.2f}")
+
+async def main(args: argparse.Namespace) -> None:
+    scraper.SCRAPER_CONFIG.update(min_delay=0, max_delay=0)
+    cities = [(f"Nowhere {i}", "Atlantis") for i in range(args.cities)]
+    async with scratch_databases():
+        async with StubNumbeoServer(latency=args.numbeo_latency) as numbeo:
+            scraper.SCRAPER_CONFIG['base_url'] = numbeo.base_url
+            try:
+                print(f"{args.cities} unknown cities x {args.repeat} lookups, "
+                      f"{args.numbeo_latency * 1000:.0f} ms Numbeo latency\n")
+                print(f"{'':<36} {'p50 ms':>9} {'p99 ms':>9} {'scrapes/lookup':>10}")
+
+                times = await timed_lookups(uncached_lookup, cities, args.repeat)
+                report("without the negative cache", times, numbeo.requests)
+
+                numbeo.requests = 0
+                first = await timed_lookups(fetcher.fetch_city_data, cities, 1)
+                report("first lookup, scraped and recorded", first, numbeo.requests)
+
+                numbeo.requests = 0
+                times = await timed_lookups(fetcher.fetch_city_data, cities, args.repeat)
+                report("repeat lookups, in-process cache", times, numbeo.requests)
+
+                # Another process knows the misses only from the table
+                numbeo.requests = 0
+                fetcher._city_misses.clear()
+                times = await timed_lookups(fetcher.fetch_city_data, cities, 1)
+                report("first lookup in another process", times, numbeo.requests)
+            finally:
+                await scraper.close_scraper_session()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the cache of cities Numbeo cannot serve")
+    parser.add_argument('--cities', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--numbeo-latency', type=float, default=0.1,
+                        help="seconds the stub takes to answer")
+    asyncio.run(main(parser.parse_args()))
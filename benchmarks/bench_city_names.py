@@ -0,0 +1,85 @@
+# benchmarks/bench_city_names.py
+"""
+Time lookups in the city name index over --cities synthetic names:
+building it, exact, prefix and fuzzy lookups, and how often a name with
+one typo (a letter dropped, doubled, swapped with the next or replaced)
+gets the intended city as the first suggestion.
+
+    python -m benchmarks.bench_city_names --cities 10000 --lookups 5000
+"""
+import argparse
+import random
+import string
+import time
+from typing import Callable, List, Tuple
+
+from src.data.numbeo.names import CityNames
+
+SYLLABLES = [
+    consonant + vowel
+    for consonant in 'bcdfghklmnprstvz'
+    for vowel in 'aeiou'
+] + ['ber', 'lin', 'ton', 'burg', 'ville', 'port', 'stad', 'grad', 'polis', 'holm']
+
+def synthetic_cities(cities: int, rng: random.Random) -> List[Tuple[str, str]]:
+    names = set()
+    while len(names) < cities:
+        words = [
+            ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+            for _ in range(1 if rng.random() < 0.8 else 2)
+        ]
+        names.add(' '.join(words))
+    return [(name, f"Country {i % 200}") for i, name in enumerate(sorted(names))]
+
+def typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(name) - 1)
+    kind = rng.choice(('drop', 'double', 'swap', 'replace'))
+    if kind == 'drop':
+        return name[:i] + name[i + 1:]
+    if kind == 'double':
+        return name[:i] + name[i] + name[i:]
+    if kind == 'swap':
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+def percentiles(name: str, fn: Callable[[str], object], queries: List[str]) -> str:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    return f"{name:<9} p50 {p50 * 1e6:8.1f} us   p99 {p99 * 1e6:8.1f} us"
+
+def main(cities: int, lookups: int, seed: int) -> None:
+    rng = random.Random(seed)
+    pairs = synthetic_cities(cities, rng)
+    start = time.perf_counter()
+    names = CityNames(pairs)
+    print(f"build: {len(names.cities)} city names in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    sample = [rng.choice(pairs) for _ in range(lookups)]
+    exact = [city for city, _ in sample]
+    prefixes = [city[:rng.randint(2, 5)] for city in exact]
+    typos = [typo(city, rng) for city in exact]
+    print(percentiles("exact", names.is_known_city, exact))
+    print(percentiles("prefix", lambda query: names.cities.prefix(query, 10), prefixes))
+    print(percentiles("fuzzy", lambda query: names.suggest_cities(query, 5), typos))
+    print(percentiles("complete", lambda query: names.cities.complete(query, 10), prefixes))
+
+    first = sum(
+        1 for query, pair in zip(typos, sample) if names.suggest_cities(query, 1)[:1] == [pair]
+    )
+    listed = sum(1 for query, pair in zip(typos, sample) if pair in names.suggest_cities(query, 5))
+    print(f"\none typo: intended city first in {first / lookups:.1%}, "
+          f"among 5 suggestions in {listed / lookups:.1%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the city name index")
+    parser.add_argument('--cities', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    main(args.cities, args.lookups, args.seed)
@@ -0,0 +1,156 @@
+# benchmarks/bench_city_snapshot.py
+"""
+Compare city lookups served from the memory-mapped snapshot with lookups
+from Postgres: export time and file size, startup time of a worker
+mapping the file, lookup latency, and the memory a worker needs to serve
+every city without touching the database.
+
+--cities cities with every cost column filled are seeded into scratch
+databases created from sql/ (see bench_e2e). Memory is measured in fresh
+worker processes that look up every city once: through the snapshot, or
+through the database into a snapshot cache large enough to keep them all.
+RssFile is mostly the mapped file, whose pages are shared by all workers
+on the machine; RssAnon is private to each worker.
+
+    python -m benchmarks.bench_city_snapshot --cities 10000 --lookups 2000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.bench_e2e import scratch_databases
+from src.data.numbeo import fetcher
+from src.data.numbeo.snapshot import ITEM_COLUMNS, SNAPSHOT_CONFIG, CitySnapshot, export_snapshot
+from src.utils.database import NUMBEO_DB_CONFIG, close_db_pools, get_numbeo_db_connection
+
+def city_names(cities: int) -> List[Tuple[str, str]]:
+    return [(f"City {i}", f"Country {i % 200}") for i in range(1, cities + 1)]
+
+async def seed(cities: int) -> None:
+    columns = ', '.join(ITEM_COLUMNS)
+    # Small values fit every DECIMAL column
+    values = ', '.join(f"round((random() * 90 + 5)::numeric, 2)" for _ in ITEM_COLUMNS)
+    async with get_numbeo_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                INSERT INTO numbeo_col.cities (city_name, country, region)
+                SELECT 'City ' || i, 'Country ' || (i %% 200), ''
+                FROM generate_series(1, %s) i
+            """, (cities,))
+            await cur.execute("""
+                INSERT INTO numbeo_col.updates (city_id, date)
+                SELECT city_id, CURRENT_TIMESTAMP FROM numbeo_col.cities
+            """)
+            await cur.execute(f"""
+                INSERT INTO numbeo_col.city_latest_costs (city_id, update_id, last_updated, {columns})
+                SELECT city_id, update_id, date, {values} FROM numbeo_col.updates
+            """)
+        await conn.commit()
+
+def memory() -> Dict[str, int]:
+    """RSS figures of this process in kB"""
+    status = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                status[key] = int(value.split()[0])
+    return status
+
+def measure_worker(mode: str, dbname: str, path: str, cities: int, results) -> None:
+    """Worker process: look up every city once and report the memory it took"""
+    async def run() -> None:
+        before = memory()
+        start = time.perf_counter()
+        if mode == 'snapshot':
+            snapshot = CitySnapshot(path)
+            startup = time.perf_counter() - start
+            for key in [fetcher.normalize_city_key(*name) for name in city_names(cities)]:
+                snapshot.get(key)
+        else:
+            NUMBEO_DB_CONFIG['dbname'] = dbname
+            fetcher._city_cache.max_size = cities
+            names = city_names(cities)
+            await fetcher.get_local_cities_data(names[:1])
+            startup = time.perf_counter() - start
+            for index in range(0, cities, 500):
+                await fetcher.get_local_cities_data(names[index:index + 500])
+            await close_db_pools()
+        after = memory()
+        results.put((mode, startup, {key: after[key] - before[key] for key in after}))
+    asyncio.run(run())
+
+def in_worker(mode: str, dbname: str, path: str, cities: int):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=measure_worker, args=(mode, dbname, path, cities, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def percentiles(latencies: List[float]) -> str:
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    return (f"mean {statistics.mean(latencies) * 1e6:9.1f} us   p50 {p50 * 1e6:9.1f} us   "
+            f"p99 {p99 * 1e6:9.1f} us")
+
+async def time_lookups(names: List[Tuple[str, str]], use_snapshot: bool) -> List[float]:
+    """get_local_city_data with an empty snapshot cache, as on a miss"""
+    latencies = []
+    for city, country in names:
+        fetcher.invalidate_city_cache(city, country)
+        start = time.perf_counter()
+        data = await fetcher.get_local_city_data(city, country, use_snapshot=use_snapshot)
+        latencies.append(time.perf_counter() - start)
+        assert data is not None, (city, country)
+    return latencies
+
+async def main(cities: int, lookups: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / 'city_snapshot.bin')
+        async with scratch_databases():
+            dbname = NUMBEO_DB_CONFIG['dbname']
+            print(f"Seeding {cities} cities...")
+            await seed(cities)
+
+            start = time.perf_counter()
+            await export_snapshot(path)
+            print(f"export: {time.perf_counter() - start:.2f} s, "
+                  f"{os.path.getsize(path) / 1e6:.2f} MB for {cities} cities x {len(ITEM_COLUMNS)} items")
+
+            loads = []
+            for _ in range(5):
+                start = time.perf_counter()
+                CitySnapshot(path).close()
+                loads.append(time.perf_counter() - start)
+            print(f"startup: map and index the snapshot  {statistics.median(loads) * 1000:.1f} ms")
+
+            names = random.sample(city_names(cities), min(lookups, cities))
+            SNAPSHOT_CONFIG['path'] = path
+            # Open the pool first, so the first database lookup does not pay for it
+            await time_lookups(names[:10], use_snapshot=False)
+            print(f"lookup, database:  {percentiles(await time_lookups(names, use_snapshot=False))}")
+            print(f"lookup, snapshot:  {percentiles(await time_lookups(names, use_snapshot=True))}")
+            await close_db_pools()
+
+            print(f"\nWorker memory after serving all {cities} cities once (kB):")
+            for mode in ('database', 'snapshot'):
+                mode, startup, delta = in_worker(mode, dbname, path, cities)
+                print(f"{mode:<9} VmRSS {delta['VmRSS']:>+8}   RssAnon {delta['RssAnon']:>+8}   "
+                      f"RssFile {delta['RssFile']:>+8}   first lookup ready in {startup * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the memory-mapped city snapshot")
+    parser.add_argument('--cities', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.cities, args.lookups))
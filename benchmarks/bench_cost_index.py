@@ -0,0 +1,131 @@
+# benchmarks/bench_cost_index.py
+"""
+Time the cost index engine over a synthetic world of --cities cities:
+building it from a snapshot file, computing every index of every city
+against a per-city Python loop, ranking, finding similar cities, finding
+the cities a lifestyle basket fits in, and applying one scraped city
+incrementally against rebuilding everything.
+
+Prices are drawn around a per-city price level, with --missing of them
+NULL, so indexes and similarity have something to find. No database is
+needed.
+
+    python -m benchmarks.bench_cost_index --cities 10000 --repeat 50
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from src.data.numbeo.analysis import (
+    INDEXES,
+    CostIndex,
+    basket_indexes,
+    compute_indexes,
+    lifestyle_basket
+)
+from src.data.numbeo.snapshot import ITEM_COLUMNS, CitySnapshot, write_snapshot
+
+REFERENCE = ("City 1", "Country 1")
+
+def synthetic_rows(cities: int, missing: float, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    base = {column: rng.uniform(1, 2000) for column in ITEM_COLUMNS}
+    now = datetime.now()
+    rows = []
+    for i in range(1, cities + 1):
+        level = rng.lognormvariate(0, 0.5)
+        row: Dict[str, Any] = {
+            'city_id': i, 'city_name': f"City {i}", 'country': f"Country {i % 200}",
+            'region': '', 'update_id': i, 'last_updated': now,
+        }
+        for column in ITEM_COLUMNS:
+            if rng.random() >= missing:
+                row[column] = round(base[column] * level * rng.lognormvariate(0, 0.2), 2)
+        rows.append(row)
+    # The reference has every price
+    rows[0].update({column: round(value, 2) for column, value in base.items()})
+    return rows
+
+def median_time(fn: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def report(name: str, seconds: float) -> None:
+    print(f"{name:<48} {seconds * 1000:10.3f} ms")
+
+def main(cities: int, repeat: int, missing: float, seed: int) -> None:
+    rows = synthetic_rows(cities, missing, seed)
+    rows[0].update(city_name=REFERENCE[0], country=REFERENCE[1])
+    print(f"{cities} cities x {len(ITEM_COLUMNS)} items, {missing:.0%} of prices missing\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / 'city_snapshot.bin')
+        write_snapshot(path, rows)
+        snapshot = CitySnapshot(path)
+        report("build from the snapshot file", median_time(
+            lambda: CostIndex.from_snapshot(snapshot, reference=REFERENCE), max(repeat // 10, 3)))
+        snapshot.close()
+    report("build from query rows", median_time(
+        lambda: CostIndex.from_rows(rows, reference=REFERENCE), max(repeat // 10, 3)))
+    index = CostIndex.from_rows(rows, reference=REFERENCE)
+    prices = index.prices
+    reference = prices[0]
+
+    # Every index of every city: one city at a time vs. two matrix products
+    loop_rows = rows[:max(cities // 10, 1)]
+    per_city = median_time(lambda: [basket_indexes(row, rows[0]) for row in loop_rows], 3)
+    report("all indexes, per-city loop", per_city * len(rows) / len(loop_rows))
+    report("all indexes, vectorized", median_time(lambda: compute_indexes(prices, reference), repeat))
+    for row in random.Random(seed).sample(range(cities), 100):
+        expected = basket_indexes(rows[row], rows[0])
+        got = index.indexes(rows[row]['city_name'], rows[row]['country'])
+        for name in INDEXES:
+            assert (expected[name] is None) == (got[name] is None), (row, name)
+            assert expected[name] is None or abs(expected[name] - got[name]) < 1e-6, (row, name)
+
+    report("rank: 10 cheapest overall", median_time(lambda: index.rank('overall', 10), repeat))
+    report("rank: position of one city", median_time(
+        lambda: index.position("City 2", "Country 2", 'rent'), repeat))
+
+    fresh = [CostIndex(index.names, prices, reference=REFERENCE) for _ in range(3)]
+    report("similar: first call, standardizing every city", median_time(
+        lambda: fresh.pop().similar("City 2", "Country 2", 5), 3))
+    report("similar: 5 nearest of one city", median_time(
+        lambda: index.similar("City 2", "Country 2", 5), repeat))
+
+    basket = lifestyle_basket('center', meals_out_per_week=4, transit_pass=True)
+    report("afford: 10 cities a basket fits in", median_time(
+        lambda: index.affordable(3000, basket, 10), repeat))
+
+    updated = dict(rows[1], cheap_meal_for_one=12.34)
+    # Also restandardizes the city, as similar() has been called
+    report("update one city, incremental", median_time(lambda: index.update_city(updated), repeat))
+    report("update one city, full rebuild", median_time(
+        lambda: CostIndex(index.names, index.prices, reference=REFERENCE),
+        max(repeat // 5, 3)))
+
+    print("\nCheapest overall:")
+    for (city, country), value in index.rank('overall', 3):
+        print(f"  {city}, {country}: {value:.1f}")
+    print("Most similar to City 2:")
+    for (city, country), distance in index.similar("City 2", "Country 2", 3):
+        print(f"  {city}, {country}: {distance:.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized cost index engine")
+    parser.add_argument('--cities', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--missing', type=float, default=0.1,
+                        help="share of prices that are NULL")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    main(args.cities, args.repeat, args.missing, args.seed)
@@ -0,0 +1,81 @@
+# benchmarks/bench_db_pool.py
+"""
+Compare queries/sec of the pooled async database layer against the old
+connect-per-query psycopg2 path.
+
+Run from the repository root against a configured Numbeo database:
+
+    python -m benchmarks.bench_db_pool --queries 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+import psycopg2
+
+from src.utils.database import (
+    NUMBEO_DB_CONFIG,
+    close_db_pools,
+    get_numbeo_db_connection,
+    init_db_pools,
+)
+
+QUERY = "SELECT city_id FROM numbeo_col.cities LIMIT 1"
+
+async def connect_per_query() -> None:
+    """The pre-pool path: a blocking connect, query and close on the event loop"""
+    conn = psycopg2.connect(**NUMBEO_DB_CONFIG)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(QUERY)
+            cur.fetchone()
+    finally:
+        conn.close()
+
+async def pooled_query() -> None:
+    """The pooled path used by the fetcher and CRUD functions"""
+    async with get_numbeo_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(QUERY)
+            await cur.fetchone()
+
+async def run(name: str, query: Callable[[], Awaitable[None]], total: int, concurrency: int) -> None:
+    """Issue `total` queries from `concurrency` tasks and print throughput"""
+    latencies: List[float] = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            await query()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:<20} {total / elapsed:>10.1f} q/s   "
+        f"p50 {statistics.median(latencies) * 1000:.2f} ms   p95 {p95 * 1000:.2f} ms"
+    )
+
+async def main(total: int, concurrency: int) -> None:
+    await run("connect-per-query", connect_per_query, total, concurrency)
+    await init_db_pools(wait=True)
+    try:
+        # Warm up so pool growth is not part of the measurement
+        await run("pooled (warm-up)", pooled_query, concurrency, concurrency)
+        await run("pooled", pooled_query, total, concurrency)
+    finally:
+        await close_db_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.queries, args.concurrency))
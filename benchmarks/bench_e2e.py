@@ -0,0 +1,361 @@
+# benchmarks/bench_e2e.py
+"""
+End-to-end benchmark of the bot's handlers: updates go through the real
+/profile and /relocate conversations, against a local stub of the Bot API
+and recorded Numbeo pages, with both databases in Postgres.
+
+The databases are scratch copies created from sql/*/schema/init.sql and
+the procedures next to them (named after the configured ones, with a
+_bench suffix), so every run starts from the same empty state and the
+configured databases are left untouched. They are dropped afterwards
+unless --keep is given.
+
+Scenarios, each measured on the update that does the work:
+
+- profile: every step of /profile, which also gives users a home city
+- cache_hit: picking a popular city, both cities in the snapshot cache
+- db_hit: the same with the snapshot cache emptied first
+- scrape_miss: typing a city the database has never seen, scraped from
+  the stub (the fallback page is served for unknown cities), keeping it
+  when the bot suggests a known city instead
+
+p50/p95/p99 latency and throughput are printed and written to a JSON file
+(benchmarks/results/e2e-<commit>.json by default). Pass --compare with an
+earlier file to see the change per scenario.
+
+    python -m benchmarks.bench_e2e --users 200 --concurrency 8
+    python -m benchmarks.bench_e2e --compare benchmarks/results/e2e-abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from psycopg import AsyncConnection, sql
+from telegram import Update
+from telegram.ext import Application, ApplicationBuilder
+
+from benchmarks.stub_numbeo import StubNumbeoServer
+from benchmarks.stub_telegram import (
+    StubTelegramServer,
+    make_callback_update,
+    make_message_update
+)
+from src.bot.handlers.profile import get_profile_handler
+from src.bot.handlers.relocation import get_relocation_handler
+from src.data.numbeo import scraper
+from src.data.numbeo.fetcher import fetch_city_data, invalidate_city_cache
+from src.data.users.writer import start_user_writer, stop_user_writer
+from src.utils.database import NUMBEO_DB_CONFIG, USER_DB_CONFIG, close_db_pools
+
+ROOT = Path(__file__).parent.parent
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+SCRIPTS = {
+    'numbeo': [
+        ROOT / 'sql' / 'numbeo_data' / 'schema' / 'init.sql',
+        ROOT / 'sql' / 'numbeo_data' / 'procedures' / 'numbeo_procedures.sql',
+    ],
+    'user': [
+        ROOT / 'sql' / 'user_data' / 'schema' / 'init.sql',
+        ROOT / 'sql' / 'user_data' / 'procedures' / 'user_procedures.sql',
+    ],
+}
+
+FIRST_USER_ID = 9_100_000_000
+HOME = ('London', 'United Kingdom')
+# Popular cities with a recorded page, other than the home city
+TARGETS = [
+    ('Berlin', 'Germany'),
+    ('New York', 'United States'),
+    ('Singapore', 'Singapore'),
+    ('Sydney', 'Australia'),
+]
+SCENARIOS = ('profile', 'cache_hit', 'db_hit', 'scrape_miss')
+
+# Replies the handlers send when they could not produce a comparison
+ERROR_PREFIXES = ('Sorry', '⚠️')
+# Start of the reply offering corrections of a city or country it does not know
+SUGGESTION_PREFIX = '🤔'
+
+def connect_kwargs(config: Dict[str, Any], dbname: str) -> Dict[str, Any]:
+    """Connection arguments for another database on the same server, as the pools build them"""
+    return {key: value for key, value in {**config, 'dbname': dbname}.items() if value}
+
+async def create_database(config: Dict[str, Any], name: str, scripts: List[Path]) -> None:
+    """(Re)create a database on the configured server and run the scripts in it"""
+    admin = await AsyncConnection.connect(**connect_kwargs(config, config['dbname']), autocommit=True)
+    async with admin:
+        await admin.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(name)))
+        await admin.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+    conn = await AsyncConnection.connect(**connect_kwargs(config, name), autocommit=True)
+    async with conn:
+        for script in scripts:
+            await conn.execute(script.read_text())
+
+async def drop_database(config: Dict[str, Any], dbname: str, name: str) -> None:
+    admin = await AsyncConnection.connect(**connect_kwargs(config, dbname), autocommit=True)
+    async with admin:
+        await admin.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(name)))
+
+@asynccontextmanager
+async def scratch_databases(keep: bool = False) -> AsyncIterator[None]:
+    """
+    Point both database configs at fresh copies created from sql/ for the
+    duration of the block; the pools are closed and the copies dropped
+    on the way out, unless keep is set
+    """
+    configs = {'numbeo': NUMBEO_DB_CONFIG, 'user': USER_DB_CONFIG}
+    configured = {name: config['dbname'] for name, config in configs.items()}
+    scratch = {name: f"{dbname}_bench" for name, dbname in configured.items()}
+    for name, config in configs.items():
+        await create_database(config, scratch[name], SCRIPTS[name])
+        # The pools are created on first use, so they connect to the copies
+        config['dbname'] = scratch[name]
+    try:
+        yield
+    finally:
+        await close_db_pools()
+        for name, config in configs.items():
+            config['dbname'] = configured[name]
+            if not keep:
+                await drop_database(config, configured[name], scratch[name])
+
+async def load_popular_cities() -> None:
+    """Scrape the home and popular cities into the database once"""
+    for city, country in [HOME, *TARGETS]:
+        if await fetch_city_data(city, country) is None:
+            raise RuntimeError(f"Could not load the recorded page for {city}")
+
+def build(api_url: str) -> Application:
+    """The bot's conversations, in memory, talking to the Bot API at api_url"""
+    application = ApplicationBuilder().token('123456:bench').base_url(api_url).build()
+    application.add_handler(get_profile_handler())
+    application.add_handler(get_relocation_handler())
+    return application
+
+class Driver:
+    """Feeds updates for simulated users to the application, timing them"""
+
+    def __init__(self, application: Application, stub: StubTelegramServer, concurrency: int):
+        self.application = application
+        self.stub = stub
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self._update_ids = iter(range(1, 10**9))
+
+    def message(self, user_id: int, text: str) -> Update:
+        return Update.de_json(
+            make_message_update(next(self._update_ids), user_id, text), self.application.bot
+        )
+
+    def callback(self, user_id: int, data: str) -> Update:
+        return Update.de_json(
+            make_callback_update(next(self._update_ids), user_id, data), self.application.bot
+        )
+
+    def suggested(self, user_id: int) -> bool:
+        """Whether the last reply to a user offered corrections of what they typed"""
+        return self.stub.last_texts.get(user_id, '').startswith(SUGGESTION_PREFIX)
+
+    async def send(self, update: Update) -> float:
+        """Process an update, returning how long it took"""
+        start = time.perf_counter()
+        await self.application.process_update(update)
+        return time.perf_counter() - start
+
+    async def for_users(self, user_ids: List[int],
+                        steps: Callable[[int], Awaitable[List[float]]]) -> Dict[str, Any]:
+        """
+        Run steps for every user, concurrency users at a time. Returns the
+        latencies, the wall time and the number of replies that are errors.
+        """
+        latencies: List[float] = []
+
+        async def run(user_id: int) -> None:
+            async with self.semaphore:
+                latencies.extend(await steps(user_id))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(run(user_id) for user_id in user_ids))
+        wall = time.perf_counter() - start
+        errors = sum(
+            1 for user_id in user_ids
+            if self.stub.last_texts.get(user_id, '').startswith(ERROR_PREFIXES)
+        )
+        return {'latencies': latencies, 'wall': wall, 'errors': errors}
+
+def summarize(run: Dict[str, Any]) -> Dict[str, Any]:
+    latencies = sorted(run['latencies'])
+
+    def percentile(q: float) -> float:
+        # Nearest rank
+        return latencies[max(0, min(len(latencies) - 1, round(q * len(latencies)) - 1))]
+
+    return {
+        'count': len(latencies),
+        'errors': run['errors'],
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'p50_ms': percentile(0.50) * 1000,
+        'p95_ms': percentile(0.95) * 1000,
+        'p99_ms': percentile(0.99) * 1000,
+        'throughput': len(latencies) / run['wall'],
+    }
+
+async def run_scenarios(driver: Driver, users: int, warmup: int) -> Dict[str, Dict[str, Any]]:
+    """Run every scenario, each with warm-up users first, and summarize them"""
+    async def profile(user_id: int) -> List[float]:
+        return [
+            await driver.send(driver.message(user_id, '/profile')),
+            await driver.send(driver.callback(user_id, 'setup')),
+            await driver.send(driver.message(user_id, f"User {user_id}")),
+            await driver.send(driver.message(user_id, HOME[0])),
+            await driver.send(driver.message(user_id, HOME[1])),
+        ]
+
+    def target(user_id: int) -> tuple:
+        return TARGETS[user_id % len(TARGETS)]
+
+    async def pick_city(user_id: int) -> List[float]:
+        await driver.send(driver.message(user_id, '/relocate'))
+        city, country = target(user_id)
+        return [await driver.send(driver.callback(user_id, f"relocate_{city}_{country}"))]
+
+    async def pick_uncached_city(user_id: int) -> List[float]:
+        for city, country in (target(user_id), HOME):
+            invalidate_city_cache(city, country)
+        return await pick_city(user_id)
+
+    async def type_new_city(user_id: int) -> List[float]:
+        await driver.send(driver.message(user_id, '/relocate'))
+        await driver.send(driver.callback(user_id, 'other_city'))
+        await driver.send(driver.message(user_id, f"Bench City {user_id - FIRST_USER_ID}"))
+        # Names like those already scraped get corrections offered; keep them
+        if driver.suggested(user_id):
+            await driver.send(driver.callback(user_id, 'keep_city'))
+        latency = await driver.send(driver.message(user_id, 'Benchland'))
+        if driver.suggested(user_id):
+            latency = await driver.send(driver.callback(user_id, 'keep_country'))
+        return [latency]
+
+    steps = {
+        'profile': profile,
+        'cache_hit': pick_city,
+        'db_hit': pick_uncached_city,
+        'scrape_miss': type_new_city,
+    }
+    all_users = list(range(FIRST_USER_ID, FIRST_USER_ID + warmup + users))
+    measured = all_users[warmup:]
+    results = {}
+    for name in SCENARIOS:
+        # Every user needs a profile for the comparisons, so the warm-up
+        # users of the other scenarios are the same ones
+        if warmup:
+            await driver.for_users(all_users[:warmup], steps[name])
+        results[name] = summarize(await driver.for_users(measured, steps[name]))
+    return results
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+def print_results(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'scenario':<12} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'updates/s':>10}")
+    for name, stats in results.items():
+        print(f"{name:<12} {stats['count']:>6} {stats['errors']:>6} {stats['p50_ms']:>9.2f} "
+              f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['throughput']:>10.1f}")
+
+def print_comparison(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """Change of every statistic from the baseline run, in percent"""
+    print(f"\nChange from {baseline.get('commit')} to {current.get('commit')} "
+          "(latency: lower is better, updates/s: higher is better)")
+    print(f"{'scenario':<12} {'p50':>8} {'p95':>8} {'p99':>8} {'updates/s':>10}")
+    for name, stats in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            print(f"{name:<12} {'(new)':>8}")
+            continue
+        changes = [
+            (stats[key] - before[key]) / before[key] * 100 if before[key] else float('nan')
+            for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput')
+        ]
+        print(f"{name:<12} {changes[0]:>+7.1f}% {changes[1]:>+7.1f}% {changes[2]:>+7.1f}% "
+              f"{changes[3]:>+9.1f}%")
+
+async def main(args: argparse.Namespace) -> None:
+    # Reproducible scrapes: no random politeness delay, fixed page latency
+    scraper.SCRAPER_CONFIG.update(min_delay=0, max_delay=0)
+    async with scratch_databases(args.keep):
+        async with StubTelegramServer(latency=args.api_latency) as stub, \
+                StubNumbeoServer(latency=args.numbeo_latency, fallback='Berlin') as numbeo:
+            scraper.SCRAPER_CONFIG['base_url'] = numbeo.base_url
+            application = build(stub.api_url)
+            await application.initialize()
+            start_user_writer()
+            try:
+                await load_popular_cities()
+                results = await run_scenarios(
+                    Driver(application, stub, args.concurrency), args.users, args.warmup
+                )
+            finally:
+                await stop_user_writer()
+                await application.shutdown()
+                await scraper.close_scraper_session()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'parameters': {
+            'users': args.users,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'api_latency': args.api_latency,
+            'numbeo_latency': args.numbeo_latency,
+        },
+        'scenarios': results,
+    }
+    print_results(results)
+    output = args.output or RESULTS_DIR / f"e2e-{report['commit'] or 'unknown'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + '\n')
+    print(f"\nResults written to {output}")
+    if args.compare:
+        print_comparison(json.loads(args.compare.read_text()), report)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the bot's handlers")
+    parser.add_argument('--users', type=int, default=200,
+                        help="measured users per scenario")
+    parser.add_argument('--warmup', type=int, default=20,
+                        help="users per scenario run before measuring")
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="users whose updates are processed at the same time")
+    parser.add_argument('--api-latency', type=float, default=0.0,
+                        help="artificial Bot API latency per call in seconds")
+    parser.add_argument('--numbeo-latency', type=float, default=0.0,
+                        help="artificial Numbeo page latency in seconds")
+    parser.add_argument('--output', type=Path,
+                        help="JSON results file (default benchmarks/results/e2e-<commit>.json)")
+    parser.add_argument('--compare', type=Path,
+                        help="earlier JSON results to compare against")
+    parser.add_argument('--keep', action='store_true',
+                        help="keep the scratch databases")
+    asyncio.run(main(parser.parse_args()))
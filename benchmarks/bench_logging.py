@@ -0,0 +1,107 @@
+# benchmarks/bench_logging.py
+"""
+Measure how long a log call keeps the calling thread (the event loop, in
+the bot) busy: synchronous console and file handlers with eager f-strings,
+as before, against the queue handler with lazy %-style arguments.
+
+The console output goes to a file in a temporary directory. --sink-latency
+adds a delay to every write, like a slow disk or a console pipe nobody
+reads fast enough; with the queue it is paid by the listener thread.
+
+    python -m benchmarks.bench_logging --calls 20000 --sink-latency 0.0002
+"""
+import argparse
+import logging
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from src.utils.logging import create_handlers, create_queue_handler
+
+# Roughly what scrape_city_data returns, logged whole on every scrape before
+PAYLOAD = {
+    category: {f"item {index}": 12.5 + index for index in range(8)}
+    for category in ('restaurants', 'markets', 'transportation', 'utilities',
+                     'leisure', 'clothing', 'rent')
+}
+
+class SlowHandler(logging.Handler):
+    """Wraps a handler, adding a fixed delay to every write"""
+
+    def __init__(self, handler: logging.Handler, latency: float):
+        super().__init__()
+        self.handler = handler
+        self.latency = latency
+
+    def emit(self, record: logging.LogRecord) -> None:
+        time.sleep(self.latency)
+        self.handler.handle(record)
+
+def bench_logger(name: str, handlers: List[logging.Handler], level: int) -> logging.Logger:
+    logger = logging.getLogger(f"bench.{name}")
+    logger.handlers = handlers
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+def sinks(directory: Path, name: str, latency: float) -> List[logging.Handler]:
+    """A console handler writing to a file, and a file handler, like the bot's"""
+    handlers = create_handlers(str(directory / f"{name}.log"), 'text')
+    handlers[0].setStream(open(directory / f"{name}.console", 'w'))
+    if latency:
+        handlers = [SlowHandler(handler, latency) for handler in handlers]
+    return handlers
+
+def time_calls(log: Callable[[int], None], calls: int) -> List[float]:
+    latencies = []
+    for index in range(calls):
+        start = time.perf_counter()
+        log(index)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def report(name: str, latencies: List[float]) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<44} mean {statistics.mean(latencies) * 1e6:8.2f} us   p99 {p99 * 1e6:8.2f} us")
+
+def main(calls: int, sink_latency: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+
+        sync = bench_logger('sync', sinks(directory, 'sync', sink_latency), logging.INFO)
+        report("sync handlers, f-string", time_calls(
+            lambda index: sync.info(f"Fetching data for City {index}, Country"), calls))
+
+        queue_handler, listener = create_queue_handler(sinks(directory, 'queued', sink_latency))
+        queued = bench_logger('queued', [queue_handler], logging.INFO)
+        listener.start()
+        try:
+            report("queue handler, lazy", time_calls(
+                lambda index: queued.info("Fetching data for %s, %s", f"City {index}", 'Country'),
+                calls))
+        finally:
+            start = time.perf_counter()
+            listener.stop()
+            print(f"{'  listener drained the queue in':<44} {time.perf_counter() - start:.2f} s")
+
+        # The scraped payload: formatted and written at INFO before, now a
+        # disabled DEBUG call
+        payload_calls = max(calls // 10, 100)
+        report("scraped payload, INFO f-string, sync", time_calls(
+            lambda index: sync.info(f"Scraped data: {PAYLOAD}"), payload_calls))
+        report("scraped payload, DEBUG lazy, disabled", time_calls(
+            lambda index: queued.debug("Scraped data for %s: %s", index, PAYLOAD), payload_calls))
+
+        for handler in [*sync.handlers, *listener.handlers]:
+            handler.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark log call latency")
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--sink-latency', type=float, default=0.0,
+                        help="artificial delay per write in seconds")
+    args = parser.parse_args()
+    main(args.calls, args.sink_latency)
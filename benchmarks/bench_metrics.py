@@ -0,0 +1,74 @@
+# benchmarks/bench_metrics.py
+"""
+Measure what the metrics cost on the hot paths: recording a counter
+increment and a histogram observation, the timed() wrapper around a
+coroutine, and rendering /metrics with the bot's own metrics registered.
+
+The instruments are created in a separate registry, so nothing here shows
+up in the bot's output.
+
+    python -m benchmarks.bench_metrics --calls 100000
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable
+
+from src.utils.metrics import REGISTRY, Counter, Histogram, timed
+# Registers the bot's metrics, as importing the bot does
+import src.bot.handlers.profile  # noqa: F401
+import src.bot.handlers.relocation  # noqa: F401
+import src.bot.request  # noqa: F401
+import src.data.numbeo.scraper  # noqa: F401
+
+def per_call(fn: Callable[[int], None], calls: int) -> float:
+    """Mean seconds per call of fn"""
+    start = time.perf_counter()
+    for index in range(calls):
+        fn(index)
+    return (time.perf_counter() - start) / calls
+
+async def per_await(fn: Callable[[], object], calls: int) -> float:
+    """Mean seconds per awaited call of the coroutine function fn"""
+    start = time.perf_counter()
+    for _ in range(calls):
+        await fn()
+    return (time.perf_counter() - start) / calls
+
+def report(name: str, seconds: float) -> None:
+    print(f"{name:<40} {seconds * 1e6:8.3f} us")
+
+async def main(calls: int) -> None:
+    requests = Counter('bench_requests_total', 'Benchmark counter', labels=('outcome',))
+    latency = Histogram('bench_seconds', 'Benchmark histogram', labels=('source',))
+
+    report("no-op loop", per_call(lambda index: None, calls))
+    report("counter inc", per_call(lambda index: requests.inc(outcome='ok'), calls))
+    report("histogram observe", per_call(
+        lambda index: latency.observe(index * 1e-6, source='local'), calls))
+
+    def timed_block(index: int) -> None:
+        with latency.time(source='local'):
+            pass
+    report("histogram time() block", per_call(timed_block, calls))
+
+    async def handler() -> None:
+        pass
+    report("await coroutine", await per_await(handler, calls))
+    report("await timed() coroutine", await per_await(
+        timed(latency, source='timed')(handler), calls))
+
+    # Fill every handler series, as a bot that has been up a while would
+    for metric in REGISTRY:
+        if isinstance(metric, Histogram) and metric.label_names:
+            for value in (0.001, 0.01, 0.1):
+                metric.observe(value, **{name: 'bench' for name in metric.label_names})
+    body = REGISTRY.render()
+    renders = max(calls // 100, 10)
+    report(f"render /metrics ({len(body)} bytes)", per_call(lambda index: REGISTRY.render(), renders))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark metric recording overhead")
+    parser.add_argument('--calls', type=int, default=100000)
+    args = parser.parse_args()
+    asyncio.run(main(args.calls))
@@ -0,0 +1,101 @@
+# benchmarks/bench_numbeo_writes.py
+"""
+Compare write throughput of the single-statement snapshot insert against
+issuing one statement per table (city lookup, update row, seven cost
+rows), as the write path used to. Rows are written for throwaway
+"Benchland" cities, which are deleted afterwards.
+
+    python -m benchmarks.bench_numbeo_writes --cities 500 --concurrency 10
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from benchmarks.stub_numbeo import load_fixtures
+from src.data.numbeo.fetcher import _store_scraped_data
+from src.data.numbeo.items import COST_CATEGORIES, CostData, category_columns
+from src.data.numbeo.scraper import parse_cost_table
+from src.utils.database import close_db_pools, get_numbeo_db_connection, init_db_pools
+
+BENCH_COUNTRY = 'Benchland'
+
+async def store_per_statement(cur, city_name: str, country: str, data: CostData) -> int:
+    """One round trip per table, using the update_id returned by the updates INSERT"""
+    await cur.execute("""
+        SELECT city_id FROM numbeo_col.cities
+        WHERE LOWER(city_name) = LOWER(%s) AND LOWER(country) = LOWER(%s)
+    """, (city_name, country))
+    result = await cur.fetchone()
+    if result:
+        city_id = result[0]
+    else:
+        await cur.execute("""
+            INSERT INTO numbeo_col.cities (city_name, country, region)
+            VALUES (%s, %s, '') RETURNING city_id
+        """, (city_name, country))
+        city_id = (await cur.fetchone())[0]
+    await cur.execute("""
+        INSERT INTO numbeo_col.updates (city_id, date)
+        VALUES (%s, CURRENT_TIMESTAMP) RETURNING update_id
+    """, (city_id,))
+    update_id = (await cur.fetchone())[0]
+    for category, (table, _) in COST_CATEGORIES.items():
+        columns = category_columns(category)
+        await cur.execute(
+            f"INSERT INTO numbeo_col.{table} (update_id, {', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * (len(columns) + 1))})",
+            (update_id, *(data[category].get(column) for column in columns))
+        )
+    return update_id
+
+async def run(name: str, store: Callable[..., Awaitable[int]], data: CostData,
+              cities: int, concurrency: int) -> None:
+    remaining = iter(range(cities))
+
+    async def worker():
+        for i in remaining:
+            async with get_numbeo_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    await store(cur, f"{name} {i}", BENCH_COUNTRY, data)
+                await conn.commit()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<16} {cities / elapsed:8.1f} snapshots/s   {elapsed:.2f} s total")
+
+async def cleanup() -> None:
+    async with get_numbeo_db_connection() as conn:
+        async with conn.cursor() as cur:
+            bench_updates = """
+                SELECT u.update_id FROM numbeo_col.updates u
+                JOIN numbeo_col.cities c ON c.city_id = u.city_id
+                WHERE c.country = %s
+            """
+            for table in ['city_latest_costs'] + [table for table, _ in COST_CATEGORIES.values()]:
+                await cur.execute(
+                    f"DELETE FROM numbeo_col.{table} WHERE update_id IN ({bench_updates})",
+                    (BENCH_COUNTRY,)
+                )
+            await cur.execute(f"DELETE FROM numbeo_col.updates WHERE update_id IN ({bench_updates})",
+                              (BENCH_COUNTRY,))
+            await cur.execute("DELETE FROM numbeo_col.cities WHERE country = %s", (BENCH_COUNTRY,))
+        await conn.commit()
+
+async def main(cities: int, concurrency: int) -> None:
+    data = parse_cost_table(load_fixtures()['Berlin'])
+    await init_db_pools(wait=True)
+    try:
+        await run('per-statement', store_per_statement, data, cities, concurrency)
+        await run('single-statement', _store_scraped_data, data, cities, concurrency)
+    finally:
+        await cleanup()
+        await close_db_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Numbeo snapshot writes")
+    parser.add_argument('--cities', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.cities, args.concurrency))
@@ -0,0 +1,122 @@
+# benchmarks/bench_parser.py
+"""
+Compare the label-driven lxml cost table parser against the previous
+BeautifulSoup html.parser + fixed row positions parser on the fixture
+corpus: parse time, peak memory, and whether values land in the right
+columns.
+
+    python -m benchmarks.bench_parser --repeat 200
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from bs4 import BeautifulSoup
+
+from benchmarks.stub_numbeo import FIXTURES_DIR, load_fixtures
+from src.data.numbeo.items import category_columns
+from src.data.numbeo.scraper import clean_cost_value, parse_cost_table
+
+# Row positions the previous parser sliced categories by
+LEGACY_SLICES = {
+    'restaurant': (2, 10),
+    'market': (11, 30),
+    'transportation': (31, 39),
+    'utilities': (40, 43),
+    'leisure': (44, 47),
+    'clothing': (51, 55),
+    'rent': (56, 60),
+}
+
+def legacy_parse(page_text: str) -> Dict[str, Dict[str, float]]:
+    """The previous parser, with its positional lists mapped onto columns"""
+    rows = BeautifulSoup(page_text, 'html.parser').find_all('tr')
+    data = {}
+    for category, (start, end) in LEGACY_SLICES.items():
+        costs = []
+        for row in rows[start:end]:
+            cell = row.find('td', {'class': 'priceValue'})
+            if cell:
+                costs.append(clean_cost_value(cell.text))
+        data[category] = dict(zip(category_columns(category), costs))
+    return data
+
+PARSERS: Dict[str, Callable[[str], dict]] = {
+    'bs4 html.parser (positional)': legacy_parse,
+    'lxml (label-driven)': parse_cost_table,
+}
+
+def time_parser(parse: Callable[[str], dict], pages: List[str], repeat: int) -> float:
+    """Mean seconds per page"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            parse(page)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+def traced_peak(parse: Callable[[str], dict], pages: List[str]) -> int:
+    """Largest Python heap peak while parsing one page"""
+    peak = 0
+    for page in pages:
+        tracemalloc.start()
+        parse(page)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return peak
+
+def _rss_child(name: str, pages: List[str], repeat: int, queue) -> None:
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for _ in range(repeat):
+        for page in pages:
+            PARSERS[name](page)
+    queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+
+def rss_growth(name: str, pages: List[str], repeat: int) -> int:
+    """Max RSS growth in KiB while parsing, measured in a fresh process.
+
+    Unlike tracemalloc this includes memory allocated by libxml2.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_rss_child, args=(name, pages, repeat, queue))
+    process.start()
+    growth = queue.get()
+    process.join()
+    return growth
+
+def misplaced_values(parsed: dict, reference: dict) -> int:
+    """Count columns whose value differs from the reference parse"""
+    return sum(
+        1
+        for category, columns in reference.items()
+        for column, value in columns.items()
+        if parsed.get(category, {}).get(column) != value
+    )
+
+def main(repeat: int, fixtures_dir: Path) -> None:
+    corpus = load_fixtures(fixtures_dir)
+    pages = list(corpus.values())
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1024:.1f} KiB on average\n")
+
+    for name, parse in PARSERS.items():
+        per_page = time_parser(parse, pages, repeat)
+        peak = traced_peak(parse, pages)
+        rss = rss_growth(name, pages, repeat)
+        print(
+            f"{name:<30} {per_page * 1000:8.3f} ms/page   "
+            f"python heap peak {peak / 1024:8.1f} KiB   RSS growth {rss:6d} KiB"
+        )
+
+    print("\nValues in the wrong column (positional vs label-driven):")
+    for slug, page in corpus.items():
+        print(f"  {slug:<12} {misplaced_values(legacy_parse(page), parse_cost_table(page))}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Numbeo page parsers")
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--fixtures', type=Path, default=FIXTURES_DIR)
+    args = parser.parse_args()
+    main(args.repeat, args.fixtures)
@@ -0,0 +1,138 @@
+# benchmarks/bench_persistence.py
+"""
+Measure the per-update overhead of keeping conversations and user_data in
+Postgres, against in-memory conversations.
+
+Simulated users walk through /profile (five updates) and open and cancel
+/relocate (two updates), processed in-process against a local stub of the
+Bot API. Three modes are compared:
+
+- memory: no persistence
+- batched: PostgresPersistence, written every --interval seconds
+- per-update: PostgresPersistence, written after every update, which is
+  what persisting on every message would cost
+
+Users get ids from 9_000_000_000 up; their rows are deleted afterwards.
+
+    python -m benchmarks.bench_persistence --users 200 --interval 1
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List, Optional
+
+from telegram import Update
+from telegram.ext import Application, ApplicationBuilder
+
+from benchmarks.stub_telegram import (
+    StubTelegramServer,
+    make_callback_update,
+    make_message_update
+)
+from src.bot.handlers.profile import get_profile_handler
+from src.bot.handlers.relocation import get_relocation_handler
+from src.bot.persistence import PostgresPersistence
+from src.utils.database import close_db_pools, get_user_db_connection
+
+FIRST_USER_ID = 9_000_000_000
+CONVERSATIONS = ['profile_conversation', 'relocation_conversation']
+
+def user_updates(user_id: int, first_update_id: int) -> List[dict]:
+    """The updates one user sends, in order"""
+    steps = [
+        lambda update_id: make_message_update(update_id, user_id, '/profile'),
+        lambda update_id: make_callback_update(update_id, user_id, 'setup'),
+        lambda update_id: make_message_update(update_id, user_id, f"User {user_id}"),
+        lambda update_id: make_message_update(update_id, user_id, 'Berlin'),
+        lambda update_id: make_message_update(update_id, user_id, 'Germany'),
+        lambda update_id: make_message_update(update_id, user_id, '/relocate'),
+        lambda update_id: make_callback_update(update_id, user_id, 'cancel'),
+    ]
+    return [step(first_update_id + index) for index, step in enumerate(steps)]
+
+def build(api_url: str, persistence: Optional[PostgresPersistence]) -> Application:
+    builder = ApplicationBuilder().token('123456:bench').base_url(api_url)
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
+    application.add_handler(get_profile_handler(persistence is not None))
+    application.add_handler(get_relocation_handler(persistence is not None))
+    return application
+
+async def run(name: str, api_url: str, users: int, persistence: Optional[PostgresPersistence],
+              write_every_update: bool) -> None:
+    application = build(api_url, persistence)
+    await application.initialize()
+    await application.start()
+    latencies = []
+    try:
+        # Interleave users, as concurrent conversations would be
+        per_user = [
+            user_updates(FIRST_USER_ID + index, index * 10)
+            for index in range(users)
+        ]
+        for step in range(len(per_user[0])):
+            for updates in per_user:
+                update = Update.de_json(updates[step], application.bot)
+                start = time.perf_counter()
+                await application.process_update(update)
+                if write_every_update:
+                    await application.update_persistence()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await application.update_persistence()
+        final_flush = time.perf_counter() - start
+    finally:
+        await application.stop()
+        await application.shutdown()
+
+    line = (
+        f"{name:<12} mean {statistics.mean(latencies) * 1e6:8.0f} us/update   "
+        f"total {sum(latencies):6.2f} s"
+    )
+    if persistence is not None:
+        stats = persistence.stats()
+        line += (
+            f"   {stats['flushes']} flushes, {stats['rows_written']} rows, "
+            f"final flush {final_flush * 1000:.1f} ms"
+        )
+    print(line)
+
+async def cleanup(users: int) -> None:
+    user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + users))
+    keys = [json.dumps([user_id, user_id]) for user_id in user_ids]
+    async with get_user_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "DELETE FROM bot.persistence_data WHERE kind = 'user' AND key = ANY(%s)",
+                (user_ids,)
+            )
+            await cur.execute(
+                "DELETE FROM bot.conversation_states WHERE name = ANY(%s) AND key = ANY(%s)",
+                (CONVERSATIONS, keys)
+            )
+        await conn.commit()
+
+async def main(users: int, interval: float) -> None:
+    async with StubTelegramServer() as stub:
+        try:
+            await run('memory', stub.api_url, users, None, False)
+            await cleanup(users)
+            await run('batched', stub.api_url, users, PostgresPersistence(update_interval=interval), False)
+            await cleanup(users)
+            # The interval is irrelevant, every update is followed by a write
+            await run('per-update', stub.api_url, users, PostgresPersistence(update_interval=3600), True)
+        finally:
+            await cleanup(users)
+            await close_db_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Postgres persistence overhead")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help="persistence flush interval in seconds for the batched mode")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.interval))
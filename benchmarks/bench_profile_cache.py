@@ -0,0 +1,82 @@
+# benchmarks/bench_profile_cache.py
+"""
+Measure get_user_profile latency with and without the profile cache, on
+the skewed access pattern of active users sending several updates each.
+
+Profiles are seeded for users from 9_100_000_000 up and deleted afterwards.
+
+    python -m benchmarks.bench_profile_cache --users 1000 --reads 20000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import List
+
+from src.data.users.cache import get_profile_cache_stats, invalidate_profile
+from src.data.users.crud import get_user_profile
+from src.utils.database import close_db_pools, get_user_db_connection
+
+FIRST_USER_ID = 9_100_000_000
+
+async def seed(users: int) -> None:
+    async with get_user_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                INSERT INTO bot.user_profiles (user_id, first_name, current_city, current_country)
+                SELECT i, 'User ' || i, 'Berlin', 'Germany'
+                FROM generate_series(%s::bigint, %s::bigint) i
+                ON CONFLICT (user_id) DO NOTHING
+            """, (FIRST_USER_ID, FIRST_USER_ID + users - 1))
+        await conn.commit()
+
+async def cleanup(users: int) -> None:
+    async with get_user_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "DELETE FROM bot.user_profiles WHERE user_id BETWEEN %s AND %s",
+                (FIRST_USER_ID, FIRST_USER_ID + users - 1)
+            )
+        await conn.commit()
+
+async def time_reads(user_ids: List[int], cached: bool) -> List[float]:
+    latencies = []
+    for user_id in user_ids:
+        if not cached:
+            invalidate_profile(user_id)
+        start = time.perf_counter()
+        await get_user_profile(user_id)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def summary(name: str, latencies: List[float]) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    return (
+        f"{name:<12} mean {statistics.mean(latencies) * 1e6:9.1f} us   "
+        f"p95 {p95 * 1e6:9.1f} us   {len(latencies) / sum(latencies):10.0f} reads/s"
+    )
+
+async def main(users: int, reads: int) -> None:
+    # Zipf-like: a few users send most of the updates
+    weights = [1 / rank for rank in range(1, users + 1)]
+    user_ids = random.choices(range(FIRST_USER_ID, FIRST_USER_ID + users), weights, k=reads)
+    try:
+        await seed(users)
+        print(summary('uncached', await time_reads(user_ids, cached=False)))
+        before = get_profile_cache_stats()
+        print(summary('cached', await time_reads(user_ids, cached=True)))
+        after = get_profile_cache_stats()
+        hits = after['hits'] - before['hits']
+        print(f"cache: {after['size']} profiles, hit ratio {hits / reads:.1%} while cached")
+    finally:
+        await cleanup(users)
+        await close_db_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the user profile cache")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--reads', type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.reads))
@@ -0,0 +1,63 @@
+# benchmarks/bench_scraper.py
+"""
+Scrape the fixture pages concurrently through the local stub server and
+report wall time, pages/sec and the worst event-loop stall observed.
+
+A blocking scraper serialises every request and stalls the loop for the
+whole politeness delay plus HTTP time; the async scraper should keep the
+stall close to the parse time of a single page.
+
+    python -m benchmarks.bench_scraper --scrapes 50 --latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.stub_numbeo import StubNumbeoServer
+from src.data.numbeo import scraper
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Return the longest delay beyond `interval` seen by a ticking task"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+async def main(scrapes: int, latency: float, delay: float) -> None:
+    scraper.SCRAPER_CONFIG['min_delay'] = 0.0
+    scraper.SCRAPER_CONFIG['max_delay'] = delay
+
+    async with StubNumbeoServer(latency=latency) as server:
+        scraper.SCRAPER_CONFIG['base_url'] = server.base_url
+        cities = [name.replace('-', ' ') for name in server.pages]
+
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(measure_loop_lag(stop))
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            scraper.scrape_city_data(cities[i % len(cities)]) for i in range(scrapes)
+        ))
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        worst_lag = await lag_task
+        await scraper.close_scraper_session()
+
+    ok = sum(1 for result in results if result)
+    print(f"scrapes:          {scrapes} ({ok} succeeded, {server.requests} HTTP requests)")
+    print(f"wall time:        {elapsed:.2f} s")
+    print(f"throughput:       {scrapes / elapsed:.1f} pages/s")
+    print(f"worst loop stall: {worst_lag * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the async Numbeo scraper")
+    parser.add_argument('--scrapes', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help="artificial stub server latency in seconds")
+    parser.add_argument('--delay', type=float, default=0.1,
+                        help="maximum politeness delay in seconds")
+    args = parser.parse_args()
+    asyncio.run(main(args.scrapes, args.latency, args.delay))
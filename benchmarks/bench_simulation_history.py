@@ -0,0 +1,189 @@
+# benchmarks/bench_simulation_history.py
+"""
+Measure simulation history reads on the monthly partitioned table against
+the former single heap without indexes, and the cost of keeping the
+destination popularity rollup up to date.
+
+Both tables are seeded with the same rows, spread over --months months,
+in a scratch schema (bot_bench by default) created from
+sql/user_data/schema/init.sql, so the bot schema is left untouched. The
+scratch schema is dropped afterwards unless --keep is given.
+
+    python -m benchmarks.bench_simulation_history --rows 1000000 --users 50000
+"""
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import time
+from pathlib import Path
+from typing import List
+
+from src.data.users.crud import POPULAR_DESTINATIONS_QUERY
+from src.utils.database import close_db_pools, get_user_db_connection
+
+SCHEMA_PATH = Path(__file__).parent.parent / 'sql' / 'user_data' / 'schema' / 'init.sql'
+
+# bot.simulations as it was before partitioning
+HEAP_DDL = """
+    CREATE TABLE bot.simulations_heap (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT REFERENCES bot.user_profiles(user_id),
+        simulation_type TEXT NOT NULL,
+        source_city TEXT NOT NULL,
+        target_city TEXT NOT NULL,
+        source_occupation TEXT,
+        target_occupation TEXT,
+        simulated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# As in get_user_simulations
+HISTORY_QUERY = """
+    SELECT * FROM bot.{table}
+    WHERE user_id = %s
+    ORDER BY simulated_at DESC
+    LIMIT 5
+"""
+
+# Trending destinations without a rollup
+TRENDING_SCAN_QUERY = """
+    SELECT target_city, COUNT(*) AS simulations
+    FROM bot.{table}
+    WHERE simulated_at >= date_trunc('month', CURRENT_DATE) - make_interval(months => %s - 1)
+    GROUP BY target_city
+    ORDER BY simulations DESC, target_city
+    LIMIT %s
+"""
+
+DESTINATIONS = 500
+
+def in_schema(statement: str, schema: str) -> str:
+    statement = re.sub(r'\bbot\.', f'{schema}.', statement)
+    return re.sub(r'(SCHEMA (?:IF (?:NOT )?EXISTS )?)bot\b', rf'\g<1>{schema}', statement)
+
+async def execute(*statements: str) -> None:
+    """Run statements in autocommit mode"""
+    async with get_user_db_connection() as conn:
+        await conn.set_autocommit(True)
+        async with conn.cursor() as cur:
+            for statement in statements:
+                await cur.execute(statement)
+
+async def seed(schema: str, rows: int, users: int, months: int) -> None:
+    async with get_user_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(f"""
+                INSERT INTO {schema}.user_profiles (user_id, current_city, current_country)
+                SELECT i, 'Berlin', 'Germany' FROM generate_series(1, %s) i
+            """, (users,))
+            # Skewed towards a few destinations, like real interest
+            await cur.execute(f"""
+                INSERT INTO {schema}.simulations_heap (
+                    user_id, simulation_type, source_city, target_city, simulated_at
+                )
+                SELECT
+                    1 + (n::bigint * 7919) %% %s,
+                    'relocation',
+                    'Berlin',
+                    'City ' || floor(%s * power(random(), 3))::int,
+                    now() - random() * make_interval(days => %s * 30)
+                FROM generate_series(1, %s) n
+            """, (users, DESTINATIONS, months, rows))
+            await cur.execute(f"""
+                INSERT INTO {schema}.simulations
+                SELECT * FROM {schema}.simulations_heap
+            """)
+            await cur.execute(
+                f"SELECT setval('{schema}.simulations_id_seq', %s)", (rows,)
+            )
+
+async def time_queries(query: str, params: List[tuple]) -> List[float]:
+    latencies = []
+    async with get_user_db_connection() as conn:
+        async with conn.cursor() as cur:
+            for values in params:
+                start = time.perf_counter()
+                await cur.execute(query, values, prepare=True)
+                await cur.fetchall()
+                latencies.append(time.perf_counter() - start)
+    return latencies
+
+def summary(name: str, latencies: List[float]) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    return (
+        f"{name:<40} mean {statistics.mean(latencies) * 1000:9.3f} ms   "
+        f"p95 {p95 * 1000:9.3f} ms"
+    )
+
+async def time_refresh(schema: str, users: int, batch: int) -> float:
+    """Insert a batch of new simulations and time the incremental rollup"""
+    async with get_user_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(f"""
+                INSERT INTO {schema}.simulations (
+                    user_id, simulation_type, source_city, target_city
+                )
+                SELECT 1 + n %% %s, 'relocation', 'Berlin', 'City ' || n %% %s
+                FROM generate_series(1, %s) n
+            """, (users, DESTINATIONS, batch))
+            await conn.commit()
+            start = time.perf_counter()
+            await cur.execute(f"SELECT {schema}.refresh_destination_popularity()")
+            await conn.commit()
+            return time.perf_counter() - start
+
+async def main(schema: str, rows: int, users: int, months: int, lookups: int,
+               batch: int, keep: bool) -> None:
+    ddl = in_schema(SCHEMA_PATH.read_text(), schema)
+    user_ids = [(random.randint(1, users),) for _ in range(lookups)]
+    trending = [(3, 10)] * max(lookups // 50, 5)
+
+    try:
+        await execute(
+            f"DROP SCHEMA IF EXISTS {schema} CASCADE",
+            ddl,
+            in_schema(HEAP_DDL, schema),
+            f"SELECT {schema}.create_simulation_partitions("
+            f"(CURRENT_DATE - make_interval(months => {months}))::date, {months + 3})"
+        )
+        print(f"Seeding {rows} simulations of {users} users over {months} months into {schema}...")
+        await seed(schema, rows, users, months)
+        await execute(f"VACUUM ANALYZE {schema}.simulations_heap",
+                      f"VACUUM ANALYZE {schema}.simulations")
+
+        start = time.perf_counter()
+        await execute(f"SELECT {schema}.refresh_destination_popularity()")
+        print(f"Initial rollup of {rows} simulations: {time.perf_counter() - start:.2f} s\n")
+
+        for table in ('simulations_heap', 'simulations'):
+            query = in_schema(HISTORY_QUERY.format(table=table), schema)
+            print(summary(f"recent history, {table}", await time_queries(query, user_ids)))
+        for table in ('simulations_heap', 'simulations'):
+            query = in_schema(TRENDING_SCAN_QUERY.format(table=table), schema)
+            print(summary(f"trending scan, {table}", await time_queries(query, trending)))
+        query = in_schema(POPULAR_DESTINATIONS_QUERY, schema)
+        print(summary("trending, destination_popularity", await time_queries(query, trending)))
+
+        refreshes = [await time_refresh(schema, users, batch) for _ in range(10)]
+        print(summary(f"rollup refresh after {batch} inserts", refreshes))
+    finally:
+        if not keep:
+            await execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        await close_db_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark simulation history reads and rollups")
+    parser.add_argument('--schema', default='bot_bench')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--lookups', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=1000,
+                        help="simulations inserted before each timed rollup refresh")
+    parser.add_argument('--keep', action='store_true', help="keep the scratch schema")
+    args = parser.parse_args()
+    asyncio.run(main(args.schema, args.rows, args.users, args.months, args.lookups,
+                     args.batch, args.keep))
@@ -0,0 +1,172 @@
+# benchmarks/bench_webhook.py
+"""
+Measure update throughput of polling mode against webhook mode with one or
+more worker processes.
+
+The bot runs as a subprocess (python -m src.main) talking to a local stub
+of the Bot API, which adds --api-latency to every call the bot makes. The
+same /start and /help updates are fed to it through getUpdates in polling
+mode and replayed as webhook POSTs otherwise; throughput is measured until
+the bot has answered every one of them.
+
+    python -m benchmarks.bench_webhook --updates 2000 --workers 1 4 --concurrent-updates 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List
+
+import aiohttp
+
+from benchmarks.stub_telegram import StubTelegramServer, make_message_update
+
+WEBHOOK_PATH = '/telegram'
+SECRET_TOKEN = 'bench-secret'
+
+def free_port(count: int = 1) -> int:
+    """A port such that it and the following count - 1 ports look unused"""
+    while True:
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            base = sock.getsockname()[1]
+        if base + count >= 65535:
+            continue
+        try:
+            for port in range(base, base + count):
+                with socket.socket() as sock:
+                    sock.bind(('127.0.0.1', port))
+            return base
+        except OSError:
+            continue
+
+def make_updates(count: int, users: int) -> List[dict]:
+    commands = ['/start', '/help']
+    return [
+        make_message_update(update_id, random.randint(1, users), random.choice(commands))
+        for update_id in range(1, count + 1)
+    ]
+
+async def start_bot(env: Dict[str, str]) -> asyncio.subprocess.Process:
+    return await asyncio.create_subprocess_exec(
+        sys.executable, '-m', 'src.main',
+        env={**os.environ, **env},
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+
+async def stop_bot(bot: asyncio.subprocess.Process) -> str:
+    """Stop the bot with SIGTERM and report how long the graceful shutdown took"""
+    start = time.perf_counter()
+    bot.send_signal(signal.SIGTERM)
+    code = await bot.wait()
+    return f"exit code {code} after {time.perf_counter() - start:.2f} s"
+
+async def post_updates(url: str, updates: List[dict], senders: int) -> None:
+    """POST updates like Telegram, over at most `senders` parallel connections"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+
+    async def sender(session: aiohttp.ClientSession):
+        while not queue.empty():
+            update = queue.get_nowait()
+            async with session.post(url, json=update,
+                                    headers={'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN}) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"Webhook answered {response.status}")
+
+    connector = aiohttp.TCPConnector(limit=senders)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(sender(session) for _ in range(senders)))
+
+def report(name: str, updates: int, elapsed: float, shutdown: str) -> None:
+    print(f"{name:<34} {updates / elapsed:8.1f} updates/s   {elapsed:6.2f} s   ({shutdown})")
+
+async def run_polling(stub: StubTelegramServer, env: Dict[str, str],
+                      updates: List[dict], timeout: float) -> None:
+    bot = await start_bot({**env, 'BOT_MODE': 'polling'})
+    try:
+        await stub.wait_for_calls(stub.calls['getUpdates'] + 1, methods=('getUpdates',),
+                                  timeout=timeout)
+        answered = stub.replies()
+        start = time.perf_counter()
+        stub.push_updates(updates)
+        await stub.wait_for_calls(answered + len(updates), timeout=timeout)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutdown = await stop_bot(bot)
+    report('polling', len(updates), elapsed, shutdown)
+
+async def run_webhook(stub: StubTelegramServer, env: Dict[str, str], updates: List[dict],
+                      workers: int, routing: str, senders: int, timeout: float) -> None:
+    port = free_port(workers + 1)
+    bot = await start_bot({
+        **env,
+        'BOT_MODE': 'webhook',
+        'WEBHOOK_URL': f"http://127.0.0.1:{port}{WEBHOOK_PATH}",
+        'WEBHOOK_LISTEN': '127.0.0.1',
+        'WEBHOOK_PORT': str(port),
+        'WEBHOOK_PATH': WEBHOOK_PATH,
+        'WEBHOOK_SECRET_TOKEN': SECRET_TOKEN,
+        'WEBHOOK_WORKERS': str(workers),
+        'WEBHOOK_ROUTING': routing,
+    })
+    try:
+        # The webhook is registered once every worker is listening
+        await stub.wait_for_calls(stub.calls['setWebhook'] + 1, methods=('setWebhook',),
+                                  timeout=timeout)
+        answered = stub.replies()
+        start = time.perf_counter()
+        await post_updates(f"http://127.0.0.1:{port}{WEBHOOK_PATH}", updates, senders)
+        await stub.wait_for_calls(answered + len(updates), timeout=timeout)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutdown = await stop_bot(bot)
+    name = f"webhook, {workers} worker{'s' if workers > 1 else ''}"
+    if workers > 1:
+        name += f" ({routing})"
+    report(name, len(updates), elapsed, shutdown)
+
+async def main(count: int, users: int, workers: List[int], routing: str,
+               concurrent_updates: int, api_latency: float, senders: int,
+               timeout: float) -> None:
+    updates = make_updates(count, users)
+    async with StubTelegramServer(latency=api_latency) as stub:
+        env = {
+            'TELEGRAM_BOT_TOKEN': '123456:bench',
+            'TELEGRAM_API_BASE_URL': stub.api_url,
+            'BOT_CONCURRENT_UPDATES': str(concurrent_updates),
+            # No background scrapes while measuring
+            'HOT_CITY_REFRESH_INTERVAL': '0',
+            'SIMULATION_ROLLUP_INTERVAL': '0',
+            'SIMULATION_MAINTENANCE_INTERVAL': '0',
+        }
+        print(
+            f"{count} updates from {users} users, {concurrent_updates} concurrent "
+            f"updates per process, {api_latency * 1000:.0f} ms Bot API latency"
+        )
+        await run_polling(stub, env, updates, timeout)
+        for worker_count in workers:
+            await run_webhook(stub, env, updates, worker_count, routing, senders, timeout)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark polling vs. webhook update throughput")
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4],
+                        help="webhook worker counts to measure")
+    parser.add_argument('--routing', choices=['user', 'reuse_port'], default='user')
+    parser.add_argument('--concurrent-updates', type=int, default=8)
+    parser.add_argument('--api-latency', type=float, default=0.02,
+                        help="artificial Bot API latency in seconds")
+    parser.add_argument('--senders', type=int, default=40,
+                        help="parallel webhook connections, like Telegram's max_connections")
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+    asyncio.run(main(args.updates, args.users, args.workers, args.routing,
+                     args.concurrent_updates, args.api_latency, args.senders, args.timeout))
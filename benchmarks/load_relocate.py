@@ -0,0 +1,275 @@
+# benchmarks/load_relocate.py
+"""
+Load generator for /relocate conversations, to find how many one process
+can handle.
+
+Simulated users start conversations open-loop: arrivals follow a Poisson
+process at the rate of the current stage, whether or not the bot keeps
+up, as real users would. Each user sends /relocate and, after a think
+time, either presses a popular-city button or picks "Other City" and
+types a city and a country (a known one, or with --new-city-share one
+the bot has to scrape, keeping it when offered corrections). Updates go through Application.process_update,
+at most --concurrent-updates at a time like BOT_CONCURRENT_UPDATES, so
+their latency includes waiting for a slot.
+
+The arrival rate is ramped through --rates, --stage-seconds each. Per
+stage the tool reports the conversations started and finished, the peak
+of concurrent conversations, update latency and event loop lag. A stage
+is saturated when p95 latency exceeds --slo-ms or p99 loop lag exceeds
+--max-lag-ms; the ramp stops after the first saturated stage.
+
+Runs against the Bot API stub (--api-latency per call) and recorded
+Numbeo pages, in scratch databases like bench_e2e.
+
+    python -m benchmarks.load_relocate --rates 5 10 20 40 80 --stage-seconds 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.bench_e2e import (
+    ERROR_PREFIXES,
+    HOME,
+    TARGETS,
+    Driver,
+    build,
+    load_popular_cities,
+    scratch_databases
+)
+from benchmarks.stub_numbeo import StubNumbeoServer
+from benchmarks.stub_telegram import StubTelegramServer
+from src.data.numbeo import scraper
+from src.data.users.writer import start_user_writer, stop_user_writer
+
+FIRST_USER_ID = 9_200_000_000
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a task sleeping for interval"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def take(self) -> List[float]:
+        """The samples since the last call"""
+        samples, self.samples = self.samples, []
+        return samples
+
+class Stage:
+    """What happened while one arrival rate was offered"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.started = 0
+        # Of the conversations started in the stage, by the end of it
+        self.finished = 0
+        self.errors = 0
+        self.peak_active = 0
+        self.latencies: List[float] = []
+        self.lag: List[float] = []
+
+    def summary(self) -> Dict[str, Any]:
+        def percentile(values: List[float], q: float) -> float:
+            if not values:
+                return 0.0
+            values = sorted(values)
+            return values[max(0, min(len(values) - 1, round(q * len(values)) - 1))]
+
+        return {
+            'rate': self.rate,
+            'started': self.started,
+            'finished': self.finished,
+            'errors': self.errors,
+            'peak_active': self.peak_active,
+            'updates': len(self.latencies),
+            'p50_ms': percentile(self.latencies, 0.50) * 1000,
+            'p95_ms': percentile(self.latencies, 0.95) * 1000,
+            'p99_ms': percentile(self.latencies, 0.99) * 1000,
+            'lag_p50_ms': percentile(self.lag, 0.50) * 1000,
+            'lag_p99_ms': percentile(self.lag, 0.99) * 1000,
+            'lag_max_ms': max(self.lag, default=0.0) * 1000,
+        }
+
+class LoadGenerator:
+    """Starts conversations open-loop and records them against the current stage"""
+
+    def __init__(self, driver: Driver, args: argparse.Namespace):
+        self.driver = driver
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.slots = asyncio.Semaphore(args.concurrent_updates)
+        self.active = 0
+        self.user_ids = iter(range(FIRST_USER_ID, FIRST_USER_ID + 10**9))
+        self.new_cities = 0
+        self.conversations: set = set()
+
+    async def think(self) -> None:
+        await asyncio.sleep(self.random.expovariate(1 / self.args.think_time))
+
+    async def send(self, stage: Stage, update) -> None:
+        """Process an update once a slot is free, timing it from arrival"""
+        start = time.perf_counter()
+        async with self.slots:
+            await self.driver.application.process_update(update)
+        stage.latencies.append(time.perf_counter() - start)
+
+    def typed_city(self):
+        """A city a user types: mostly known ones, sometimes one never seen"""
+        if self.random.random() < self.args.new_city_share:
+            self.new_cities += 1
+            return f"Load City {self.new_cities}", 'Loadland'
+        return self.random.choice([HOME, *TARGETS])
+
+    async def conversation(self, stage: Stage) -> None:
+        user_id = next(self.user_ids)
+        driver = self.driver
+        stage.started += 1
+        self.active += 1
+        stage.peak_active = max(stage.peak_active, self.active)
+        try:
+            await self.send(stage, driver.message(user_id, '/relocate'))
+            await self.think()
+            if self.random.random() < self.args.other_city_share:
+                city, country = self.typed_city()
+                await self.send(stage, driver.callback(user_id, 'other_city'))
+                await self.think()
+                await self.send(stage, driver.message(user_id, city))
+                if driver.suggested(user_id):
+                    await self.think()
+                    await self.send(stage, driver.callback(user_id, 'keep_city'))
+                await self.think()
+                await self.send(stage, driver.message(user_id, country))
+                if driver.suggested(user_id):
+                    await self.think()
+                    await self.send(stage, driver.callback(user_id, 'keep_country'))
+            else:
+                city, country = self.random.choice(TARGETS)
+                await self.send(stage, driver.callback(user_id, f"relocate_{city}_{country}"))
+            stage.finished += 1
+            if driver.stub.last_texts.get(user_id, '').startswith(ERROR_PREFIXES):
+                stage.errors += 1
+        finally:
+            self.active -= 1
+
+    async def run_stage(self, stage: Stage, seconds: float) -> None:
+        """Start conversations at the stage's rate for the given time"""
+        arrival = time.perf_counter()
+        deadline = arrival + seconds
+        while True:
+            # Scheduled from the previous arrival rather than from when the
+            # loop got round to it, so a lagging loop does not lower the rate
+            arrival += self.random.expovariate(stage.rate)
+            if arrival >= deadline:
+                await asyncio.sleep(deadline - time.perf_counter())
+                return
+            await asyncio.sleep(arrival - time.perf_counter())
+            task = asyncio.ensure_future(self.conversation(stage))
+            self.conversations.add(task)
+            task.add_done_callback(self.conversations.discard)
+
+    def saturated(self, summary: Dict[str, Any]) -> bool:
+        return (summary['p95_ms'] > self.args.slo_ms
+                or summary['lag_p99_ms'] > self.args.max_lag_ms)
+
+def print_stage(summary: Dict[str, Any], saturated: bool) -> None:
+    print(f"{summary['rate']:>7.1f} {summary['started']:>8} {summary['finished']:>8} "
+          f"{summary['peak_active']:>6} {summary['p50_ms']:>8.1f} {summary['p95_ms']:>8.1f} "
+          f"{summary['p99_ms']:>8.1f} {summary['lag_p99_ms']:>8.1f} {summary['lag_max_ms']:>8.1f}"
+          f"{'  saturated' if saturated else ''}", flush=True)
+
+async def main(args: argparse.Namespace) -> None:
+    scraper.SCRAPER_CONFIG.update(min_delay=0, max_delay=0)
+    summaries = []
+    async with scratch_databases():
+        async with StubTelegramServer(latency=args.api_latency) as stub, \
+                StubNumbeoServer(latency=args.numbeo_latency, fallback='Berlin') as numbeo:
+            scraper.SCRAPER_CONFIG['base_url'] = numbeo.base_url
+            application = build(stub.api_url)
+            await application.initialize()
+            start_user_writer()
+            monitor = LoopLagMonitor()
+            try:
+                await load_popular_cities()
+                generator = LoadGenerator(Driver(application, stub, args.concurrent_updates), args)
+                monitor.start()
+                print(f"{'conv/s':>7} {'started':>8} {'finished':>8} {'active':>6} "
+                      f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'lag p99':>8} {'lag max':>8}")
+                for rate in args.rates:
+                    stage = Stage(rate)
+                    monitor.take()
+                    await generator.run_stage(stage, args.stage_seconds)
+                    stage.lag = monitor.take()
+                    summary = stage.summary()
+                    summary['saturated'] = generator.saturated(summary)
+                    summaries.append(summary)
+                    print_stage(summary, summary['saturated'])
+                    if summary['saturated']:
+                        break
+                # Let the conversations still running finish, within reason
+                if generator.conversations:
+                    await asyncio.wait(generator.conversations, timeout=args.think_time * 10 + 30)
+            finally:
+                await monitor.stop()
+                await stop_user_writer()
+                await application.shutdown()
+                await scraper.close_scraper_session()
+
+    healthy = [summary for summary in summaries if not summary['saturated']]
+    if healthy and len(healthy) < len(summaries):
+        best = healthy[-1]
+        print(f"\nSaturates between {best['rate']:g} and {summaries[-1]['rate']:g} "
+              f"conversations/s; the last healthy stage peaked at {best['peak_active']} "
+              "concurrent conversations")
+    elif healthy:
+        print(f"\nNo saturation up to {healthy[-1]['rate']:g} conversations/s "
+              f"({healthy[-1]['peak_active']} concurrent conversations)")
+    else:
+        print("\nSaturated at the first stage already")
+    if args.output:
+        args.output.write_text(json.dumps({'parameters': {
+            key: value for key, value in vars(args).items() if key != 'output'
+        }, 'stages': summaries}, indent=2, default=str) + '\n')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ramp /relocate conversations until the bot saturates")
+    parser.add_argument('--rates', type=float, nargs='+', default=[5, 10, 20, 40, 80],
+                        help="conversation arrival rates per second, one stage each")
+    parser.add_argument('--stage-seconds', type=float, default=20)
+    parser.add_argument('--think-time', type=float, default=2.0,
+                        help="mean seconds between a user's messages")
+    parser.add_argument('--other-city-share', type=float, default=0.3,
+                        help="share of users typing a city rather than pressing a button")
+    parser.add_argument('--new-city-share', type=float, default=0.1,
+                        help="share of typed cities the bot has never seen")
+    parser.add_argument('--concurrent-updates', type=int, default=64,
+                        help="updates processed at the same time, like BOT_CONCURRENT_UPDATES")
+    parser.add_argument('--api-latency', type=float, default=0.05,
+                        help="Bot API latency per call in seconds")
+    parser.add_argument('--numbeo-latency', type=float, default=0.5,
+                        help="Numbeo page latency in seconds")
+    parser.add_argument('--slo-ms', type=float, default=1000,
+                        help="p95 update latency above which a stage is saturated")
+    parser.add_argument('--max-lag-ms', type=float, default=100,
+                        help="p99 event loop lag above which a stage is saturated")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', type=Path, help="write the stage summaries as JSON")
+    asyncio.run(main(parser.parse_args()))
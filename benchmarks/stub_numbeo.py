@@ -0,0 +1,97 @@
+# benchmarks/stub_numbeo.py
+"""
+Local stub of numbeo.com that serves the pages in benchmarks/fixtures/numbeo.
+
+Point the scraper at it by setting SCRAPER_CONFIG['base_url'] (or the
+NUMBEO_BASE_URL environment variable) to the stub's base URL. Unknown
+cities get a 404, like the real site, unless a fallback page is given:
+then every unknown city is served that page, so a benchmark can scrape
+as many distinct cities as it needs. Cities given in statuses get that
+error status instead, for the tests of the scraper's failure handling.
+
+    python -m benchmarks.stub_numbeo --port 8081
+"""
+import argparse
+import asyncio
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from aiohttp import web
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures' / 'numbeo'
+
+def load_fixtures(fixtures_dir: Path = FIXTURES_DIR) -> Dict[str, str]:
+    """Load fixture pages keyed by their URL slug (file name without .html)"""
+    return {path.stem: path.read_text() for path in sorted(fixtures_dir.glob('*.html'))}
+
+class StubNumbeoServer:
+    """Minimal aiohttp server serving recorded cost-of-living pages"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 fixtures_dir: Path = FIXTURES_DIR, fallback: Optional[str] = None,
+                 statuses: Optional[Dict[str, int]] = None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.pages = load_fixtures(fixtures_dir)
+        # Page served for cities without a fixture of their own
+        self.fallback_page = self.pages[fallback] if fallback else None
+        # Error statuses answered for some cities, e.g. {'Berlin': 503}
+        self.statuses = statuses or {}
+        self.requests = 0
+        # Client addresses seen, one per connection the scraper opened
+        self.connections: Set[Tuple] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _handle_city(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info('peername'))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        status = self.statuses.get(request.match_info['city'])
+        if status is not None:
+            return web.Response(status=status, text=f"Error {status}")
+        page = self.pages.get(request.match_info['city'], self.fallback_page)
+        if page is None:
+            raise web.HTTPNotFound()
+        return web.Response(text=page, content_type='text/html')
+
+    async def start(self) -> 'StubNumbeoServer':
+        app = web.Application()
+        app.router.add_get('/cost-of-living/in/{city}', self._handle_city)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Resolve the real port when an ephemeral one was requested
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> 'StubNumbeoServer':
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+async def serve_forever(host: str, port: int, latency: float) -> None:
+    async with StubNumbeoServer(host, port, latency) as server:
+        print(f"Serving {len(server.pages)} fixture pages on {server.base_url}")
+        await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded Numbeo pages locally")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="artificial per-request latency in seconds")
+    args = parser.parse_args()
+    asyncio.run(serve_forever(args.host, args.port, args.latency))
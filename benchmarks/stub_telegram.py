@@ -0,0 +1,193 @@
+# benchmarks/stub_telegram.py
+"""
+Local stub of the Telegram Bot API, so the bot can be driven end to end
+without network access.
+
+Point the bot at it by setting TELEGRAM_API_BASE_URL to the stub's
+api_url. Updates pushed with push_updates are handed out through
+getUpdates (polling mode); in webhook mode they are POSTed to the bot
+by the caller instead. Every method call is counted, the last text sent
+to each chat is kept, and wait_for_calls blocks until the bot has made
+enough of them.
+
+    python -m benchmarks.stub_telegram --port 8082
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+BOT_USER = {
+    'id': 1000000,
+    'is_bot': True,
+    'first_name': 'Shakespr',
+    'username': 'shakespr_bot',
+}
+
+# Methods whose calls stand for a reply to the user
+REPLY_METHODS = ('sendMessage', 'editMessageText')
+
+def make_message_update(update_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    """A private-chat text message update, as Telegram would send it"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"}
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private', 'first_name': user['first_name']},
+        'from': user,
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [
+            {'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}
+        ]
+    return {'update_id': update_id, 'message': message}
+
+def make_callback_update(update_id: int, user_id: int, data: str) -> Dict[str, Any]:
+    """A callback query update for a button pressed under one of the bot's messages"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"}
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'chat_instance': str(user_id),
+            'from': user,
+            'data': data,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': "Choose a city",
+            },
+        },
+    }
+
+class StubTelegramServer:
+    """Minimal aiohttp server answering Bot API calls from the bot"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        # Artificial delay for every call other than getUpdates
+        self.latency = latency
+        self.calls: Counter = Counter()
+        # Last text sent or edited, per chat
+        self.last_texts: Dict[int, str] = {}
+        self._pending: List[Dict[str, Any]] = []
+        self._new_updates = asyncio.Event()
+        self._call_made = asyncio.Event()
+        self._message_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def api_url(self) -> str:
+        """Value for TELEGRAM_API_BASE_URL; the token is appended by the bot"""
+        return f"{self.base_url}/bot"
+
+    def replies(self) -> int:
+        """Number of messages sent or edited by the bot"""
+        return sum(self.calls[method] for method in REPLY_METHODS)
+
+    def push_updates(self, updates: List[Dict[str, Any]]) -> None:
+        """Queue updates for the bot's next getUpdates calls"""
+        self._pending.extend(updates)
+        self._new_updates.set()
+
+    async def wait_for_calls(self, count: int, methods=REPLY_METHODS,
+                             timeout: Optional[float] = None) -> None:
+        """Wait until the bot has made count calls to the given methods"""
+        async def wait():
+            while sum(self.calls[method] for method in methods) < count:
+                self._call_made.clear()
+                await self._call_made.wait()
+        await asyncio.wait_for(wait(), timeout)
+
+    def _message(self, params: Dict[str, str]) -> Dict[str, Any]:
+        chat_id = int(params.get('chat_id', 0))
+        return {
+            'message_id': int(params.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': params.get('text', ''),
+        }
+
+    async def _get_updates(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 100))
+        # Confirmed updates are forgotten, as on the real server
+        self._pending = [update for update in self._pending if update['update_id'] >= offset]
+        if not self._pending:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get('timeout', 0)))
+            except asyncio.TimeoutError:
+                pass
+        return self._pending[:limit]
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = dict(await request.post())
+        if method == 'getUpdates':
+            result: Any = await self._get_updates(params)
+        else:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if method == 'getMe':
+                result = BOT_USER
+            elif method in REPLY_METHODS:
+                result = self._message(params)
+                self.last_texts[result['chat']['id']] = result['text']
+            else:
+                # setWebhook, deleteWebhook, answerCallbackQuery...
+                result = True
+        self.calls[method] += 1
+        self._call_made.set()
+        return web.Response(text=json.dumps({'ok': True, 'result': result}),
+                            content_type='application/json')
+
+    async def start(self) -> 'StubTelegramServer':
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle_method)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Resolve the real port when an ephemeral one was requested
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> 'StubTelegramServer':
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+async def serve_forever(host: str, port: int, latency: float) -> None:
+    async with StubTelegramServer(host, port, latency) as server:
+        print(f"Serving the Bot API on {server.api_url}")
+        await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a stub Telegram Bot API locally")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="artificial per-call latency in seconds")
+    args = parser.parse_args()
+    asyncio.run(serve_forever(args.host, args.port, args.latency))
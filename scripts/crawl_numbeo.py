@@ -0,0 +1,189 @@
+# scripts/crawl_numbeo.py
+"""
+Bulk-populate numbeo_col from a list of cities.
+
+The city list is a CSV file with one "city,country" pair per line; blank
+lines and lines starting with # are ignored. Progress is appended to a
+checkpoint file as each batch is committed, so an interrupted run picks up
+where it stopped when started again with the same checkpoint.
+
+    python scripts/crawl_numbeo.py cities.csv --concurrency 4 --rate 0.5
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.data.numbeo.fetcher import normalize_city_key, store_numbeo_batch
+from src.data.numbeo.scraper import close_scraper_session, scrape_city_data
+from src.utils.database import close_db_pools
+from src.utils.logging import logger, setup_logging
+from src.utils.ratelimit import TokenBucket
+
+def read_city_list(path: Path) -> List[Tuple[str, str]]:
+    """Read (city, country) pairs, dropping duplicates"""
+    cities = {}
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].lstrip().startswith('#'):
+                continue
+            if len(row) < 2:
+                logger.warning("Skipping malformed line: %s", ','.join(row))
+                continue
+            city, country = row[0].strip(), row[1].strip()
+            cities.setdefault(normalize_city_key(city, country), (city, country))
+    return list(cities.values())
+
+class Checkpoint:
+    """Append-only JSON lines record of finished cities"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.status: Dict[Tuple[str, str], str] = {}
+        if path.exists():
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        key = normalize_city_key(entry['city'], entry['country'])
+                        self.status[key] = entry['status']
+
+    def is_done(self, city: str, country: str, retry_failed: bool) -> bool:
+        status = self.status.get(normalize_city_key(city, country))
+        return status == 'stored' or (status == 'failed' and not retry_failed)
+
+    def record(self, entries: List[Tuple[str, str, str]]) -> None:
+        with open(self.path, 'a') as f:
+            for city, country, status in entries:
+                f.write(json.dumps({'city': city, 'country': country, 'status': status}) + '\n')
+                self.status[normalize_city_key(city, country)] = status
+
+class CrawlStats:
+    """Counters and throughput for one crawl run"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.started = time.monotonic()
+        self.stored = 0
+        self.scrape_failures = 0
+        self.store_failures = 0
+
+    @property
+    def processed(self) -> int:
+        return self.stored + self.scrape_failures + self.store_failures
+
+    def report(self) -> str:
+        minutes = (time.monotonic() - self.started) / 60
+        rate = self.processed / minutes if minutes else 0.0
+        return (
+            f"{self.processed}/{self.total} processed, {self.stored} stored, "
+            f"{self.scrape_failures} scrape failures, {self.store_failures} store failures, "
+            f"{rate:.1f} cities/min"
+        )
+
+async def crawl(cities: List[Tuple[str, str]], checkpoint: Checkpoint, concurrency: int,
+                rate: float, batch_size: int, report_every: float) -> CrawlStats:
+    """Scrape cities with bounded concurrency and store them in batches"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for city in cities:
+        queue.put_nowait(city)
+
+    stats = CrawlStats(len(cities))
+    bucket = TokenBucket(rate)
+    batch: List[Tuple[str, str, dict]] = []
+    flush_lock = asyncio.Lock()
+
+    async def flush() -> None:
+        nonlocal batch
+        async with flush_lock:
+            pending, batch = batch, []
+            if not pending:
+                return
+            try:
+                stored = set(await store_numbeo_batch(pending))
+            except Exception:
+                logger.exception("Batch of %s cities failed to store", len(pending))
+                stored = set()
+            results = [
+                (city, country, 'stored' if (city, country) in stored else 'failed')
+                for city, country, _ in pending
+            ]
+            checkpoint.record(results)
+            stats.stored += len(stored)
+            stats.store_failures += len(pending) - len(stored)
+
+    async def worker() -> None:
+        while True:
+            try:
+                city, country = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await bucket.acquire()
+            data = await scrape_city_data(city, polite=False)
+            if not data:
+                stats.scrape_failures += 1
+                checkpoint.record([(city, country, 'failed')])
+                continue
+            batch.append((city, country, data))
+            if len(batch) >= batch_size:
+                await flush()
+
+    async def reporter() -> None:
+        while True:
+            await asyncio.sleep(report_every)
+            logger.info(stats.report())
+
+    reporter_task = asyncio.create_task(reporter())
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        reporter_task.cancel()
+        # Keep whatever was scraped before an interruption
+        await flush()
+    return stats
+
+async def main(args: argparse.Namespace) -> None:
+    checkpoint = Checkpoint(Path(args.checkpoint))
+    cities = [
+        (city, country) for city, country in read_city_list(Path(args.cities))
+        if not checkpoint.is_done(city, country, args.retry_failed)
+    ]
+    logger.info("%s cities to crawl, checkpoint at %s", len(cities), args.checkpoint)
+
+    stats = None
+    try:
+        stats = await crawl(cities, checkpoint, args.concurrency, args.rate,
+                            args.batch_size, args.report_every)
+    finally:
+        await close_scraper_session()
+        await close_db_pools()
+        # stats is unset if the crawl failed before returning
+        if stats is not None:
+            logger.info("Done: %s", stats.report())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-populate numbeo_col from a city list")
+    parser.add_argument('cities', help="CSV file of city,country lines")
+    parser.add_argument('--checkpoint', default='data/crawl_checkpoint.jsonl',
+                        help="progress file used to resume interrupted runs")
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="maximum number of scrapes in flight")
+    parser.add_argument('--rate', type=float, default=0.5,
+                        help="maximum scrapes started per second")
+    parser.add_argument('--batch-size', type=int, default=25,
+                        help="cities written per database transaction")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="retry cities that failed in a previous run")
+    parser.add_argument('--report-every', type=float, default=30.0,
+                        help="seconds between progress reports")
+    setup_logging()
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        logger.info("Interrupted, progress saved to the checkpoint")
@@ -0,0 +1,38 @@
+# scripts/export_city_snapshot.py
+"""
+Publish the latest costs of every city as a memory-mapped snapshot file
+(see src/data/numbeo/snapshot.py). The file is replaced atomically, and
+running bots switch to it within CITY_SNAPSHOT_CHECK_INTERVAL seconds.
+
+    python scripts/export_city_snapshot.py data/city_snapshot.bin
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.data.numbeo.snapshot import SNAPSHOT_CONFIG, export_snapshot
+from src.utils.database import close_db_pools
+from src.utils.logging import setup_logging
+
+async def main(path: str) -> int:
+    try:
+        cities = await export_snapshot(path)
+    finally:
+        await close_db_pools()
+    if cities is None:
+        return 1
+    print(f"Exported {cities} cities to {path}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the city snapshot file")
+    parser.add_argument('path', nargs='?', default=SNAPSHOT_CONFIG['path'] or None,
+                        help="snapshot file (default CITY_SNAPSHOT_PATH)")
+    args = parser.parse_args()
+    if not args.path:
+        parser.error("no path given and CITY_SNAPSHOT_PATH is not set")
+    setup_logging()
+    sys.exit(asyncio.run(main(args.path)))
@@ -8,11 +8,15 @@ setup(
     package_dir={"": "."},
     include_package_data=True,
     install_requires=[
-        'python-telegram-bot>=20.7',
+        'python-telegram-bot[job-queue]>=20.7',
         'psycopg2-binary>=2.9.9',
+        'psycopg[binary]>=3.1.18',
+        'psycopg-pool>=3.2.1',
         'python-dotenv>=1.0.0',
         'beautifulsoup4>=4.12.2',
-        'requests>=2.31.0',
+        'lxml>=5.0.0',
+        'numpy>=1.24',
+        'aiohttp>=3.9.1',
         'alembic>=1.13.1',
         'sentry-sdk>=1.39.1'
     ],
@@ -1,32 +1,39 @@
 DO $$ 
 BEGIN
-    DROP PROCEDURE IF EXISTS numbeo_col.insert_update_data;
-    DROP PROCEDURE IF EXISTS numbeo_col.insert_restaurant_data;
-    DROP PROCEDURE IF EXISTS numbeo_col.insert_market_data;
-    DROP PROCEDURE IF EXISTS numbeo_col.insert_transportation_data;
-    DROP PROCEDURE IF EXISTS numbeo_col.insert_utilities_data;
-    DROP PROCEDURE IF EXISTS numbeo_col.insert_leisure_data;
-    DROP PROCEDURE IF EXISTS numbeo_col.insert_clothing_data;
-    DROP PROCEDURE IF EXISTS numbeo_col.insert_rent_data;
+    DROP ROUTINE IF EXISTS numbeo_col.insert_update_data;
+    DROP ROUTINE IF EXISTS numbeo_col.insert_restaurant_data;
+    DROP ROUTINE IF EXISTS numbeo_col.insert_market_data;
+    DROP ROUTINE IF EXISTS numbeo_col.insert_transportation_data;
+    DROP ROUTINE IF EXISTS numbeo_col.insert_utilities_data;
+    DROP ROUTINE IF EXISTS numbeo_col.insert_leisure_data;
+    DROP ROUTINE IF EXISTS numbeo_col.insert_clothing_data;
+    DROP ROUTINE IF EXISTS numbeo_col.insert_rent_data;
 EXCEPTION
     WHEN OTHERS THEN NULL;
 END $$;
 
--- Insert update record
-CREATE OR REPLACE PROCEDURE numbeo_col.insert_update_data(
+-- Insert update record and return its update_id, which the cost set
+-- procedures below take as their first argument
+CREATE OR REPLACE FUNCTION numbeo_col.insert_update_data(
     IN p_city_id INTEGER,
     IN p_date TIMESTAMP
 )
+RETURNS INTEGER
 LANGUAGE plpgsql
 AS $$
+DECLARE
+    v_update_id INTEGER;
 BEGIN
     INSERT INTO numbeo_col.updates (city_id, date)
-    VALUES (p_city_id, p_date);
+    VALUES (p_city_id, p_date)
+    RETURNING update_id INTO v_update_id;
+    RETURN v_update_id;
 END;
 $$;
 
 -- Insert restaurant costs
 CREATE OR REPLACE PROCEDURE numbeo_col.insert_restaurant_data(
+    IN p_update_id INTEGER,
     IN p_cheap_meal_for_one DECIMAL,
     IN p_meal_for_two DECIMAL,
     IN p_mcdonalds_meal DECIMAL,
@@ -41,7 +48,7 @@ AS $$
 BEGIN
     INSERT INTO numbeo_col.restaurant_cost_sets
     VALUES (
-        (SELECT MAX(update_id) FROM numbeo_col.updates),
+        p_update_id,
         p_cheap_meal_for_one,
         p_meal_for_two,
         p_mcdonalds_meal,
@@ -56,6 +63,7 @@ $$;
 
 -- Insert market costs
 CREATE OR REPLACE PROCEDURE numbeo_col.insert_market_data(
+    IN p_update_id INTEGER,
     IN p_milk_one_liter DECIMAL,
     IN p_bread_loaf DECIMAL,
     IN p_white_rice_one_kg DECIMAL,
@@ -81,7 +89,7 @@ AS $$
 BEGIN
     INSERT INTO numbeo_col.market_cost_sets
     VALUES (
-        (SELECT MAX(update_id) FROM numbeo_col.updates),
+        p_update_id,
         p_milk_one_liter,
         p_bread_loaf,
         p_white_rice_one_kg,
@@ -107,6 +115,7 @@ $$;
 
 -- Insert transportation costs
 CREATE OR REPLACE PROCEDURE numbeo_col.insert_transportation_data(
+    IN p_update_id INTEGER,
     IN p_local_transit_one_way DECIMAL,
     IN p_monthly_transit_pass DECIMAL,
     IN p_taxi_base_fare DECIMAL,
@@ -121,7 +130,7 @@ AS $$
 BEGIN
     INSERT INTO numbeo_col.transportation_cost_sets
     VALUES (
-        (SELECT MAX(update_id) FROM numbeo_col.updates),
+        p_update_id,
         p_local_transit_one_way,
         p_monthly_transit_pass,
         p_taxi_base_fare,
@@ -136,6 +145,7 @@ $$;
 
 -- Insert utilities costs
 CREATE OR REPLACE PROCEDURE numbeo_col.insert_utilities_data(
+    IN p_update_id INTEGER,
     IN p_all_basic DECIMAL,
     IN p_prepaid_mobile_one_min DECIMAL,
     IN p_internet_sixty_mbps DECIMAL
@@ -145,7 +155,7 @@ AS $$
 BEGIN
     INSERT INTO numbeo_col.utilities_cost_sets
     VALUES (
-        (SELECT MAX(update_id) FROM numbeo_col.updates),
+        p_update_id,
         p_all_basic,
         p_prepaid_mobile_one_min,
         p_internet_sixty_mbps
@@ -155,6 +165,7 @@ $$;
 
 -- Insert leisure costs
 CREATE OR REPLACE PROCEDURE numbeo_col.insert_leisure_data(
+    IN p_update_id INTEGER,
     IN p_fit_club_one_month DECIMAL,
     IN p_tennis_court_one_hr DECIMAL,
     IN p_cinema_ticket_one_seat DECIMAL
@@ -164,7 +175,7 @@ AS $$
 BEGIN
     INSERT INTO numbeo_col.leisure_cost_sets
     VALUES (
-        (SELECT MAX(update_id) FROM numbeo_col.updates),
+        p_update_id,
         p_fit_club_one_month,
         p_tennis_court_one_hr,
         p_cinema_ticket_one_seat
@@ -174,6 +185,7 @@ $$;
 
 -- Insert clothing costs
 CREATE OR REPLACE PROCEDURE numbeo_col.insert_clothing_data(
+    IN p_update_id INTEGER,
     IN p_pair_of_jeans DECIMAL,
     IN p_summer_dress DECIMAL,
     IN p_nike_running_shoes DECIMAL,
@@ -184,7 +196,7 @@ AS $$
 BEGIN
     INSERT INTO numbeo_col.clothing_cost_sets
     VALUES (
-        (SELECT MAX(update_id) FROM numbeo_col.updates),
+        p_update_id,
         p_pair_of_jeans,
         p_summer_dress,
         p_nike_running_shoes,
@@ -195,6 +207,7 @@ $$;
 
 -- Insert rent costs
 CREATE OR REPLACE PROCEDURE numbeo_col.insert_rent_data(
+    IN p_update_id INTEGER,
     IN p_apt_one_bdrm_ctr DECIMAL,
     IN p_apt_one_bdrm_out DECIMAL,
     IN p_apt_three_bdrm_ctr DECIMAL,
@@ -205,7 +218,7 @@ AS $$
 BEGIN
     INSERT INTO numbeo_col.rent_cost_sets
     VALUES (
-        (SELECT MAX(update_id) FROM numbeo_col.updates),
+        p_update_id,
         p_apt_one_bdrm_ctr,
         p_apt_one_bdrm_out,
         p_apt_three_bdrm_ctr,
@@ -143,3 +143,145 @@ CREATE TABLE IF NOT EXISTS numbeo_col.transportation_cost_sets (
         ON DELETE RESTRICT
         ON UPDATE CASCADE
 );
+
+-- Case- and whitespace-insensitive city lookups, on the expression the
+-- fetcher compares with names normalized by normalize_city_name. Unique,
+-- so a city is stored once however it was spelled; merge any rows
+-- differing only in case or spacing before upgrading an existing database.
+-- It replaces idx_cities_lower_name_country, which ignored only the case.
+DROP INDEX IF EXISTS numbeo_col.idx_cities_lower_name_country;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_cities_name_country_key
+    ON numbeo_col.cities (
+        LOWER(btrim(regexp_replace(city_name, '\s+', ' ', 'g'))),
+        LOWER(btrim(regexp_replace(country, '\s+', ' ', 'g')))
+    );
+
+-- Latest update per city, answerable by an index-only scan
+CREATE INDEX IF NOT EXISTS idx_updates_city_date
+    ON numbeo_col.updates (city_id, date DESC, update_id DESC);
+
+-- Latest snapshot of each city in one wide row, so the hot read is a
+-- single lookup instead of a join over every cost table. Maintained by
+-- the snapshot INSERT in src/data/numbeo/fetcher.py.
+CREATE TABLE IF NOT EXISTS numbeo_col.city_latest_costs (
+    city_id SMALLINT PRIMARY KEY,
+    update_id INTEGER NOT NULL,
+    last_updated TIMESTAMP NOT NULL,
+    -- restaurant_cost_sets
+    cheap_meal_for_one DECIMAL(5,2),
+    meal_for_two DECIMAL(5,2),
+    mcdonalds_meal DECIMAL(4,2),
+    domestic_beer DECIMAL(4,2),
+    imported_beer DECIMAL(4,2),
+    cappuccino DECIMAL(4,2),
+    coke_or_pepsi DECIMAL(4,2),
+    water DECIMAL(4,2),
+    -- market_cost_sets
+    milk_one_liter DECIMAL(4,2),
+    bread_loaf DECIMAL(4,2),
+    white_rice_one_kg DECIMAL(4,2),
+    dozen_eggs DECIMAL(4,2),
+    cheese_one_kg DECIMAL(5,2),
+    chicken_breast_one_kg DECIMAL(4,2),
+    beef_round_one_kg DECIMAL(4,2),
+    apples_one_kg DECIMAL(4,2),
+    bananas_one_kg DECIMAL(4,2),
+    oranges_one_kg DECIMAL(4,2),
+    tomatoes_one_kg DECIMAL(4,2),
+    potatoes_one_kg DECIMAL(4,2),
+    onions_one_kg DECIMAL(4,2),
+    lettuce_head DECIMAL(4,2),
+    water_one_and_half_liter DECIMAL(4,2),
+    wine_mid_range DECIMAL(5,2),
+    domestic_beer_half_liter DECIMAL(4,2),
+    imported_beer_third_liter DECIMAL(4,2),
+    cigarettes_pack DECIMAL(4,2),
+    -- transportation_cost_sets
+    local_transit_one_way DECIMAL(4,2),
+    monthly_transit_pass DECIMAL(5,2),
+    taxi_base_fare DECIMAL(4,2),
+    taxi_one_km DECIMAL(4,2),
+    taxi_one_hr DECIMAL(5,2),
+    gasoline_one_liter DECIMAL(4,2),
+    volkswagen_golf DECIMAL(8,2),
+    toyota_corolla DECIMAL(8,2),
+    -- utilities_cost_sets
+    all_basic DECIMAL(6,2),
+    prepaid_mobile_one_min DECIMAL(4,2),
+    internet_sixty_mbps DECIMAL(5,2),
+    -- leisure_cost_sets
+    fit_club_one_month DECIMAL(5,2),
+    tennis_court_one_hr DECIMAL(5,2),
+    cinema_ticket_one_seat DECIMAL(4,2),
+    -- clothing_cost_sets
+    pair_of_jeans DECIMAL(5,2),
+    summer_dress DECIMAL(5,2),
+    nike_running_shoes DECIMAL(5,2),
+    leather_business_shoes DECIMAL(5,2),
+    -- rent_cost_sets
+    apt_one_bdrm_ctr DECIMAL(7,2),
+    apt_one_bdrm_out DECIMAL(7,2),
+    apt_three_bdrm_ctr DECIMAL(7,2),
+    apt_three_bdrm_out DECIMAL(7,2),
+    CONSTRAINT fk_city_latest_costs_cities
+        FOREIGN KEY (city_id)
+        REFERENCES numbeo_col.cities(city_id)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE,
+    CONSTRAINT fk_city_latest_costs_updates
+        FOREIGN KEY (update_id)
+        REFERENCES numbeo_col.updates(update_id)
+        ON DELETE RESTRICT
+        ON UPDATE CASCADE
+);
+
+-- Backfill cities stored before city_latest_costs existed
+INSERT INTO numbeo_col.city_latest_costs (
+    city_id, update_id, last_updated,
+    cheap_meal_for_one, meal_for_two, mcdonalds_meal, domestic_beer, imported_beer, cappuccino, coke_or_pepsi, water,
+    milk_one_liter, bread_loaf, white_rice_one_kg, dozen_eggs, cheese_one_kg, chicken_breast_one_kg, beef_round_one_kg, apples_one_kg, bananas_one_kg, oranges_one_kg, tomatoes_one_kg, potatoes_one_kg, onions_one_kg, lettuce_head, water_one_and_half_liter, wine_mid_range, domestic_beer_half_liter, imported_beer_third_liter, cigarettes_pack,
+    local_transit_one_way, monthly_transit_pass, taxi_base_fare, taxi_one_km, taxi_one_hr, gasoline_one_liter, volkswagen_golf, toyota_corolla,
+    all_basic, prepaid_mobile_one_min, internet_sixty_mbps,
+    fit_club_one_month, tennis_court_one_hr, cinema_ticket_one_seat,
+    pair_of_jeans, summer_dress, nike_running_shoes, leather_business_shoes,
+    apt_one_bdrm_ctr, apt_one_bdrm_out, apt_three_bdrm_ctr, apt_three_bdrm_out
+)
+SELECT
+    c.city_id, u.update_id, u.date,
+    r.cheap_meal_for_one, r.meal_for_two, r.mcdonalds_meal, r.domestic_beer, r.imported_beer, r.cappuccino, r.coke_or_pepsi, r.water,
+    m.milk_one_liter, m.bread_loaf, m.white_rice_one_kg, m.dozen_eggs, m.cheese_one_kg, m.chicken_breast_one_kg, m.beef_round_one_kg, m.apples_one_kg, m.bananas_one_kg, m.oranges_one_kg, m.tomatoes_one_kg, m.potatoes_one_kg, m.onions_one_kg, m.lettuce_head, m.water_one_and_half_liter, m.wine_mid_range, m.domestic_beer_half_liter, m.imported_beer_third_liter, m.cigarettes_pack,
+    t.local_transit_one_way, t.monthly_transit_pass, t.taxi_base_fare, t.taxi_one_km, t.taxi_one_hr, t.gasoline_one_liter, t.volkswagen_golf, t.toyota_corolla,
+    ut.all_basic, ut.prepaid_mobile_one_min, ut.internet_sixty_mbps,
+    l.fit_club_one_month, l.tennis_court_one_hr, l.cinema_ticket_one_seat,
+    cl.pair_of_jeans, cl.summer_dress, cl.nike_running_shoes, cl.leather_business_shoes,
+    rent.apt_one_bdrm_ctr, rent.apt_one_bdrm_out, rent.apt_three_bdrm_ctr, rent.apt_three_bdrm_out
+FROM numbeo_col.cities c
+CROSS JOIN LATERAL (
+    SELECT update_id, date
+    FROM numbeo_col.updates
+    WHERE city_id = c.city_id
+    ORDER BY date DESC, update_id DESC
+    LIMIT 1
+) u
+LEFT JOIN numbeo_col.restaurant_cost_sets r ON u.update_id = r.update_id
+LEFT JOIN numbeo_col.market_cost_sets m ON u.update_id = m.update_id
+LEFT JOIN numbeo_col.transportation_cost_sets t ON u.update_id = t.update_id
+LEFT JOIN numbeo_col.utilities_cost_sets ut ON u.update_id = ut.update_id
+LEFT JOIN numbeo_col.leisure_cost_sets l ON u.update_id = l.update_id
+LEFT JOIN numbeo_col.clothing_cost_sets cl ON u.update_id = cl.update_id
+LEFT JOIN numbeo_col.rent_cost_sets rent ON u.update_id = rent.update_id
+ON CONFLICT (city_id) DO NOTHING;
+
+-- Cities Numbeo has no costs for (no page, or a page without prices),
+-- keyed by the normalized name so repeated requests for them skip the
+-- scrape until recheck_at. Each miss doubles the wait before the next.
+CREATE TABLE IF NOT EXISTS numbeo_col.city_misses (
+    city_key TEXT NOT NULL,
+    country_key TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    misses INTEGER NOT NULL DEFAULT 1,
+    first_missed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_checked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    recheck_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (city_key, country_key)
+);
@@ -103,7 +103,7 @@ CREATE OR REPLACE FUNCTION bot.get_user_simulations(
     IN p_limit INTEGER DEFAULT 5
 )
 RETURNS TABLE (
-    id INTEGER,
+    id BIGINT,
     user_id BIGINT,
     simulation_type TEXT,
     source_city TEXT,
@@ -13,6 +13,8 @@ BEGIN
     DROP FUNCTION IF EXISTS bot.update_updated_at_column() CASCADE;
     
     -- Drop tables if they exist
+    DROP TABLE IF EXISTS bot.destination_popularity CASCADE;
+    DROP TABLE IF EXISTS bot.rollup_watermarks CASCADE;
     DROP TABLE IF EXISTS bot.simulations CASCADE;
     DROP TABLE IF EXISTS bot.user_profiles CASCADE;
     
@@ -40,18 +42,182 @@ CREATE TABLE IF NOT EXISTS bot.user_profiles (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Simulation history table
+-- Simulation history, partitioned by month so per-user reads only touch
+-- small indexes and old months can be dropped cheaply. The primary key has
+-- to include the partition key. Rows outside every monthly partition land
+-- in the default partition until bot.create_simulation_partitions moves
+-- them into their month.
 CREATE TABLE IF NOT EXISTS bot.simulations (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     user_id BIGINT REFERENCES bot.user_profiles(user_id),
     simulation_type TEXT NOT NULL, -- 'relocation' or 'career'
     source_city TEXT NOT NULL,
     target_city TEXT NOT NULL,
     source_occupation TEXT,
     target_occupation TEXT,
-    simulated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    simulated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, simulated_at)
+) PARTITION BY RANGE (simulated_at);
+
+CREATE TABLE IF NOT EXISTS bot.simulations_default
+    PARTITION OF bot.simulations DEFAULT;
+
+-- A user's most recent simulations
+CREATE INDEX IF NOT EXISTS idx_simulations_user_recent
+    ON bot.simulations (user_id, simulated_at DESC);
+
+-- Simulations per destination and month, maintained incrementally by
+-- bot.refresh_destination_popularity; kept when raw months are dropped
+CREATE TABLE IF NOT EXISTS bot.destination_popularity (
+    month DATE NOT NULL,
+    target_city TEXT NOT NULL,
+    simulations BIGINT NOT NULL,
+    last_simulated_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (month, target_city)
 );
 
+-- Highest simulation id already counted by each rollup
+CREATE TABLE IF NOT EXISTS bot.rollup_watermarks (
+    name TEXT PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP
+);
+
+INSERT INTO bot.rollup_watermarks (name)
+VALUES ('destination_popularity')
+ON CONFLICT (name) DO NOTHING;
+
+-- Create the monthly partitions of bot.simulations for p_months months from
+-- p_from on, moving rows already in the default partition into them.
+-- Returns the number of partitions created.
+CREATE OR REPLACE FUNCTION bot.create_simulation_partitions(
+    IN p_from DATE DEFAULT CURRENT_DATE,
+    IN p_months INTEGER DEFAULT 3
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_start DATE;
+    v_end DATE;
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    FOR i IN 0 .. p_months - 1 LOOP
+        v_start := (date_trunc('month', p_from) + make_interval(months => i))::date;
+        v_end := (v_start + interval '1 month')::date;
+        v_name := 'simulations_' || to_char(v_start, 'YYYY_MM');
+        CONTINUE WHEN to_regclass('bot.' || v_name) IS NOT NULL;
+
+        EXECUTE format(
+            'CREATE TABLE bot.%I (LIKE bot.simulations INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+            v_name
+        );
+        -- The default partition may not keep rows of the new range
+        EXECUTE format(
+            'WITH moved AS (
+                DELETE FROM bot.simulations_default
+                WHERE simulated_at >= %L AND simulated_at < %L
+                RETURNING *
+            )
+            INSERT INTO bot.%I SELECT * FROM moved',
+            v_start, v_end, v_name
+        );
+        EXECUTE format(
+            'ALTER TABLE bot.simulations ATTACH PARTITION bot.%I FOR VALUES FROM (%L) TO (%L)',
+            v_name, v_start, v_end
+        );
+        v_created := v_created + 1;
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+
+-- Add the simulations recorded since the last run to
+-- bot.destination_popularity. Returns the number of simulations counted.
+CREATE OR REPLACE FUNCTION bot.refresh_destination_popularity()
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_from BIGINT;
+    v_to BIGINT;
+    v_counted BIGINT;
+BEGIN
+    -- Wait for inserts in progress: once they are committed, no id at or
+    -- below the new watermark can show up later
+    LOCK TABLE bot.simulations IN SHARE MODE;
+
+    SELECT last_id INTO v_from
+    FROM bot.rollup_watermarks
+    WHERE name = 'destination_popularity'
+    FOR UPDATE;
+
+    SELECT MAX(id) INTO v_to FROM bot.simulations WHERE id > v_from;
+    IF v_to IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    WITH counts AS (
+        SELECT
+            date_trunc('month', simulated_at)::date AS month,
+            target_city,
+            COUNT(*) AS simulations,
+            MAX(simulated_at) AS last_simulated_at
+        FROM bot.simulations
+        WHERE id > v_from AND id <= v_to
+        GROUP BY 1, 2
+    ), upserted AS (
+        INSERT INTO bot.destination_popularity AS p (
+            month, target_city, simulations, last_simulated_at
+        )
+        SELECT month, target_city, simulations, last_simulated_at FROM counts
+        ON CONFLICT (month, target_city) DO UPDATE SET
+            simulations = p.simulations + EXCLUDED.simulations,
+            last_simulated_at = GREATEST(p.last_simulated_at, EXCLUDED.last_simulated_at)
+    )
+    SELECT COALESCE(SUM(simulations), 0) INTO v_counted FROM counts;
+
+    UPDATE bot.rollup_watermarks
+    SET last_id = v_to, refreshed_at = CURRENT_TIMESTAMP
+    WHERE name = 'destination_popularity';
+    RETURN v_counted;
+END;
+$$;
+
+-- Drop the monthly partitions older than the current month and the
+-- p_keep_months before it, after counting them in the rollup. Returns the
+-- number of partitions dropped.
+CREATE OR REPLACE FUNCTION bot.drop_simulation_partitions(
+    IN p_keep_months INTEGER
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => p_keep_months))::date;
+    v_name TEXT;
+    v_dropped INTEGER := 0;
+BEGIN
+    PERFORM bot.refresh_destination_popularity();
+    FOR v_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'bot.simulations'::regclass
+        AND c.relname ~ '^simulations_[0-9]{4}_[0-9]{2}$'
+        AND to_date(substring(c.relname FROM 13), 'YYYY_MM') < v_cutoff
+    LOOP
+        EXECUTE format('DROP TABLE bot.%I', v_name);
+        v_dropped := v_dropped + 1;
+    END LOOP;
+    RETURN v_dropped;
+END;
+$$;
+
+-- The current month and the next two
+SELECT bot.create_simulation_partitions(CURRENT_DATE, 3);
+
 -- Create update timestamp function
 CREATE OR REPLACE FUNCTION bot.update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -66,3 +232,23 @@ CREATE TRIGGER update_user_profiles_updated_at
     BEFORE UPDATE ON bot.user_profiles
     FOR EACH ROW
     EXECUTE FUNCTION bot.update_updated_at_column();
+
+-- Bot persistence: user_data/chat_data (keyed by id), bot_data and
+-- callback data (key 0), written in batches by src/bot/persistence.py
+CREATE TABLE IF NOT EXISTS bot.persistence_data (
+    kind TEXT NOT NULL, -- 'user', 'chat', 'bot' or 'callback'
+    key BIGINT NOT NULL,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (kind, key)
+);
+
+-- Conversation handler states, keyed by handler name and conversation key
+-- (the JSON array of chat/user ids)
+CREATE TABLE IF NOT EXISTS bot.conversation_states (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state JSONB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (name, key)
+);
@@ -0,0 +1,9 @@
+# src/bot/handlers/__init__.py
+from src.utils.metrics import histogram
+
+# Time spent in each command and conversation step, Bot API calls included
+HANDLER_SECONDS = histogram(
+    'shakespr_handler_seconds',
+    'Latency of bot command and conversation step handlers',
+    labels=('handler',)
+)
@@ -0,0 +1,248 @@
+# src/bot/handlers/afford.py
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import (
+    ContextTypes,
+    ConversationHandler,
+    CommandHandler,
+    CallbackQueryHandler,
+    MessageHandler,
+    filters
+)
+from src.utils.logging import logger
+from src.utils.metrics import timed
+from src.bot.handlers import HANDLER_SECONDS
+from src.data.numbeo.analysis import get_cost_index, lifestyle_basket
+from src.data.users.crud import get_user_profile
+from src.data.users.writer import get_user_writer
+from typing import Optional
+
+# Conversation states
+TYPING_INCOME = 0
+CHOOSING_HOUSING = 1
+CHOOSING_MEALS = 2
+CHOOSING_TRANSIT = 3
+
+# Cities listed in the answer
+RESULT_LIMIT = 10
+
+# Choices of meals out per week
+MEALS_PER_WEEK = [0, 2, 4, 7, 14]
+
+def parse_income(text: str) -> Optional[float]:
+    """A monthly income typed as e.g. "3000", "$3,000" or "2500.50", if valid"""
+    try:
+        income = float(text.strip().lstrip('$').replace(',', '').strip())
+    except ValueError:
+        return None
+    return income if 0 < income < 10_000_000 else None
+
+def save_income(update: Update, context: ContextTypes.DEFAULT_TYPE, profile: Optional[dict],
+                income: float) -> None:
+    """Remember the income in the user's profile, if they have one"""
+    if profile is None:
+        return
+    user_id = update.effective_user.id
+    writer = get_user_writer()
+    writer.queue_profile(
+        user_id=user_id,
+        first_name=profile['first_name'],
+        last_name=profile.get('last_name'),
+        username=profile.get('username'),
+        current_city=profile['current_city'],
+        current_country=profile['current_country'],
+        current_occupation=profile.get('current_occupation'),
+        monthly_income=income,
+        currency='USD'
+    )
+    context.user_data['profile'] = writer.pending_profile(user_id)
+
+async def ask_housing(message, income: float) -> int:
+    keyboard = [
+        [InlineKeyboardButton("1 bedroom in the centre", callback_data="afford_housing_center")],
+        [InlineKeyboardButton("1 bedroom outside the centre", callback_data="afford_housing_outside")],
+        [InlineKeyboardButton("Cancel", callback_data="afford_cancel")]
+    ]
+    await message.reply_text(
+        f"Let's see where ${income:,.0f} a month takes you.\n\n"
+        "Where would you like to live?",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return CHOOSING_HOUSING
+
+@timed(HANDLER_SECONDS, handler='afford.afford')
+async def afford(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle the /afford command, with the monthly income as an optional argument"""
+    logger.info("Afford command received from user %s", update.effective_user.id)
+    profile = await get_user_profile(update.effective_user.id, context.user_data)
+
+    if context.args:
+        income = parse_income(' '.join(context.args))
+        if income is None:
+            await update.message.reply_text(
+                "Please give your monthly income as a number, e.g. /afford 3000"
+            )
+            return ConversationHandler.END
+        save_income(update, context, profile, income)
+    elif profile and profile.get('monthly_income') and profile.get('currency') == 'USD':
+        income = float(profile['monthly_income'])
+    else:
+        await update.message.reply_text(
+            "What is your monthly income after tax, in US dollars?"
+        )
+        return TYPING_INCOME
+
+    context.user_data['afford_income'] = income
+    return await ask_housing(update.message, income)
+
+@timed(HANDLER_SECONDS, handler='afford.handle_income')
+async def handle_income(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle the typed monthly income"""
+    income = parse_income(update.message.text)
+    if income is None:
+        await update.message.reply_text(
+            "Please enter your monthly income as a number of US dollars, e.g. 3000:"
+        )
+        return TYPING_INCOME
+    profile = await get_user_profile(update.effective_user.id, context.user_data)
+    save_income(update, context, profile, income)
+    context.user_data['afford_income'] = income
+    return await ask_housing(update.message, income)
+
+@timed(HANDLER_SECONDS, handler='afford.choose_housing')
+async def choose_housing(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle the housing choice and ask about meals out"""
+    query = update.callback_query
+    await query.answer()
+    context.user_data['afford_housing'] = query.data.rsplit('_', 1)[1]
+
+    keyboard = [
+        [InlineKeyboardButton(str(meals), callback_data=f"afford_meals_{meals}")
+         for meals in MEALS_PER_WEEK],
+        [InlineKeyboardButton("Cancel", callback_data="afford_cancel")]
+    ]
+    await query.edit_message_text(
+        "How many meals a week do you eat out?",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return CHOOSING_MEALS
+
+@timed(HANDLER_SECONDS, handler='afford.choose_meals')
+async def choose_meals(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle the meals out choice and ask about public transport"""
+    query = update.callback_query
+    await query.answer()
+    context.user_data['afford_meals'] = int(query.data.rsplit('_', 1)[1])
+
+    keyboard = [
+        [InlineKeyboardButton("Yes", callback_data="afford_transit_yes"),
+         InlineKeyboardButton("No", callback_data="afford_transit_no")],
+        [InlineKeyboardButton("Cancel", callback_data="afford_cancel")]
+    ]
+    await query.edit_message_text(
+        "Do you need a monthly public transport pass?",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return CHOOSING_TRANSIT
+
+def format_affordable(income: float, cities: list, fits: int, priced: int,
+                      home_cost: Optional[float], home: Optional[tuple]) -> str:
+    """Format the cities a basket fits in, closest to the income first"""
+    if not cities:
+        text = (
+            f"😕 Your lifestyle does not fit in ${income:,.0f} a month in any of the "
+            f"{priced:,} cities I have prices for.\n\n"
+            "Try a cheaper lifestyle with /afford again!"
+        )
+    else:
+        lines = "".join(
+            f"{rank}. {city}, {country}: ${cost:,.0f} (${income - cost:,.0f} left)\n"
+            for rank, ((city, country), cost) in enumerate(cities, 1)
+        )
+        text = (
+            f"💰 Your lifestyle fits in ${income:,.0f} a month in {fits:,} of "
+            f"{priced:,} cities. Those closest to your budget:\n\n{lines}"
+        )
+    if home_cost is not None:
+        text += f"\n🏠 In {home[0]}, {home[1]} it costs ${home_cost:,.0f} a month."
+    return text
+
+@timed(HANDLER_SECONDS, handler='afford.choose_transit')
+async def choose_transit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle the transport choice and show where the basket fits"""
+    query = update.callback_query
+    await query.answer()
+    income = context.user_data.pop('afford_income', None)
+    basket = lifestyle_basket(
+        housing=context.user_data.pop('afford_housing', 'center'),
+        meals_out_per_week=context.user_data.pop('afford_meals', 2),
+        transit_pass=query.data == "afford_transit_yes"
+    )
+    if income is None:
+        await query.edit_message_text("Please start again with /afford.")
+        return ConversationHandler.END
+
+    try:
+        cost_index = await get_cost_index()
+        if cost_index is None or not len(cost_index):
+            await query.edit_message_text(
+                "Sorry, city data is temporarily unavailable.\n"
+                "Please try again later."
+            )
+            return ConversationHandler.END
+        cities, fits, priced = cost_index.affordable(income, basket, RESULT_LIMIT)
+
+        profile = await get_user_profile(update.effective_user.id, context.user_data)
+        home = (profile['current_city'], profile['current_country']) if profile else None
+        home_cost = cost_index.basket_cost(*home, basket) if home else None
+        await query.edit_message_text(format_affordable(income, cities, fits, priced, home_cost, home))
+    except Exception as e:
+        logger.error("Error finding affordable cities: %s", e)
+        await query.edit_message_text(
+            "Sorry, there was an error searching the cities.\n"
+            "Please try again later."
+        )
+    return ConversationHandler.END
+
+@timed(HANDLER_SECONDS, handler='afford.cancel_button')
+async def cancel_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle the Cancel button"""
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_text("Budget search cancelled.")
+    return ConversationHandler.END
+
+@timed(HANDLER_SECONDS, handler='afford.cancel')
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Cancel conversation"""
+    await update.message.reply_text("Budget search cancelled.")
+    return ConversationHandler.END
+
+def get_afford_handler(persistent: bool = False):
+    """
+    Create and return the budget search conversation handler, optionally
+    keeping its state in the persistence. Its buttons all start with
+    afford_, so they are not taken for another conversation's.
+    """
+    return ConversationHandler(
+        entry_points=[CommandHandler('afford', afford)],
+        states={
+            TYPING_INCOME: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_income)
+            ],
+            CHOOSING_HOUSING: [
+                CallbackQueryHandler(choose_housing, pattern=r'^afford_housing_(center|outside)$')
+            ],
+            CHOOSING_MEALS: [
+                CallbackQueryHandler(choose_meals, pattern=r'^afford_meals_\d+$')
+            ],
+            CHOOSING_TRANSIT: [
+                CallbackQueryHandler(choose_transit, pattern=r'^afford_transit_(yes|no)$')
+            ]
+        },
+        fallbacks=[
+            CommandHandler('cancel', cancel),
+            CallbackQueryHandler(cancel_button, pattern=r'^afford_cancel$')
+        ],
+        name="afford_conversation",
+        persistent=persistent
+    )
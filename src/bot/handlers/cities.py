@@ -0,0 +1,46 @@
+# src/bot/handlers/cities.py
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.ext import ContextTypes, InlineQueryHandler
+from src.utils.logging import logger
+from src.utils.metrics import timed
+from src.bot.handlers import HANDLER_SECONDS
+from src.data.numbeo.fetcher import get_hot_cities
+from src.data.numbeo.names import get_city_names
+
+# Cities offered per inline query
+INLINE_RESULT_LIMIT = 10
+
+# Seconds Telegram may serve the same answer to the same query
+INLINE_CACHE_TIME = 300
+
+@timed(HANDLER_SECONDS, handler='cities.inline_city_search')
+async def inline_city_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Answer inline queries with the known cities whose names start with,
+    or are close to, what was typed; the most requested ones when nothing
+    has been typed yet. Picking one sends "city, country", which the
+    relocation conversation takes as its city.
+    """
+    query = update.inline_query
+    text = query.query.strip()
+    names = await get_city_names()
+    if text:
+        cities = names.cities.complete(text, INLINE_RESULT_LIMIT) if names is not None else []
+    else:
+        cities = get_hot_cities(INLINE_RESULT_LIMIT)
+    logger.debug("Inline query %r: %s cities", text, len(cities))
+
+    results = [
+        InlineQueryResultArticle(
+            id=str(position),
+            title=city,
+            description=country,
+            input_message_content=InputTextMessageContent(f"{city}, {country}")
+        )
+        for position, (city, country) in enumerate(cities)
+    ]
+    await query.answer(results, cache_time=INLINE_CACHE_TIME)
+
+def get_city_search_handler() -> InlineQueryHandler:
+    """Return the handler of inline city autocomplete queries"""
+    return InlineQueryHandler(inline_city_search)
@@ -9,6 +9,10 @@ from telegram.ext import (
     filters
 )
 from src.utils.logging import logger
+from src.utils.metrics import timed
+from src.bot.handlers import HANDLER_SECONDS
+from src.data.users.crud import get_user_profile
+from src.data.users.writer import get_user_writer
 
 # States
 CHOOSING = 0
@@ -16,9 +20,10 @@ TYPING_NAME = 1
 TYPING_CITY = 2
 TYPING_COUNTRY = 3
 
+@timed(HANDLER_SECONDS, handler='profile.profile')
 async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Entry point for profile management"""
-    logger.info(f"Profile command received from user {update.effective_user.id}")
+    logger.info("Profile command received from user %s", update.effective_user.id)
     
     keyboard = [
         [InlineKeyboardButton("Start Profile Setup", callback_data='setup')],
@@ -32,10 +37,11 @@ async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     )
     return CHOOSING
 
+@timed(HANDLER_SECONDS, handler='profile.button_callback')
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle button presses"""
     query = update.callback_query
-    logger.info(f"Callback received: {query.data}")
+    logger.info("Callback received: %s", query.data)
     
     await query.answer()
     
@@ -46,35 +52,63 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await query.edit_message_text("Please enter your name:")
     return TYPING_NAME
 
+@timed(HANDLER_SECONDS, handler='profile.handle_name')
 async def handle_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle name input"""
     name = update.message.text
     context.user_data['name'] = name
-    logger.info(f"Name received: {name}")
+    logger.info("Name received: %s", name)
     
     await update.message.reply_text(
         f"Nice to meet you, {name}! Now, please enter your current city:"
     )
     return TYPING_CITY
 
+@timed(HANDLER_SECONDS, handler='profile.handle_city')
 async def handle_city(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle city input"""
     city = update.message.text
     context.user_data['city'] = city
-    logger.info(f"City received: {city}")
+    logger.info("City received: %s", city)
     
     await update.message.reply_text(
         f"Great! And what country is {city} in?"
     )
     return TYPING_COUNTRY
 
+@timed(HANDLER_SECONDS, handler='profile.handle_country')
 async def handle_country(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle country input and complete profile"""
     country = update.message.text
     context.user_data['country'] = country
-    logger.info(f"Country received: {country}")
+    logger.info("Country received: %s", country)
     
-    # Here you would typically save to database
+    # Saved in the background, so the reply does not wait for the database.
+    # The occupation and income saved by /afford are carried over for the
+    # pending copy; as a float, since user_data is persisted as JSON. When
+    # they are unknown, the upsert leaves the stored values alone.
+    user = update.effective_user
+    existing = await get_user_profile(user.id, context.user_data) or {}
+    income = existing.get('monthly_income')
+    writer = get_user_writer()
+    writer.queue_profile(
+        user_id=user.id,
+        first_name=context.user_data['name'],
+        last_name=user.last_name,
+        username=user.username,
+        current_city=context.user_data['city'],
+        current_country=country,
+        current_occupation=existing.get('current_occupation'),
+        monthly_income=float(income) if income is not None else None,
+        currency=existing.get('currency') or 'USD'
+    )
+    # Kept with the user's data, so profile reads rarely need the database.
+    # Not if the profile could not be read: the copy would lack the income
+    # the database still has.
+    if existing:
+        context.user_data['profile'] = writer.pending_profile(user.id)
+    else:
+        context.user_data.pop('profile', None)
     await update.message.reply_text(
         f"Perfect! I've saved your profile:\n\n"
         f"Name: {context.user_data['name']}\n"
@@ -84,13 +118,14 @@ async def handle_country(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     )
     return ConversationHandler.END
 
+@timed(HANDLER_SECONDS, handler='profile.cancel')
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel conversation"""
     await update.message.reply_text("Profile setup cancelled.")
     return ConversationHandler.END
 
-def get_profile_handler():
-    """Return the conversation handler"""
+def get_profile_handler(persistent: bool = False):
+    """Return the conversation handler, optionally keeping its state in the persistence"""
     logger.info("Creating profile conversation handler")
     
     return ConversationHandler(
@@ -110,5 +145,6 @@ def get_profile_handler():
             ]
         },
         fallbacks=[CommandHandler('cancel', cancel)],
-        name="profile_conversation"
+        name="profile_conversation",
+        persistent=persistent
     )
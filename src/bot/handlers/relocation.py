@@ -9,8 +9,15 @@ from telegram.ext import (
     filters
 )
 from src.utils.logging import logger
-from src.data.numbeo.fetcher import fetch_city_data
+from src.utils.metrics import timed
+from src.bot.handlers import HANDLER_SECONDS
+from src.data.numbeo.analysis import basket_indexes
+from src.data.numbeo.fetcher import fetch_cities_data, normalize_city_key
+from src.data.numbeo.names import get_city_names
+from src.data.users.crud import get_user_profile
+from src.data.users.writer import get_user_writer
 from datetime import datetime
+from typing import List, Optional, Tuple
 
 # Conversation states
 CHOOSING_CITY = 0
@@ -26,56 +33,145 @@ POPULAR_CITIES = [
     ("Berlin", "Germany")
 ]
 
+# Corrections offered for a city or country that is not known
+SUGGESTION_LIMIT = 5
+
 def format_cost(value: float) -> str:
     """Format cost value with fallback for None"""
     if value is None:
         return "Data not available"
     return f"${value:,.2f}"
 
-def format_city_comparison(city_data: dict) -> str:
-    """Format city data for display with safe handling of None values"""
+def format_delta(value: float, home_value: float) -> str:
+    """Format the difference from the home city's cost, if both are known"""
+    if value is None or home_value is None:
+        return ""
+    delta = value - home_value
+    sign = "+" if delta >= 0 else "-"
+    if not home_value:
+        return f" ({sign}${abs(delta):,.2f})"
+    return f" ({sign}${abs(delta):,.2f}, {sign}{abs(delta) / home_value:.0%})"
+
+# Index name -> label, in display order
+INDEX_LABELS = {
+    'rent': 'Rent',
+    'groceries': 'Groceries',
+    'restaurants': 'Restaurants',
+    'transport': 'Transport',
+    'overall': 'Overall',
+}
+
+def format_indexes(city_data: dict, home_data: dict) -> str:
+    """Basket indexes of a city with the home city at 100, if any can be computed"""
+    indexes = basket_indexes(city_data, home_data)
+    if all(value is None for value in indexes.values()):
+        return ""
+    lines = "".join(
+        f"- {label}: {indexes[name]:.0f}\n"
+        for name, label in INDEX_LABELS.items() if indexes[name] is not None
+    )
+    return f"📈 Cost Indexes ({home_data.get('city_name')} = 100):\n{lines}\n"
+
+def format_city_comparison(city_data: dict, home_data: Optional[dict] = None) -> str:
+    """
+    Format city data for display with safe handling of None values. With
+    home_data, each cost is followed by its difference from the home city.
+    """
     try:
-        costs = {
-            'rent_1br_center': city_data.get('rent_1br_center'),
-            'cheap_meal_for_one': city_data.get('cheap_meal_for_one'),
-            'milk_one_liter': city_data.get('milk_one_liter'),
-            'monthly_transit_pass': city_data.get('monthly_transit_pass'),
-            'utilities_basic': city_data.get('utilities_basic')
-        }
+        cost_keys = [
+            'rent_1br_center',
+            'cheap_meal_for_one',
+            'milk_one_liter',
+            'monthly_transit_pass',
+            'utilities_basic'
+        ]
+        costs = {key: city_data.get(key) for key in cost_keys}
+        home_costs = {key: (home_data or {}).get(key) for key in cost_keys}
+
+        def line(label: str, key: str) -> str:
+            delta = format_delta(costs[key], home_costs[key])
+            return f"- {label}: {format_cost(costs[key])}{delta}\n"
         
         # Check if we have at least some data
         if not any(v is not None for v in costs.values()):
-            logger.error(f"No valid cost data found: {costs}")
+            logger.error("No valid cost data found: %s", costs)
             return (
                 "⚠️ No cost data is currently available for this city.\n\n"
                 "Would you like to try another city? Use /relocate again!"
             )
 
+        comparison = ""
+        indexes = ""
+        if home_data:
+            indexes = format_indexes(city_data, home_data)
+            comparison = (
+                f"Differences from {home_data.get('city_name')}, "
+                f"{home_data.get('country')} are shown in brackets.\n\n"
+            )
+
         return (
             f"📊 Cost of Living in {city_data.get('city_name', 'Unknown City')}, "
             f"{city_data.get('country', 'Unknown Country')}:\n\n"
+            f"{comparison}"
             f"🏠 Housing:\n"
-            f"- 1 Bedroom Apartment (City Center): {format_cost(costs['rent_1br_center'])}\n\n"
+            f"{line('1 Bedroom Apartment (City Center)', 'rent_1br_center')}\n"
             f"🍽 Food & Dining:\n"
-            f"- Meal (Inexpensive Restaurant): {format_cost(costs['cheap_meal_for_one'])}\n"
-            f"- 1L Milk: {format_cost(costs['milk_one_liter'])}\n\n"
+            f"{line('Meal (Inexpensive Restaurant)', 'cheap_meal_for_one')}"
+            f"{line('1L Milk', 'milk_one_liter')}\n"
             f"🚇 Transportation:\n"
-            f"- Monthly Transit Pass: {format_cost(costs['monthly_transit_pass'])}\n\n"
+            f"{line('Monthly Transit Pass', 'monthly_transit_pass')}\n"
             f"💡 Utilities:\n"
-            f"- Basic Utilities: {format_cost(costs['utilities_basic'])}\n\n"
+            f"{line('Basic Utilities', 'utilities_basic')}\n"
+            f"{indexes}"
             f"Last Updated: {city_data.get('last_updated', datetime.now()).strftime('%Y-%m-%d')}\n\n"
             f"Would you like to simulate another city? Use /relocate again!"
         )
     except Exception as e:
-        logger.error(f"Error formatting city data: {e}")
+        logger.error("Error formatting city data: %s", e)
         return (
             "⚠️ Some data is currently unavailable for this city.\n\n"
             "Would you like to try another city? Use /relocate again!"
         )
 
+async def get_home_city(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> Optional[Tuple[str, str]]:
+    """The city and country from the user's profile, if they have one"""
+    profile = await get_user_profile(update.effective_user.id, context.user_data)
+    if profile is None:
+        return None
+    return profile['current_city'], profile['current_country']
+
+async def fetch_comparison_data(
+    home: Optional[Tuple[str, str]], city: str, country: str
+) -> Tuple[Optional[dict], Optional[dict]]:
+    """
+    Fetch the target city together with the user's home city, if they
+    have one and it differs from the target
+    """
+    if home is None or normalize_city_key(*home) == normalize_city_key(city, country):
+        city_data, = await fetch_cities_data([(city, country)])
+        return city_data, None
+    city_data, home_data = await fetch_cities_data([(city, country), home])
+    return city_data, home_data
+
+def record_relocation(update: Update, home: Optional[Tuple[str, str]], city: str) -> None:
+    """
+    Queue the simulation for the history of users with a profile; written
+    in the background, so the reply does not wait for the database
+    """
+    if home is not None:
+        get_user_writer().queue_simulation(
+            user_id=update.effective_user.id,
+            simulation_type='relocation',
+            source_city=home[0],
+            target_city=city
+        )
+
+@timed(HANDLER_SECONDS, handler='relocation.relocate')
 async def relocate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the /relocate command"""
-    logger.info(f"Relocate command received from user {update.effective_user.id}")
+    logger.info("Relocate command received from user %s", update.effective_user.id)
     
     keyboard = []
     for city, country in POPULAR_CITIES:
@@ -98,11 +194,54 @@ async def relocate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     )
     return CHOOSING_CITY
 
+async def show_comparison(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                          loading_message, city: str, country: str) -> None:
+    """Replace the loading message with the comparison of a city with the user's home"""
+    home = await get_home_city(update, context)
+    city_data, home_data = await fetch_comparison_data(home, city, country)
+    if city_data:
+        comparison_text = format_city_comparison(city_data, home_data)
+        await loading_message.edit_text(comparison_text)
+        record_relocation(update, home, city)
+    else:
+        await loading_message.edit_text(
+            f"Sorry, I couldn't find data for {city}, {country}.\n"
+            "The data might be temporarily unavailable. "
+            "Please try another city or check back later."
+        )
+
+async def reply_with_comparison(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                city: str, country: str) -> None:
+    """Answer a typed message with the comparison of a city"""
+    loading_message = await update.message.reply_text("🔄 Fetching city data...")
+    try:
+        await show_comparison(update, context, loading_message, city, country)
+    except Exception as e:
+        logger.error("Error showing city comparison: %s", e)
+        await loading_message.edit_text(
+            "Sorry, there was an error fetching the data.\n"
+            "Please try again later or choose another city."
+        )
+
+def suggestion_keyboard(cities: List[Tuple[str, str]], keep_label: str,
+                        keep_data: str) -> InlineKeyboardMarkup:
+    """Buttons for suggested cities, for keeping what was typed, and for cancelling"""
+    keyboard = []
+    for city, country in cities:
+        callback_data = f"relocate_{city}_{country}"
+        # Telegram takes up to 64 bytes of callback data, split on _ here
+        if len(callback_data.encode()) <= 64 and callback_data.count('_') == 2:
+            keyboard.append([InlineKeyboardButton(f"{city}, {country}", callback_data=callback_data)])
+    keyboard.append([InlineKeyboardButton(keep_label, callback_data=keep_data)])
+    keyboard.append([InlineKeyboardButton("❌ Cancel", callback_data="cancel")])
+    return InlineKeyboardMarkup(keyboard)
+
+@timed(HANDLER_SECONDS, handler='relocation.button_callback')
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle button selections"""
     query = update.callback_query
     await query.answer()
-    logger.info(f"Relocation callback received: {query.data}")
+    logger.info("Relocation callback received: %s", query.data)
 
     if query.data == "cancel":
         await query.edit_message_text("Relocation simulation cancelled.")
@@ -113,25 +252,25 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             "Please enter the name of the city you'd like to move to:"
         )
         return TYPING_CITY
+
+    if query.data == "keep_city":
+        await query.edit_message_text(
+            f"Great! And what country is {context.user_data['target_city']} in?\n"
+            "Please enter the country name:"
+        )
+        return TYPING_COUNTRY
         
-    # Handle popular city selection
+    # Handle popular or suggested city selection, or the typed city and country
     try:
-        _, city, country = query.data.split('_')
-        loading_message = await query.edit_message_text("🔄 Fetching city data...")
-        
-        city_data = await fetch_city_data(city, country)
-        if city_data:
-            comparison_text = format_city_comparison(city_data)
-            await loading_message.edit_text(comparison_text)
+        if query.data == "keep_country":
+            city, country = context.user_data['target_city'], context.user_data['target_country']
         else:
-            await loading_message.edit_text(
-                f"Sorry, I couldn't find data for {city}, {country}.\n"
-                "The data might be temporarily unavailable. "
-                "Please try another city or check back later."
-            )
+            _, city, country = query.data.split('_')
+        loading_message = await query.edit_message_text("🔄 Fetching city data...")
+        await show_comparison(update, context, loading_message, city, country)
         return ConversationHandler.END
     except Exception as e:
-        logger.error(f"Error processing city selection: {e}")
+        logger.error("Error processing city selection: %s", e)
         await query.edit_message_text(
             "Sorry, there was an error processing your selection.\n"
             "The service might be temporarily unavailable.\n"
@@ -139,10 +278,30 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return ConversationHandler.END
 
+@timed(HANDLER_SECONDS, handler='relocation.handle_city_input')
 async def handle_city_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Handle custom city input"""
+    """
+    Handle custom city input. A "city, country" of a known city, as the
+    inline autocomplete sends, is compared right away; a city that is not
+    known but close to known ones gets them offered as corrections.
+    """
     city = update.message.text
     context.user_data['target_city'] = city
+
+    names = await get_city_names()
+    if names is not None:
+        known = names.known_pair(city)
+        if known is not None:
+            await reply_with_comparison(update, context, *known)
+            return ConversationHandler.END
+        if not names.is_known_city(city):
+            suggestions = names.suggest_cities(city, SUGGESTION_LIMIT)
+            if suggestions:
+                await update.message.reply_text(
+                    f"🤔 I don't know {city} yet. Did you mean one of these?",
+                    reply_markup=suggestion_keyboard(suggestions, f"Use \"{city}\"", "keep_city")
+                )
+                return CHOOSING_CITY
     
     await update.message.reply_text(
         f"Great! And what country is {city} in?\n"
@@ -150,40 +309,40 @@ async def handle_city_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
     )
     return TYPING_COUNTRY
 
+@timed(HANDLER_SECONDS, handler='relocation.handle_country_input')
 async def handle_country_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Handle country input and show comparison"""
+    """Handle country input and show comparison, offering corrections of unknown countries"""
     country = update.message.text
     city = context.user_data['target_city']
-    
-    loading_message = await update.message.reply_text("🔄 Fetching city data...")
-    
-    try:
-        city_data = await fetch_city_data(city, country)
-        if city_data:
-            comparison_text = format_city_comparison(city_data)
-            await loading_message.edit_text(comparison_text)
-        else:
-            await loading_message.edit_text(
-                f"Sorry, I couldn't find data for {city}, {country}.\n"
-                "The data might be temporarily unavailable. "
-                "Please try another city or check back later."
+
+    names = await get_city_names()
+    if names is not None and not names.is_known_country(country):
+        suggestions = names.suggest_countries(country, SUGGESTION_LIMIT)
+        if suggestions:
+            context.user_data['target_country'] = country
+            await update.message.reply_text(
+                f"🤔 I don't know the country {country}. Did you mean one of these?",
+                reply_markup=suggestion_keyboard(
+                    [(city, suggestion) for suggestion in suggestions],
+                    f"Use \"{country}\"", "keep_country"
+                )
             )
-    except Exception as e:
-        logger.error(f"Error showing city comparison: {e}")
-        await loading_message.edit_text(
-            "Sorry, there was an error fetching the data.\n"
-            "Please try again later or choose another city."
-        )
-    
+            return CHOOSING_CITY
+
+    await reply_with_comparison(update, context, city, country)
     return ConversationHandler.END
 
+@timed(HANDLER_SECONDS, handler='relocation.cancel')
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel conversation"""
     await update.message.reply_text("Relocation simulation cancelled.")
     return ConversationHandler.END
 
-def get_relocation_handler():
-    """Create and return the relocation conversation handler"""
+def get_relocation_handler(persistent: bool = False):
+    """
+    Create and return the relocation conversation handler, optionally
+    keeping its state in the persistence
+    """
     return ConversationHandler(
         entry_points=[CommandHandler('relocate', relocate)],
         states={
@@ -198,5 +357,6 @@ def get_relocation_handler():
             ]
         },
         fallbacks=[CommandHandler('cancel', cancel)],
-        name="relocation_conversation"
+        name="relocation_conversation",
+        persistent=persistent
     )
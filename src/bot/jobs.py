@@ -0,0 +1,124 @@
+# src/bot/jobs.py
+import os
+from telegram.ext import Application, ContextTypes
+from src.utils.logging import logger
+from src.bot.handlers.relocation import POPULAR_CITIES
+from src.data.numbeo.fetcher import (
+    get_hot_cities,
+    get_local_city_data,
+    needs_refresh,
+    normalize_city_key,
+    refresh_city_data
+)
+from src.data.numbeo.snapshot import SNAPSHOT_CONFIG, export_snapshot
+from src.data.users.crud import (
+    maintain_simulation_partitions,
+    refresh_destination_popularity
+)
+
+# Refresher configuration; an interval of 0 disables the refresher
+HOT_CITY_REFRESH_INTERVAL = int(os.getenv('HOT_CITY_REFRESH_INTERVAL', '3600'))
+HOT_CITY_COUNT = int(os.getenv('HOT_CITY_COUNT', '20'))
+
+# Seconds between exports of the city snapshot, when CITY_SNAPSHOT_PATH
+# is set; 0 leaves publishing it to scripts/export_city_snapshot.py
+CITY_SNAPSHOT_EXPORT_INTERVAL = int(os.getenv('CITY_SNAPSHOT_EXPORT_INTERVAL', '600'))
+
+# Destination popularity rollup; an interval of 0 disables it
+SIMULATION_ROLLUP_INTERVAL = int(os.getenv('SIMULATION_ROLLUP_INTERVAL', '300'))
+# Partition upkeep, independent of the rollup; 0 disables it, and
+# simulations then pile up in the default partition. Partitions are
+# created months ahead, so once a day is plenty.
+SIMULATION_MAINTENANCE_INTERVAL = int(os.getenv('SIMULATION_MAINTENANCE_INTERVAL', '86400'))
+SIMULATION_PARTITIONS_AHEAD = int(os.getenv('SIMULATION_PARTITIONS_AHEAD', '2'))
+# Months of raw history kept besides the current one; 0 keeps everything
+SIMULATION_RETENTION_MONTHS = int(os.getenv('SIMULATION_RETENTION_MONTHS', '24'))
+
+async def refresh_hot_cities(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Refresh popular and most requested cities before their data expires"""
+    cities = {}
+    for city, country in POPULAR_CITIES + get_hot_cities(HOT_CITY_COUNT):
+        cities.setdefault(normalize_city_key(city, country), (city, country))
+
+    refreshed = 0
+    for city, country in cities.values():
+        city_data = await get_local_city_data(city, country)
+        if city_data and not needs_refresh(city_data):
+            continue
+        # One city at a time, so the refresher stays polite to Numbeo
+        if await refresh_city_data(city, country):
+            refreshed += 1
+        else:
+            logger.warning("Background refresh failed for %s, %s", city, country)
+
+    logger.info("Hot city refresh done: %s of %s cities refreshed", refreshed, len(cities))
+
+async def publish_city_snapshot(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Export the latest costs of every city for the workers to map"""
+    await export_snapshot(SNAPSHOT_CONFIG['path'])
+
+async def roll_up_simulations(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Count new simulations in the destination popularity rollup"""
+    counted = await refresh_destination_popularity()
+    if counted:
+        logger.info("Destination popularity rollup: %s new simulations counted", counted)
+
+async def maintain_simulation_history(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Create upcoming monthly partitions and drop expired ones"""
+    result = await maintain_simulation_partitions(
+        SIMULATION_PARTITIONS_AHEAD, SIMULATION_RETENTION_MONTHS
+    )
+    if result is not None:
+        created, dropped = result
+        logger.info("Simulation partitions: %s created, %s dropped", created, dropped)
+
+def schedule_jobs(application: Application) -> None:
+    """Register recurring background jobs on the application's job queue"""
+    if application.job_queue is None:
+        logger.warning(
+            "Job queue unavailable, install python-telegram-bot[job-queue] "
+            "to enable background refreshes"
+        )
+        return
+    if HOT_CITY_REFRESH_INTERVAL <= 0:
+        logger.info("Hot city refresh disabled")
+    else:
+        application.job_queue.run_repeating(
+            refresh_hot_cities,
+            interval=HOT_CITY_REFRESH_INTERVAL,
+            first=10,
+            name="refresh_hot_cities"
+        )
+        logger.info("Scheduled hot city refresh every %ss", HOT_CITY_REFRESH_INTERVAL)
+
+    if SNAPSHOT_CONFIG['path'] and CITY_SNAPSHOT_EXPORT_INTERVAL > 0:
+        application.job_queue.run_repeating(
+            publish_city_snapshot,
+            interval=CITY_SNAPSHOT_EXPORT_INTERVAL,
+            first=5,
+            name="publish_city_snapshot"
+        )
+        logger.info("Scheduled city snapshot export every %ss", CITY_SNAPSHOT_EXPORT_INTERVAL)
+
+    if SIMULATION_MAINTENANCE_INTERVAL <= 0:
+        logger.warning("Simulation partition maintenance disabled")
+    else:
+        application.job_queue.run_repeating(
+            maintain_simulation_history,
+            interval=SIMULATION_MAINTENANCE_INTERVAL,
+            first=30,
+            name="maintain_simulation_history"
+        )
+        logger.info("Scheduled simulation partition maintenance every %ss",
+                    SIMULATION_MAINTENANCE_INTERVAL)
+
+    if SIMULATION_ROLLUP_INTERVAL <= 0:
+        logger.info("Destination popularity rollup disabled")
+    else:
+        application.job_queue.run_repeating(
+            roll_up_simulations,
+            interval=SIMULATION_ROLLUP_INTERVAL,
+            first=SIMULATION_ROLLUP_INTERVAL,
+            name="roll_up_simulations"
+        )
+        logger.info("Scheduled destination popularity rollup every %ss", SIMULATION_ROLLUP_INTERVAL)
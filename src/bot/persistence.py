@@ -0,0 +1,206 @@
+# src/bot/persistence.py
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from telegram.ext import BasePersistence, PersistenceInput
+from src.utils.database import get_user_db_connection
+from src.utils.logging import logger
+
+# Seconds between two batched writes of changed conversation data
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '10'))
+
+UPSERT_DATA = """
+    INSERT INTO bot.persistence_data (kind, key, data)
+    VALUES (%s, %s, %s::jsonb)
+    ON CONFLICT (kind, key) DO UPDATE SET
+        data = EXCLUDED.data,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+DELETE_DATA = "DELETE FROM bot.persistence_data WHERE kind = %s AND key = %s"
+
+UPSERT_STATE = """
+    INSERT INTO bot.conversation_states (name, key, state)
+    VALUES (%s, %s, %s::jsonb)
+    ON CONFLICT (name, key) DO UPDATE SET
+        state = EXCLUDED.state,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+DELETE_STATE = "DELETE FROM bot.conversation_states WHERE name = %s AND key = %s"
+
+class PostgresPersistence(BasePersistence):
+    """
+    Persistence for user_data, chat_data, bot_data and conversation states
+    in the user database, stored as JSON.
+
+    The application hands over everything that changed every
+    update_interval seconds. Each of those runs is written in a single
+    transaction, instead of one write per message. Only user_data and
+    conversations are stored by default, as the handlers use nothing else.
+    """
+
+    def __init__(self, store_data: Optional[PersistenceInput] = None,
+                 update_interval: float = PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=store_data or PersistenceInput(
+                bot_data=False, chat_data=False, callback_data=False
+            ),
+            update_interval=update_interval
+        )
+        # Pending writes as JSON, None marking a deletion
+        self._data: Dict[Tuple[str, int], Optional[str]] = {}
+        self._states: Dict[Tuple[str, str], Optional[str]] = {}
+        self._write: Optional[asyncio.Future] = None
+        # Held by the write in progress. A run queued meanwhile waits for
+        # it, so an older write never commits after a newer one, and the
+        # rows of a failed write are back in the queue before the next
+        # run takes it.
+        self._write_lock = asyncio.Lock()
+        self.flushes = 0
+        self.rows_written = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return batching counters"""
+        return {
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'pending': len(self._data) + len(self._states),
+        }
+
+    async def _load(self, kind: str) -> Dict[int, Any]:
+        async with get_user_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT key, data FROM bot.persistence_data WHERE kind = %s", (kind,)
+                )
+                return {key: data for key, data in await cur.fetchall()}
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        return await self._load('user')
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return await self._load('chat')
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return (await self._load('bot')).get(0, {})
+
+    async def get_callback_data(self) -> Optional[Tuple[List[Tuple[str, float, Dict[str, Any]]], Dict[str, str]]]:
+        stored = (await self._load('callback')).get(0)
+        if stored is None:
+            return None
+        buttons, queries = stored
+        return [tuple(button) for button in buttons], queries
+
+    async def get_conversations(self, name: str) -> Dict[Tuple[int, ...], object]:
+        async with get_user_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT key, state FROM bot.conversation_states WHERE name = %s", (name,)
+                )
+                return {tuple(json.loads(key)): state for key, state in await cur.fetchall()}
+
+    def _encode(self, what: str, value: object) -> Optional[str]:
+        try:
+            return json.dumps(value)
+        except (TypeError, ValueError) as e:
+            logger.error("Cannot persist %s, it is not JSON serializable: %s", what, e)
+            return None
+
+    async def _queue_data(self, kind: str, key: int, data: Optional[object]) -> None:
+        if data is not None:
+            data = self._encode(f"{kind} data for {key}", data)
+            if data is None:
+                return
+        self._data[(kind, key)] = data
+        await self._join_write()
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        await self._queue_data('user', user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        await self._queue_data('chat', chat_id, data)
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        await self._queue_data('bot', 0, data)
+
+    async def update_callback_data(self, data) -> None:
+        await self._queue_data('callback', 0, data)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._queue_data('user', user_id, None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._queue_data('chat', chat_id, None)
+
+    async def update_conversation(self, name: str, key: Tuple[int, ...],
+                                  new_state: Optional[object]) -> None:
+        if new_state is not None:
+            new_state = self._encode(f"state of {name}", new_state)
+            if new_state is None:
+                return
+        self._states[(name, json.dumps(list(key)))] = new_state
+        await self._join_write()
+
+    # Data of a user only changes in the process handling that user, so
+    # there is nothing newer in the database to refresh from
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        await self._join_write()
+
+    async def _join_write(self) -> None:
+        """
+        Wait for the write of the current run. The application calls the
+        update methods of one run concurrently, so the write, started by the
+        first of them, only runs once all of them have queued their data.
+        """
+        if self._write is None:
+            self._write = asyncio.ensure_future(self._write_pending())
+        await asyncio.shield(self._write)
+
+    async def _write_pending(self) -> None:
+        """Write everything queued in a single transaction"""
+        async with self._write_lock:
+            # Updates queued from now on start the next write
+            data, self._data = self._data, {}
+            states, self._states = self._states, {}
+            self._write = None
+            if not data and not states:
+                return
+
+            try:
+                async with get_user_db_connection() as conn:
+                    async with conn.transaction(), conn.cursor() as cur:
+                        await self._execute(cur, UPSERT_DATA, DELETE_DATA, data)
+                        await self._execute(cur, UPSERT_STATE, DELETE_STATE, states)
+            except Exception as e:
+                logger.error("Error writing %s persistence rows: %s", len(data) + len(states), e)
+                # Retry with the next run, unless newer values were queued since
+                for key, value in data.items():
+                    self._data.setdefault(key, value)
+                for key, value in states.items():
+                    self._states.setdefault(key, value)
+                raise
+
+            self.flushes += 1
+            self.rows_written += len(data) + len(states)
+            logger.debug("Persisted %s data and %s conversation rows", len(data), len(states))
+
+    async def _execute(self, cur, upsert: str, delete: str,
+                       rows: Dict[Tuple[Any, Any], Optional[str]]) -> None:
+        """Apply upserts and deletions, each as one pipelined batch"""
+        upserts = [(*key, value) for key, value in rows.items() if value is not None]
+        deletes = [key for key, value in rows.items() if value is None]
+        if upserts:
+            await cur.executemany(upsert, upserts)
+        if deletes:
+            await cur.executemany(delete, deletes)
@@ -0,0 +1,32 @@
+# src/bot/request.py
+import time
+from typing import Any, Tuple
+from telegram.request import HTTPXRequest
+from src.utils.metrics import histogram
+
+BOT_API_SECONDS = histogram(
+    'shakespr_bot_api_seconds',
+    'Latency of Bot API calls made while handling updates',
+    labels=('method', 'status')
+)
+
+class InstrumentedRequest(HTTPXRequest):
+    """
+    HTTPXRequest observing the latency of every Bot API call, by API
+    method. Long polling uses a separate request object, so getUpdates
+    does not skew the histogram.
+    """
+
+    async def do_request(self, url: str, method: str, *args: Any, **kwargs: Any) -> Tuple[int, bytes]:
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            status = str(code)
+            return code, payload
+        finally:
+            BOT_API_SECONDS.observe(
+                time.perf_counter() - start,
+                # The API method is the last path segment: .../bot<token>/sendMessage
+                method=url.rsplit('/', 1)[-1], status=status
+            )
@@ -0,0 +1,289 @@
+# src/bot/webhook.py
+import asyncio
+import hmac
+import json
+import multiprocessing
+import os
+import signal
+from typing import Any, Callable, Dict, List, Optional
+import aiohttp
+from aiohttp import web
+from telegram import Bot, Update
+from telegram.ext import Application
+from src.utils.logging import logger, stop_logging
+
+# Webhook configuration
+WEBHOOK_CONFIG = {
+    # Public HTTPS URL registered with Telegram, path included
+    'url': os.getenv('WEBHOOK_URL', ''),
+    'listen': os.getenv('WEBHOOK_LISTEN', '0.0.0.0'),
+    'port': int(os.getenv('WEBHOOK_PORT', '8443')),
+    'path': os.getenv('WEBHOOK_PATH', '/telegram'),
+    # Telegram echoes this in a header on every request; empty disables the check
+    'secret_token': os.getenv('WEBHOOK_SECRET_TOKEN', ''),
+    # Number of worker processes handling updates
+    'workers': int(os.getenv('WEBHOOK_WORKERS', '1')),
+    # 'user': a front process on the public port forwards each user's updates
+    # to the same worker, listening on the following ports on localhost.
+    # 'reuse_port': every worker accepts on the public port itself. Only for
+    # deployments where conversation state does not live in process memory.
+    'routing': os.getenv('WEBHOOK_ROUTING', 'user'),
+    # Simultaneous connections Telegram may open to the webhook
+    'max_connections': int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40')),
+}
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# Builds the application for the worker with the given index. Must be a
+# module-level function, since workers are started with 'spawn'.
+ApplicationFactory = Callable[[int], Application]
+
+# Builds a bare Bot, for the Bot API calls the front process makes itself
+BotFactory = Callable[[], Bot]
+
+def _valid_secret(request: web.Request, config: Dict[str, Any]) -> bool:
+    """Check the secret token Telegram sends along with each update"""
+    if not config['secret_token']:
+        return True
+    return hmac.compare_digest(
+        request.headers.get(SECRET_HEADER, ''), config['secret_token']
+    )
+
+def _routing_key(payload: Dict[str, Any]) -> int:
+    """Id of the user (or chat) an update comes from"""
+    for value in payload.values():
+        if isinstance(value, dict):
+            sender = value.get('from') or value.get('chat') or {}
+            return sender.get('id', 0)
+    return 0
+
+def create_webhook_app(application: Application, config: Dict[str, Any]) -> web.Application:
+    """HTTP app that puts the updates posted by Telegram on the update queue"""
+    async def receive_update(request: web.Request) -> web.Response:
+        if not _valid_secret(request, config):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning("Rejected malformed webhook update: %s", e)
+            return web.Response(status=400)
+        await application.update_queue.put(update)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(config['path'], receive_update)
+    return app
+
+def create_router_app(config: Dict[str, Any], worker_urls: List[str]) -> web.Application:
+    """HTTP app that forwards every update to the worker owning its user"""
+    async def forward_update(request: web.Request) -> web.Response:
+        if not _valid_secret(request, config):
+            return web.Response(status=403)
+        body = await request.read()
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+
+        worker_url = worker_urls[_routing_key(payload) % len(worker_urls)]
+        try:
+            async with request.app['session'].post(
+                worker_url,
+                data=body,
+                headers={SECRET_HEADER: config['secret_token'], 'Content-Type': 'application/json'}
+            ) as response:
+                return web.Response(status=response.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Telegram redelivers updates that were not acknowledged
+            logger.error("Error forwarding update to %s: %s", worker_url, e)
+            return web.Response(status=502)
+
+    async def session_context(app: web.Application):
+        app['session'] = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        yield
+        await app['session'].close()
+
+    app = web.Application()
+    app.router.add_post(config['path'], forward_update)
+    app.cleanup_ctx.append(session_context)
+    return app
+
+async def set_webhook(bot: Bot, config: Dict[str, Any],
+                      allowed_updates: Optional[List[str]] = None) -> None:
+    """Register the webhook URL with Telegram"""
+    await bot.set_webhook(
+        url=config['url'],
+        allowed_updates=allowed_updates,
+        max_connections=config['max_connections'],
+        secret_token=config['secret_token'] or None
+    )
+    logger.info("Webhook set to %s", config['url'])
+
+def _shutdown_event() -> asyncio.Event:
+    """Event set on SIGINT or SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+async def _start_site(app: web.Application, host: str, port: int,
+                      reuse_port: bool = False) -> web.AppRunner:
+    """Serve an HTTP app until the returned runner is cleaned up"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port, reuse_port=reuse_port or None).start()
+    except BaseException:
+        # Port taken, for instance: nothing else would clean the runner up
+        await runner.cleanup()
+        raise
+    return runner
+
+async def serve_worker(application: Application, config: Dict[str, Any], host: str,
+                       port: int, reuse_port: bool = False,
+                       allowed_updates: Optional[List[str]] = None,
+                       register: bool = False) -> None:
+    """
+    Run one worker: receive updates over HTTP and process them until
+    SIGINT/SIGTERM. With register, the webhook is set once listening.
+    """
+    stop = _shutdown_event()
+    runner: Optional[web.AppRunner] = None
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+
+        runner = await _start_site(create_webhook_app(application, config), host, port, reuse_port)
+        logger.info("Webhook worker listening on %s:%s%s", host, port, config['path'])
+        if register:
+            await set_webhook(application.bot, config, allowed_updates)
+        await stop.wait()
+    finally:
+        # Stop accepting and finish requests in flight, then process the
+        # updates already queued before releasing shared resources. Startup
+        # may have failed at any step, leaving some of this undone.
+        logger.info("Webhook worker on port %s shutting down", port)
+        if runner is not None:
+            await runner.cleanup()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+def _run_worker(factory: ApplicationFactory, worker_index: int, config: Dict[str, Any],
+                host: str, port: int, reuse_port: bool) -> None:
+    """Entry point of a worker process"""
+    try:
+        asyncio.run(serve_worker(factory(worker_index), config, host, port, reuse_port))
+    finally:
+        # Worker processes exit without running atexit handlers
+        stop_logging()
+
+async def _wait_until_listening(port: int, timeout: float = 60) -> None:
+    """Wait until something accepts connections on a local port"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            if asyncio.get_running_loop().time() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+async def _watch_workers(workers: List[multiprocessing.Process]) -> None:
+    """Return once any worker process has exited"""
+    while all(worker.is_alive() for worker in workers):
+        await asyncio.sleep(1)
+
+async def _supervise(bot_factory: BotFactory, config: Dict[str, Any],
+                     workers: List[multiprocessing.Process], worker_ports: List[int],
+                     allowed_updates: Optional[List[str]]) -> None:
+    """Front the workers until SIGINT/SIGTERM or until one of them dies"""
+    stop = _shutdown_event()
+    router = None
+    try:
+        for port in worker_ports:
+            await _wait_until_listening(port)
+        if config['routing'] == 'user':
+            worker_urls = [f"http://127.0.0.1:{port}{config['path']}" for port in worker_ports]
+            router = await _start_site(
+                create_router_app(config, worker_urls), config['listen'], config['port']
+            )
+            logger.info(
+                "Webhook router listening on %s:%s%s for %s workers",
+                config['listen'], config['port'], config['path'], len(workers)
+            )
+
+        # Only register once every worker is ready to take updates
+        async with bot_factory() as bot:
+            await set_webhook(bot, config, allowed_updates)
+
+        waiters = [asyncio.ensure_future(stop.wait()), asyncio.ensure_future(_watch_workers(workers))]
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in waiters:
+            waiter.cancel()
+        if not stop.is_set():
+            logger.error("A webhook worker exited unexpectedly, shutting down")
+    finally:
+        if router is not None:
+            await router.cleanup()
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        loop = asyncio.get_running_loop()
+        for worker in workers:
+            await loop.run_in_executor(None, worker.join)
+        logger.info("All webhook workers stopped")
+
+def run_webhook(factory: ApplicationFactory, bot_factory: BotFactory,
+                config: Dict[str, Any] = WEBHOOK_CONFIG,
+                allowed_updates: Optional[List[str]] = None) -> None:
+    """
+    Serve updates through a webhook until SIGINT/SIGTERM. A single worker
+    runs in this process; several run as child processes, either behind a
+    front process routing each user to one worker or sharing the public
+    port through SO_REUSEPORT.
+    """
+    if not config['url']:
+        logger.error("WEBHOOK_URL must be set to run in webhook mode")
+        return
+
+    if config['workers'] <= 1:
+        asyncio.run(serve_worker(
+            factory(0), config, config['listen'], config['port'],
+            allowed_updates=allowed_updates, register=True
+        ))
+        return
+
+    if config['routing'] == 'user':
+        worker_ports = [config['port'] + 1 + index for index in range(config['workers'])]
+        worker_hosts = ['127.0.0.1'] * config['workers']
+        reuse_port = False
+    elif config['routing'] == 'reuse_port':
+        worker_ports = [config['port']] * config['workers']
+        worker_hosts = [config['listen']] * config['workers']
+        reuse_port = True
+    else:
+        logger.error("Unknown WEBHOOK_ROUTING '%s'", config['routing'])
+        return
+
+    # Workers start from a fresh interpreter, so no pools, sessions or
+    # event loop state are inherited from this process
+    context = multiprocessing.get_context('spawn')
+    workers = [
+        context.Process(
+            target=_run_worker,
+            args=(factory, index, config, host, port, reuse_port),
+            name=f"webhook-worker-{index}"
+        )
+        for index, (host, port) in enumerate(zip(worker_hosts, worker_ports))
+    ]
+    for worker in workers:
+        worker.start()
+    asyncio.run(_supervise(bot_factory, config, workers, sorted(set(worker_ports)), allowed_updates))
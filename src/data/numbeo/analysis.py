@@ -0,0 +1,503 @@
+# src/data/numbeo/analysis.py
+"""
+Cost-of-living indexes, rankings and similar cities over every known city.
+
+All cities are held in one cities x items float64 matrix, NULL costs as
+NaN, in the column order of the snapshot file. Composite indexes price a
+monthly basket per category (INDEX_BASKETS) in each city and divide it by
+the same basket in the reference city, times 100, as Numbeo's own indexes
+do. Items a city has no price for are left out of both sides of its
+ratio; a city whose known items cover less than MIN_COVERAGE of the
+reference basket gets no index. Without prices for the reference city,
+the median price of each item over every city stands in for them.
+
+Computing every index of every city is two matrix products. When a single
+city is scraped again only its row is recomputed, unless it is the
+reference. Similarity compares log prices standardized per item; an
+updated city is standardized with the statistics of the last rebuild.
+
+For budgets, each city also keeps the monthly cost of every
+BUDGET_COMPONENTS entry (rent, a meal out, a transit pass, utilities and
+groceries), so the cost of a lifestyle basket in every city is one
+matrix-vector product.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+import warnings
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from psycopg.rows import dict_row
+
+from src.data.numbeo.snapshot import EXPORT_QUERY, ITEM_COLUMNS, CitySnapshot, get_city_snapshot
+from src.utils.database import get_numbeo_db_connection
+from src.utils.metrics import callback_metric
+
+logger = logging.getLogger(__name__)
+
+def _parse_city(value: str) -> Tuple[str, str]:
+    city, _, country = value.rpartition(',')
+    return city.strip(), country.strip()
+
+# Cost index configuration
+COST_INDEX_CONFIG = {
+    # City whose baskets are 100, as "city, country"
+    'reference': _parse_city(os.getenv('COST_INDEX_REFERENCE', 'New York, United States')),
+    # Seconds before an index built from the database is read again; one
+    # built from the memory-mapped snapshot follows the snapshot instead
+    'max_age': float(os.getenv('COST_INDEX_MAX_AGE', '3600')),
+}
+
+# Monthly quantities of each item, per index, for one person
+INDEX_BASKETS: Dict[str, Dict[str, float]] = {
+    'rent': {
+        'apt_one_bdrm_ctr': 1,
+        'apt_one_bdrm_out': 1,
+        'apt_three_bdrm_ctr': 1,
+        'apt_three_bdrm_out': 1,
+    },
+    'groceries': {
+        'milk_one_liter': 8,
+        'bread_loaf': 8,
+        'white_rice_one_kg': 2,
+        'dozen_eggs': 2,
+        'cheese_one_kg': 1,
+        'chicken_breast_one_kg': 2,
+        'beef_round_one_kg': 1,
+        'apples_one_kg': 2,
+        'bananas_one_kg': 2,
+        'oranges_one_kg': 2,
+        'tomatoes_one_kg': 2,
+        'potatoes_one_kg': 3,
+        'onions_one_kg': 1,
+        'lettuce_head': 2,
+        'water_one_and_half_liter': 8,
+    },
+    'restaurants': {
+        'cheap_meal_for_one': 8,
+        'meal_for_two': 2,
+        'mcdonalds_meal': 2,
+        'domestic_beer': 4,
+        'imported_beer': 2,
+        'cappuccino': 8,
+        'coke_or_pepsi': 4,
+        'water': 4,
+    },
+    'transport': {
+        'monthly_transit_pass': 1,
+        'local_transit_one_way': 4,
+        'taxi_base_fare': 2,
+        'taxi_one_km': 16,
+    },
+}
+
+# Index names, in column order; 'overall' prices all baskets together
+INDEXES: Tuple[str, ...] = (*INDEX_BASKETS, 'overall')
+
+# Share of the reference basket a city must have prices for
+MIN_COVERAGE = 0.5
+
+def _basket_weights() -> np.ndarray:
+    """items x indexes matrix of basket quantities"""
+    weights = np.zeros((len(ITEM_COLUMNS), len(INDEXES)))
+    columns = {column: i for i, column in enumerate(ITEM_COLUMNS)}
+    for j, basket in enumerate(INDEX_BASKETS.values()):
+        for item, quantity in basket.items():
+            weights[columns[item], j] = quantity
+    weights[:, -1] = weights[:, :-1].sum(axis=1)
+    return weights
+
+WEIGHTS = _basket_weights()
+
+def price_vector(city_data: Dict[str, Any]) -> np.ndarray:
+    """A city dict's costs in ITEM_COLUMNS order, NULL as NaN"""
+    return np.array([
+        math.nan if city_data.get(column) is None else float(city_data[column])
+        for column in ITEM_COLUMNS
+    ])
+
+def compute_indexes(prices: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """
+    Indexes of every row of a cities x items price matrix against the
+    reference prices, as a cities x INDEXES matrix; NaN where a city
+    does not cover enough of a basket.
+    """
+    known_reference = ~np.isnan(reference)
+    # Items the reference has no price for drop out of every basket
+    weights = WEIGHTS * known_reference[:, None]
+    reference_costs = weights * np.where(known_reference, reference, 0)[:, None]
+    known = ~np.isnan(prices)
+    cost = np.where(known, prices, 0) @ weights
+    reference_cost = known.astype(np.float64) @ reference_costs
+    full_reference_cost = reference_costs.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        indexes = 100 * cost / reference_cost
+    # A basket the reference has no price for at all has no index either
+    indexes[(reference_cost < MIN_COVERAGE * full_reference_cost) | (reference_cost <= 0)] = np.nan
+    return indexes
+
+# Monthly costs a personal budget is made of -> the items they add up;
+# groceries are the groceries basket instead
+BUDGET_ITEMS: Dict[str, Tuple[str, ...]] = {
+    'rent_center': ('apt_one_bdrm_ctr',),
+    'rent_outside': ('apt_one_bdrm_out',),
+    'meal_out': ('cheap_meal_for_one',),
+    'transit_pass': ('monthly_transit_pass',),
+    'utilities': ('all_basic', 'internet_sixty_mbps'),
+    'groceries': (),
+}
+BUDGET_COMPONENTS: Tuple[str, ...] = tuple(BUDGET_ITEMS)
+
+_COLUMN_INDEX = {column: i for i, column in enumerate(ITEM_COLUMNS)}
+
+def compute_budget_components(prices: np.ndarray, indexes: np.ndarray,
+                              reference: np.ndarray) -> np.ndarray:
+    """
+    cities x BUDGET_COMPONENTS matrix of monthly costs, NaN where a city
+    lacks a price. A city's groceries are the reference basket scaled by
+    its groceries index, which prices the items it lacks like the items
+    it has.
+    """
+    components = np.empty((len(prices), len(BUDGET_COMPONENTS)))
+    for j, items in enumerate(BUDGET_ITEMS.values()):
+        if items:
+            # NaN if any of the items is
+            components[:, j] = prices[:, [_COLUMN_INDEX[item] for item in items]].sum(axis=1)
+    groceries = INDEXES.index('groceries')
+    reference_groceries = np.nansum(reference * WEIGHTS[:, groceries])
+    components[:, BUDGET_COMPONENTS.index('groceries')] = (
+        indexes[:, groceries] / 100 * reference_groceries
+    )
+    return components
+
+def lifestyle_basket(housing: str = 'center', meals_out_per_week: float = 2,
+                     transit_pass: bool = True) -> Dict[str, float]:
+    """Monthly quantities of BUDGET_COMPONENTS for one person"""
+    return {
+        'rent_center' if housing == 'center' else 'rent_outside': 1,
+        'meal_out': meals_out_per_week * 52 / 12,
+        'transit_pass': 1 if transit_pass else 0,
+        'utilities': 1,
+        'groceries': 1,
+    }
+
+def basket_indexes(city_data: Dict[str, Any],
+                   reference_data: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Indexes of one city against another, from their snapshot dicts"""
+    indexes = compute_indexes(price_vector(city_data)[None, :], price_vector(reference_data))[0]
+    return {name: None if math.isnan(value) else float(value)
+            for name, value in zip(INDEXES, indexes)}
+
+class CostIndex:
+    """Indexes, rankings and similar cities over a cities x items matrix"""
+
+    def __init__(self, names: List[Tuple[str, str]], prices: np.ndarray,
+                 reference: Tuple[str, str] = COST_INDEX_CONFIG['reference']):
+        # The fetcher imports this module, so its helper is imported late
+        from src.data.numbeo.fetcher import normalize_city_key
+        self._normalize = normalize_city_key
+
+        self.names: List[Tuple[str, str]] = list(names)
+        self._rows: Dict[Tuple[str, str], int] = {
+            normalize_city_key(*name): row for row, name in enumerate(self.names)
+        }
+        # Room to add cities without copying the matrix every time
+        self._prices = np.full((max(16, len(self.names) * 5 // 4), len(ITEM_COLUMNS)), np.nan)
+        self._prices[:len(self.names)] = prices
+        self._indexes = np.full((len(self._prices), len(INDEXES)), np.nan)
+        self._budget = np.full((len(self._prices), len(BUDGET_COMPONENTS)), np.nan)
+        # Standardized log prices for similarity, and their per-item statistics
+        self._features: Optional[np.ndarray] = None
+        self._mean = np.zeros(len(ITEM_COLUMNS))
+        self._std = np.ones(len(ITEM_COLUMNS))
+        self.reference = reference
+        # Whether the median prices stand in for the reference city's
+        self.median_reference = False
+        self._reference_prices = np.full(len(ITEM_COLUMNS), np.nan)
+        self.set_reference(reference)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]], **kwargs) -> 'CostIndex':
+        """From rows shaped like EXPORT_QUERY results"""
+        prices = np.array([price_vector(row) for row in rows]).reshape(len(rows), len(ITEM_COLUMNS))
+        return cls([(row['city_name'], row['country']) for row in rows], prices, **kwargs)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: CitySnapshot, **kwargs) -> 'CostIndex':
+        """From a memory-mapped snapshot, copying its matrix"""
+        columns = [snapshot.items.index(column) for column in ITEM_COLUMNS]
+        values = np.frombuffer(snapshot.values, dtype=np.float32)
+        try:
+            # Whole cents, as CitySnapshot.city returns them
+            prices = np.round(values.reshape(len(snapshot), len(snapshot.items))[:, columns]
+                              .astype(np.float64) * 100) / 100
+        finally:
+            # The snapshot cannot be closed while the buffer is exported
+            del values
+        return cls(snapshot.names(), prices, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def prices(self) -> np.ndarray:
+        """The cities x ITEM_COLUMNS price matrix, NaN where unknown"""
+        return self._prices[:len(self.names)]
+
+    def row(self, city_name: str, country: str) -> Optional[int]:
+        return self._rows.get(self._normalize(city_name, country))
+
+    def set_reference(self, reference: Tuple[str, str]) -> bool:
+        """
+        Make reference the city whose baskets are 100, and recompute every
+        index. If it is not a known city, or has no price in the overall
+        basket, the median price of each item is the reference instead.
+        Returns whether the city itself is the reference.
+        """
+        row = self.row(*reference)
+        prices = None if row is None else self._prices[row]
+        if prices is not None and np.nansum(prices * WEIGHTS[:, -1]) > 0:
+            self._reference_prices = prices.copy()
+            self.median_reference = False
+        else:
+            logger.warning(
+                "Cost index reference %s, %s is %s, using median prices instead",
+                *reference, 'not a known city' if row is None else 'not priced'
+            )
+            self._reference_prices = self._median_prices()
+            self.median_reference = True
+        self.reference = reference
+        self._recompute(slice(0, len(self.names)))
+        return not self.median_reference
+
+    def _median_prices(self) -> np.ndarray:
+        """Median price of each item over every city, NaN for items no city has"""
+        if not len(self.names):
+            return np.full(len(ITEM_COLUMNS), np.nan)
+        with warnings.catch_warnings():
+            # Items no city has a price for have no median
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nanmedian(self.prices, axis=0)
+
+    def _recompute(self, rows: slice) -> None:
+        """Indexes and budget components of rows, against the reference"""
+        self._indexes[rows] = compute_indexes(self._prices[rows], self._reference_prices)
+        self._budget[rows] = compute_budget_components(
+            self._prices[rows], self._indexes[rows], self._reference_prices
+        )
+
+    def indexes(self, city_name: str, country: str) -> Optional[Dict[str, Optional[float]]]:
+        """A city's indexes by name, None for those it has too few prices for"""
+        row = self.row(city_name, country)
+        if row is None:
+            return None
+        return {name: None if math.isnan(value) else float(value)
+                for name, value in zip(INDEXES, self._indexes[row].tolist())}
+
+    def rank(self, index: str = 'overall', limit: int = 10,
+             most_expensive: bool = False) -> List[Tuple[Tuple[str, str], float]]:
+        """The cheapest (or most expensive) cities by an index"""
+        values = self._indexes[:len(self.names), INDEXES.index(index)]
+        # NaN sorts last either way
+        keys = -values if most_expensive else values
+        limit = min(limit, int(np.count_nonzero(~np.isnan(values))))
+        if limit <= 0:
+            return []
+        top = np.argpartition(keys, limit - 1)[:limit] if limit < len(keys) else np.arange(len(keys))
+        top = top[np.argsort(keys[top], kind='stable')][:limit]
+        return [(self.names[row], float(values[row])) for row in top.tolist()]
+
+    def position(self, city_name: str, country: str,
+                 index: str = 'overall') -> Optional[Tuple[int, int]]:
+        """(rank, out of) of a city from the cheapest by an index"""
+        row = self.row(city_name, country)
+        if row is None:
+            return None
+        values = self._indexes[:len(self.names), INDEXES.index(index)]
+        value = values[row]
+        if math.isnan(value):
+            return None
+        ranked = ~np.isnan(values)
+        return int(np.count_nonzero(values[ranked] < value)) + 1, int(np.count_nonzero(ranked))
+
+    def _scale(self, prices: np.ndarray) -> np.ndarray:
+        """Standardized log prices; an unknown price is the mean, so no difference"""
+        features = (np.log(np.maximum(prices, 0.01)) - self._mean) / self._std
+        return np.nan_to_num(features, nan=0.0)
+
+    def _standardized(self) -> np.ndarray:
+        """Log prices scaled to zero mean and unit variance per item, for every city"""
+        if self._features is None:
+            logs = np.log(np.maximum(self._prices[:len(self.names)], 0.01))
+            with warnings.catch_warnings():
+                # Items no city has a price for have no mean
+                warnings.simplefilter('ignore', RuntimeWarning)
+                mean = np.nanmean(logs, axis=0)
+                std = np.nanstd(logs, axis=0)
+            std[~(std > 0)] = 1
+            self._mean, self._std = np.nan_to_num(mean), std
+            self._features = np.zeros((len(self._prices), len(ITEM_COLUMNS)))
+            self._features[:len(self.names)] = self._scale(self._prices[:len(self.names)])
+        return self._features[:len(self.names)]
+
+    def similar(self, city_name: str, country: str,
+                k: int = 5) -> List[Tuple[Tuple[str, str], float]]:
+        """
+        The k cities whose prices are closest to a city's, with their
+        root mean square distance in standard deviations of log price.
+        """
+        row = self.row(city_name, country)
+        if row is None or k <= 0:
+            return []
+        features = self._standardized()
+        distances = np.sqrt(((features - features[row]) ** 2).mean(axis=1))
+        distances[row] = np.inf
+        k = min(k, len(distances) - 1)
+        if k <= 0:
+            return []
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+        return [(self.names[other], float(distances[other])) for other in nearest.tolist()]
+
+    def _basket_costs(self, basket: Dict[str, float]) -> np.ndarray:
+        """Monthly cost of a lifestyle basket in every city, NaN where unknown"""
+        used = [BUDGET_COMPONENTS.index(name) for name, quantity in basket.items() if quantity]
+        quantities = np.array([quantity for quantity in basket.values() if quantity])
+        # Only the components in the basket, so a missing price elsewhere does not count
+        return self._budget[:len(self.names), used] @ quantities
+
+    def basket_cost(self, city_name: str, country: str,
+                    basket: Dict[str, float]) -> Optional[float]:
+        """Monthly cost of a lifestyle basket in one city"""
+        row = self.row(city_name, country)
+        if row is None:
+            return None
+        cost = float(self._basket_costs(basket)[row])
+        return None if math.isnan(cost) else cost
+
+    def affordable(self, income: float, basket: Dict[str, float],
+                   limit: int = 10) -> Tuple[List[Tuple[Tuple[str, str], float]], int, int]:
+        """
+        The cities where a lifestyle basket fits in income, those closest to
+        it first, with its cost in each; also how many cities it fits in
+        and how many have the prices to tell
+        """
+        costs = self._basket_costs(basket)
+        priced = ~np.isnan(costs)
+        fits = np.flatnonzero(priced & (costs <= income))
+        top = fits[:max(limit, 0)]
+        if 0 < limit < len(fits):
+            top = fits[np.argpartition(-costs[fits], limit - 1)[:limit]]
+        top = top[np.argsort(-costs[top], kind='stable')]
+        return ([(self.names[row], float(costs[row])) for row in top.tolist()],
+                len(fits), int(np.count_nonzero(priced)))
+
+    def update_city(self, city_data: Dict[str, Any]) -> None:
+        """Add a city or replace its prices, recomputing only what depends on it"""
+        name = (city_data['city_name'], city_data['country'])
+        key = self._normalize(*name)
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self.names)
+            if row == len(self._prices):
+                self._grow()
+            self.names.append(name)
+            self._rows[key] = row
+        self._prices[row] = price_vector(city_data)
+        if self._features is not None:
+            # Scaled with the statistics of the last rebuild, which one
+            # city among thousands hardly moves
+            self._features[row] = self._scale(self._prices[row])
+        if key == self._normalize(*self.reference):
+            # Every index is relative to the reference
+            self.set_reference(self.reference)
+        else:
+            self._recompute(slice(row, row + 1))
+
+    def _grow(self) -> None:
+        capacity = len(self._prices) * 2
+        prices = np.full((capacity, len(ITEM_COLUMNS)), np.nan)
+        prices[:len(self._prices)] = self._prices
+        indexes = np.full((capacity, len(INDEXES)), np.nan)
+        indexes[:len(self._indexes)] = self._indexes
+        budget = np.full((capacity, len(BUDGET_COMPONENTS)), np.nan)
+        budget[:len(self._budget)] = self._budget
+        self._prices, self._indexes, self._budget = prices, indexes, budget
+        if self._features is not None:
+            features = np.zeros((capacity, len(ITEM_COLUMNS)))
+            features[:len(self._features)] = self._features
+            self._features = features
+
+# The index in use, what it was built from, and when
+_cost_index: Optional[CostIndex] = None
+_source: Optional[Tuple[int, int, int]] = None
+_built_at = 0.0
+_load_lock: Optional[asyncio.Lock] = None
+
+async def load_cost_index() -> Optional[CostIndex]:
+    """
+    Build the index from the memory-mapped snapshot if one is in use,
+    otherwise from the database, and make it the one in use
+    """
+    global _cost_index, _source, _built_at
+    try:
+        start = time.perf_counter()
+        snapshot = get_city_snapshot()
+        if snapshot is not None:
+            index = CostIndex.from_snapshot(snapshot)
+            source = snapshot.identity
+        else:
+            async with get_numbeo_db_connection() as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(EXPORT_QUERY)
+                    rows = await cur.fetchall()
+            index = CostIndex.from_rows(rows)
+            source = None
+        _cost_index, _source, _built_at = index, source, time.monotonic()
+        logger.info("Built cost indexes of %s cities in %.1f ms",
+                    len(index), (time.perf_counter() - start) * 1000)
+        return index
+    except Exception as e:
+        logger.error("Error building cost indexes: %s", e)
+        return None
+
+def _is_current() -> bool:
+    if _cost_index is None:
+        return False
+    snapshot = get_city_snapshot()
+    if snapshot is not None:
+        return _source == snapshot.identity
+    return _source is None and time.monotonic() - _built_at < COST_INDEX_CONFIG['max_age']
+
+async def get_cost_index() -> Optional[CostIndex]:
+    """
+    The index in use, building it on first use, when a new snapshot has
+    been published, or when one read from the database is max_age old
+    """
+    global _load_lock
+    if _is_current():
+        return _cost_index
+    if _load_lock is None:
+        _load_lock = asyncio.Lock()
+    async with _load_lock:
+        # Another caller may have rebuilt it while this one waited
+        if _is_current():
+            return _cost_index
+        return await load_cost_index() or _cost_index
+
+def update_cost_index(city_data: Dict[str, Any]) -> None:
+    """Apply a newly stored snapshot of a city to the index in use, if any"""
+    if _cost_index is None:
+        return
+    try:
+        _cost_index.update_city(city_data)
+    except Exception as e:
+        logger.error("Error updating cost indexes for %s: %s", city_data.get('city_name'), e)
+
+callback_metric(
+    'shakespr_cost_index_cities', 'Cities in the cost index in use',
+    'gauge', lambda: len(_cost_index) if _cost_index is not None else 0
+)
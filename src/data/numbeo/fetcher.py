@@ -1,145 +1,623 @@
 # src/data/numbeo/fetcher.py
+import asyncio
+import os
+import time
+from collections import Counter
 from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from src.utils.database import get_numbeo_db_connection
+from functools import lru_cache
+from psycopg import sql
+from psycopg.rows import dict_row
+from src.data.numbeo.analysis import update_cost_index
+from src.data.numbeo.items import COST_CATEGORIES, CostData, category_columns
+from src.data.numbeo.snapshot import get_city_snapshot
+from src.utils.cache import TTLCache
+from src.utils.database import DB_QUERY_SECONDS, get_numbeo_db_connection
 from src.utils.logging import logger
-from typing import Optional, Dict, Any
+from src.utils.metrics import callback_metric, counter, histogram, timed
+from src.utils.singleflight import SingleFlight
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+# How long a Numbeo snapshot is considered fresh
+FRESHNESS_WINDOW = timedelta(days=30)
+
+# Snapshots older than this are served as-is but refreshed in the background
+REFRESH_AFTER = timedelta(days=int(os.getenv('CITY_REFRESH_AFTER_DAYS', '25')))
+
+# Upper bound on the number of distinct cities tracked for popularity
+MAX_TRACKED_CITIES = 10000
+
+# Cities Numbeo had no costs for are not scraped again until a re-check
+# is due, the wait doubling with each miss from recheck_after up to
+# max_recheck_after seconds
+CITY_MISS_CONFIG = {
+    'recheck_after': float(os.getenv('CITY_MISS_RECHECK_AFTER', '3600')),
+    'max_recheck_after': float(os.getenv('CITY_MISS_MAX_RECHECK_AFTER', '604800')),
+}
+
+# Concurrent scrapes of the same city share one Numbeo fetch
+_numbeo_fetches = SingleFlight('numbeo_fetch')
+
+# Recently read city snapshots, expiring when the snapshot goes stale
+_city_cache: TTLCache[Dict[str, Any]] = TTLCache(
+    'city_snapshots',
+    max_size=int(os.getenv('CITY_CACHE_SIZE', '1024'))
+)
+
+# Known misses, each expiring when its re-check is due, in front of
+# numbeo_col.city_misses
+_city_misses: TTLCache[str] = TTLCache(
+    'city_misses',
+    max_size=int(os.getenv('CITY_MISS_CACHE_SIZE', '10000'))
+)
+
+CITY_MISSES = counter(
+    'shakespr_city_misses_total',
+    'Cities Numbeo has no costs for: misses recorded, and scrapes skipped because of one',
+    labels=('event',)
+)
+CITY_FETCH_SECONDS = histogram(
+    'shakespr_city_fetch_seconds',
+    'Latency of city lookups by where the data came from',
+    labels=('source',)
+)
+CITIES_FETCH_SECONDS = histogram(
+    'shakespr_cities_fetch_seconds',
+    'Latency of multi-city lookups for comparisons'
+)
+
+def _numbeo_fetch_stats() -> Dict[Tuple[str], int]:
+    stats = _numbeo_fetches.stats()
+    return {('started',): stats['executions'], ('coalesced',): stats['coalesced']}
+
+callback_metric(
+    'shakespr_numbeo_fetches_in_flight', 'Numbeo fetches currently running',
+    'gauge', _numbeo_fetches.in_flight
+)
+callback_metric(
+    'shakespr_numbeo_fetches_total', 'Numbeo fetches started, and calls that joined a running one',
+    'counter', _numbeo_fetch_stats, labels=('kind',)
+)
+
+# Request counts per normalized city, and the spelling last used for it
+_request_counts: Counter = Counter()
+_display_names: Dict[Tuple[str, str], Tuple[str, str]] = {}
+
+# Strong references to running background refreshes
+_background_refreshes: Set[asyncio.Task] = set()
+
+def normalize_city_name(name: str) -> str:
+    """Strip a city or country name and collapse its inner whitespace"""
+    return ' '.join(name.split())
+
+def normalize_city_key(city_name: str, country: str) -> Tuple[str, str]:
+    """Normalize a city/country pair for use as a lookup key"""
+    return (
+        normalize_city_name(city_name).casefold(),
+        normalize_city_name(country).casefold()
+    )
+
+def get_fetch_stats() -> Dict[str, int]:
+    """Return coalescing counters for Numbeo fetches"""
+    return _numbeo_fetches.stats()
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Return hit/miss/eviction statistics of the city snapshot cache"""
+    return _city_cache.stats()
+
+def invalidate_city_cache(city_name: str, country: str) -> None:
+    """Drop the cached snapshot for a city"""
+    _city_cache.invalidate(normalize_city_key(city_name, country))
+
+def _snapshot_age(last_updated: datetime) -> timedelta:
+    """Age of a snapshot taken at last_updated"""
+    return datetime.now(last_updated.tzinfo) - last_updated
+
+def _snapshot_ttl(last_updated: datetime) -> float:
+    """Seconds until a snapshot taken at last_updated leaves the freshness window"""
+    return (FRESHNESS_WINDOW - _snapshot_age(last_updated)).total_seconds()
+
+def needs_refresh(city_data: Dict[str, Any]) -> bool:
+    """Whether a snapshot is old enough to be refreshed from Numbeo"""
+    return _snapshot_age(city_data['last_updated']) >= REFRESH_AFTER
+
+def _record_request(city_name: str, country: str) -> None:
+    """Count a request for a city so the refresher can find the hot ones"""
+    key = normalize_city_key(city_name, country)
+    _request_counts[key] += 1
+    _display_names[key] = (city_name, country)
+    if len(_request_counts) > MAX_TRACKED_CITIES:
+        # Keep the most requested half so one-off typos do not pile up
+        keep = dict(_request_counts.most_common(MAX_TRACKED_CITIES // 2))
+        _request_counts.clear()
+        _request_counts.update(keep)
+        for stale_key in set(_display_names) - set(keep):
+            del _display_names[stale_key]
+
+def get_hot_cities(limit: int) -> List[Tuple[str, str]]:
+    """Return the most requested (city, country) pairs, most requested first"""
+    return [_display_names[key] for key, _ in _request_counts.most_common(limit)]
+
+# Miss of a city, if its re-check is not due yet
+CITY_MISS_QUERY = """
+    SELECT reason, EXTRACT(EPOCH FROM recheck_at - CURRENT_TIMESTAMP)::float8 AS ttl
+    FROM numbeo_col.city_misses
+    WHERE city_key = %s AND country_key = %s
+    AND recheck_at > CURRENT_TIMESTAMP
+"""
+
+# Count a miss and push its re-check back, twice as far as the last time
+RECORD_CITY_MISS_QUERY = """
+    INSERT INTO numbeo_col.city_misses AS miss (city_key, country_key, reason, recheck_at)
+    VALUES (%(city_key)s, %(country_key)s, %(reason)s,
+            CURRENT_TIMESTAMP + make_interval(secs => %(recheck_after)s))
+    ON CONFLICT (city_key, country_key) DO UPDATE SET
+        reason = EXCLUDED.reason,
+        misses = miss.misses + 1,
+        last_checked_at = CURRENT_TIMESTAMP,
+        recheck_at = CURRENT_TIMESTAMP + make_interval(secs => LEAST(
+            %(recheck_after)s * power(2, miss.misses), %(max_recheck_after)s
+        ))
+    RETURNING misses, EXTRACT(EPOCH FROM recheck_at - CURRENT_TIMESTAMP)::float8 AS ttl
+"""
+
+async def is_known_miss(city_name: str, country: str) -> bool:
+    """
+    Whether Numbeo had no costs for a city and its re-check is not due.
+    Misses not known in memory are looked up in the database, so those
+    recorded by other processes are found too.
+    """
+    key = normalize_city_key(city_name, country)
+    if _city_misses.get(key) is not None:
+        return True
+    try:
+        async with get_numbeo_db_connection() as conn:
+            async with conn.cursor() as cur:
+                with DB_QUERY_SECONDS.time(query='city_miss'):
+                    await cur.execute(CITY_MISS_QUERY, key)
+                    row = await cur.fetchone()
+    except Exception as e:
+        # Scraping again is better than not serving the city
+        logger.error("Error reading the miss of %s: %s", city_name, e)
+        return False
+    if row is None:
+        return False
+    _city_misses.set(key, row[0], ttl=row[1])
+    return True
+
+async def record_city_miss(city_name: str, country: str, reason: str) -> None:
+    """Remember that Numbeo has no costs for a city"""
+    key = normalize_city_key(city_name, country)
+    try:
+        async with get_numbeo_db_connection() as conn:
+            async with conn.cursor() as cur:
+                with DB_QUERY_SECONDS.time(query='record_city_miss'):
+                    await cur.execute(RECORD_CITY_MISS_QUERY, {
+                        'city_key': key[0],
+                        'country_key': key[1],
+                        'reason': reason,
+                        'recheck_after': CITY_MISS_CONFIG['recheck_after'],
+                        'max_recheck_after': CITY_MISS_CONFIG['max_recheck_after'],
+                    })
+                    misses, ttl = await cur.fetchone()
+            await conn.commit()
+    except Exception as e:
+        logger.error("Error recording the miss of %s: %s", city_name, e)
+        return
+    _city_misses.set(key, reason, ttl=ttl)
+    CITY_MISSES.inc(event='recorded')
+    logger.info(
+        "No Numbeo costs for %s, %s (%s, miss %s), re-checking in %.0f s",
+        city_name, country, reason, misses, ttl
+    )
+
+async def refresh_city_data(city_name: str, country: str) -> Optional[Dict[str, Any]]:
+    """
+    Scrape and store a city, joining any fetch already running for it.
+    Returns None without scraping if Numbeo recently had no costs for it.
+    """
+    if await is_known_miss(city_name, country):
+        CITY_MISSES.inc(event='skipped')
+        return None
+    return await _fetch_numbeo_data(city_name, country)
+
+async def _fetch_numbeo_data(city_name: str, country: str) -> Optional[Dict[str, Any]]:
+    # Callers asking for the same city while a fetch is running wait for
+    # that fetch instead of starting their own scrape
+    return await _numbeo_fetches.do(
+        normalize_city_key(city_name, country),
+        lambda: fetch_and_store_numbeo_data(city_name, country)
+    )
+
+def schedule_refresh(city_name: str, country: str) -> None:
+    """Refresh a city in the background without waiting for the result"""
+    task = asyncio.ensure_future(refresh_city_data(city_name, country))
+    _background_refreshes.add(task)
+    task.add_done_callback(_background_refreshes.discard)
+
+def _serve_local(city_name: str, country: str, local_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a local snapshot, refreshing it in the background if it is stale"""
+    if needs_refresh(local_data):
+        logger.info("Serving stale local data for %s, refreshing in background", city_name)
+        schedule_refresh(city_name, country)
+    else:
+        logger.info("Found recent local data for %s", city_name)
+    return local_data
 
 async def fetch_city_data(city_name: str, country: str) -> Optional[Dict[str, Any]]:
     """
-    Fetch city data from local database first, if not found or outdated,
-    fetch from Numbeo and store in database.
+    Fetch city data from local database first, if not found fetch from
+    Numbeo and store in database. Outdated local data is returned right
+    away while a refresh runs in the background.
     """
-    logger.info(f"Fetching data for {city_name}, {country}")
+    logger.info("Fetching data for %s, %s", city_name, country)
+    _record_request(city_name, country)
+    start = time.perf_counter()
     
     # Try to get data from local database first
     local_data = await get_local_city_data(city_name, country)
     if local_data:
-        logger.info(f"Found recent local data for {city_name}")
+        source = 'stale' if needs_refresh(local_data) else 'local'
+        local_data = _serve_local(city_name, country, local_data)
+        CITY_FETCH_SECONDS.observe(time.perf_counter() - start, source=source)
         return local_data
 
+    # Numbeo recently had no costs for the city, so do not ask again yet
+    if await is_known_miss(city_name, country):
+        logger.info("No Numbeo costs for %s until its re-check", city_name)
+        CITY_MISSES.inc(event='skipped')
+        CITY_FETCH_SECONDS.observe(time.perf_counter() - start, source='known_miss')
+        return None
+
     # If no local data, fetch from Numbeo
-    logger.info(f"No recent local data found for {city_name}, fetching from Numbeo")
-    numbeo_data = await fetch_and_store_numbeo_data(city_name, country)
+    logger.info("No local data found for %s, fetching from Numbeo", city_name)
+    numbeo_data = await _fetch_numbeo_data(city_name, country)
+    CITY_FETCH_SECONDS.observe(
+        time.perf_counter() - start,
+        source='numbeo' if numbeo_data else 'missing'
+    )
     return numbeo_data
 
-async def get_local_city_data(city_name: str, country: str) -> Optional[Dict[str, Any]]:
-    """Get city data from local PostgreSQL database"""
+@timed(CITIES_FETCH_SECONDS)
+async def fetch_cities_data(
+    cities: List[Tuple[str, str]]
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Fetch several (city, country) pairs at once, for side-by-side
+    comparisons. Cities in the snapshot cache or the database are read in
+    one query, the missing ones are scraped concurrently. Results are in
+    input order, with None for cities that could not be found.
+    """
+    logger.info("Fetching data for %s cities", len(cities))
+    for city_name, country in cities:
+        _record_request(city_name, country)
+
+    # Each distinct city is looked up once, whatever its spelling
+    first_seen: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    for city_name, country in cities:
+        first_seen.setdefault(normalize_city_key(city_name, country), (city_name, country))
+
+    local = await get_local_cities_data(list(first_seen.values()))
+    found: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+    missing = []
+    for key, (city_name, country) in first_seen.items():
+        local_data = local.get(key)
+        if local_data:
+            found[key] = _serve_local(city_name, country, local_data)
+        else:
+            missing.append(key)
+
+    if missing:
+        logger.info("No local data found for %s cities, fetching from Numbeo", len(missing))
+        scraped = await asyncio.gather(
+            *(refresh_city_data(*first_seen[key]) for key in missing)
+        )
+        found.update(zip(missing, scraped))
+
+    return [found[normalize_city_key(city_name, country)] for city_name, country in cities]
+
+# Names are passed through normalize_city_name and compared with the
+# expression idx_cities_name_country_key indexes, so "New  York" finds the
+# row stored as "New York".
+#
+# Latest snapshot of one city: idx_cities_name_country_key finds the city
+# and the city_latest_costs primary key its denormalized row, which holds
+# every cost column. The statement is prepared on each pooled connection so
+# the plan is built once. utilities_basic and rent_1br_center are kept as
+# aliases for existing callers.
+LATEST_SNAPSHOT_QUERY = """
+    SELECT 
+        c.city_name,
+        c.country,
+        c.region,
+        l.*,
+        l.all_basic as utilities_basic,
+        l.apt_one_bdrm_ctr as rent_1br_center
+    FROM numbeo_col.cities c
+    JOIN numbeo_col.city_latest_costs l ON c.city_id = l.city_id
+    WHERE LOWER(btrim(regexp_replace(c.city_name, '\\s+', ' ', 'g'))) = LOWER(%s)
+    AND LOWER(btrim(regexp_replace(c.country, '\\s+', ' ', 'g'))) = LOWER(%s)
+"""
+
+# Latest snapshots of several cities, passed as two parallel arrays. The
+# position column maps each row back to the requested pair.
+LATEST_SNAPSHOTS_QUERY = """
+    SELECT 
+        k.position,
+        c.city_name,
+        c.country,
+        c.region,
+        l.*,
+        l.all_basic as utilities_basic,
+        l.apt_one_bdrm_ctr as rent_1br_center
+    FROM unnest(%s::text[], %s::text[]) WITH ORDINALITY AS k(city_name, country, position)
+    JOIN numbeo_col.cities c
+        ON LOWER(btrim(regexp_replace(c.city_name, '\\s+', ' ', 'g'))) = LOWER(k.city_name)
+        AND LOWER(btrim(regexp_replace(c.country, '\\s+', ' ', 'g'))) = LOWER(k.country)
+    JOIN numbeo_col.city_latest_costs l ON c.city_id = l.city_id
+"""
+
+async def get_local_cities_data(
+    cities: List[Tuple[str, str]]
+) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """
+    Get the snapshots of several cities from the snapshot cache or the
+    memory-mapped snapshot, reading the others in a single query. Returns
+    a dict keyed by normalize_city_key, without entries for cities that
+    are not stored.
+    """
+    found: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    uncached = []
+    snapshot = get_city_snapshot()
+    for city_name, country in cities:
+        key = normalize_city_key(city_name, country)
+        cached = _city_cache.get(key)
+        if cached is None and snapshot is not None:
+            cached = snapshot.get(key)
+        if cached is not None:
+            found[key] = cached
+        else:
+            uncached.append((city_name, country))
+    if not uncached:
+        return found
+
     try:
-        with get_numbeo_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # Check for recent data (last 30 days)
-                cur.execute("""
-                    WITH latest_update AS (
-                        SELECT c.city_id, MAX(u.update_id) as update_id
-                        FROM numbeo_col.cities c
-                        JOIN numbeo_col.updates u ON c.city_id = u.city_id
-                        WHERE LOWER(c.city_name) = LOWER(%s)
-                        AND LOWER(c.country) = LOWER(%s)
-                        AND u.date > NOW() - INTERVAL '30 days'
-                        GROUP BY c.city_id
+        async with get_numbeo_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                with DB_QUERY_SECONDS.time(query='latest_snapshots'):
+                    await cur.execute(
+                        LATEST_SNAPSHOTS_QUERY,
+                        ([normalize_city_name(city) for city, _ in uncached],
+                         [normalize_city_name(country) for _, country in uncached]),
+                        prepare=True
                     )
-                    SELECT 
-                        c.city_name,
-                        c.country,
-                        c.region,
-                        r.cheap_meal_for_one,
-                        m.milk_one_liter,
-                        t.monthly_transit_pass,
-                        ut.all_basic as utilities_basic,
-                        rent.apt_one_bdrm_ctr as rent_1br_center,
-                        u.date as last_updated
-                    FROM latest_update lu
-                    JOIN numbeo_col.cities c ON lu.city_id = c.city_id
-                    JOIN numbeo_col.updates u ON lu.update_id = u.update_id
-                    LEFT JOIN numbeo_col.restaurant_cost_sets r ON lu.update_id = r.update_id
-                    LEFT JOIN numbeo_col.market_cost_sets m ON lu.update_id = m.update_id
-                    LEFT JOIN numbeo_col.transportation_cost_sets t ON lu.update_id = t.update_id
-                    LEFT JOIN numbeo_col.utilities_cost_sets ut ON lu.update_id = ut.update_id
-                    LEFT JOIN numbeo_col.rent_cost_sets rent ON lu.update_id = rent.update_id
-                    WHERE c.city_id = (
-                        SELECT city_id FROM latest_update
+                    rows = await cur.fetchall()
+                for row in rows:
+                    key = normalize_city_key(*uncached[row.pop('position') - 1])
+                    found[key] = row
+                    _city_cache.set(key, row, ttl=_snapshot_ttl(row['last_updated']))
+    except Exception as e:
+        logger.error("Error getting local data for %s cities: %s", len(uncached), e)
+    return found
+
+async def get_local_city_data(city_name: str, country: str,
+                              use_snapshot: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Get city data from the snapshot cache, the memory-mapped snapshot
+    (unless use_snapshot is False) or the local PostgreSQL database
+    """
+    key = normalize_city_key(city_name, country)
+    cached = _city_cache.get(key)
+    if cached is not None:
+        return cached
+    snapshot = get_city_snapshot() if use_snapshot else None
+    if snapshot is not None:
+        exported = snapshot.get(key)
+        if exported is not None:
+            return exported
+
+    try:
+        async with get_numbeo_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                # Latest snapshot, whatever its age
+                with DB_QUERY_SECONDS.time(query='latest_snapshot'):
+                    await cur.execute(
+                        LATEST_SNAPSHOT_QUERY,
+                        (normalize_city_name(city_name), normalize_city_name(country)),
+                        prepare=True
                     )
-                """, (city_name, country))
+                    result = await cur.fetchone()
                 
-                result = cur.fetchone()
+                if result:
+                    _city_cache.set(key, result, ttl=_snapshot_ttl(result['last_updated']))
                 return result
 
     except Exception as e:
-        logger.error(f"Error getting local city data: {e}")
+        logger.error("Error getting local city data: %s", e)
         return None
 
+@lru_cache(maxsize=None)
+def _snapshot_insert_query(categories: Tuple[str, ...]) -> sql.Composed:
+    """
+    Build one statement that finds or creates the city, inserts the update
+    row and inserts a cost row for each category, all keyed on the
+    update_id returned by the updates INSERT. The city's city_latest_costs
+    row is replaced in the same statement; categories that were not scraped
+    are stored as NULL there, matching the missing cost rows.
+    """
+    all_columns = [
+        column for category in COST_CATEGORIES for column in category_columns(category)
+    ]
+    scraped_columns = {
+        column for category in categories for column in category_columns(category)
+    }
+    cost_inserts = [
+        sql.SQL("""
+        {name} AS (
+            INSERT INTO numbeo_col.{table} (update_id, {columns})
+            SELECT update_id, {values} FROM new_update
+        )""").format(
+            name=sql.Identifier(f"{category}_costs"),
+            table=sql.Identifier(COST_CATEGORIES[category][0]),
+            columns=sql.SQL(', ').join(map(sql.Identifier, category_columns(category))),
+            # Typed so missing (None) values are not resolved as text
+            values=sql.SQL(', ').join(
+                sql.SQL('{}::numeric').format(sql.Placeholder(column))
+                for column in category_columns(category)
+            )
+        )
+        for category in categories
+    ]
+    return sql.SQL("""
+        WITH existing_city AS (
+            SELECT city_id
+            FROM numbeo_col.cities
+            WHERE LOWER(btrim(regexp_replace(city_name, '\\s+', ' ', 'g'))) = LOWER(%(city_name)s)
+            AND LOWER(btrim(regexp_replace(country, '\\s+', ' ', 'g'))) = LOWER(%(country)s)
+            LIMIT 1
+        ),
+        new_city AS (
+            INSERT INTO numbeo_col.cities (city_name, country, region)
+            SELECT %(city_name)s, %(country)s, ''
+            WHERE NOT EXISTS (SELECT 1 FROM existing_city)
+            RETURNING city_id
+        ),
+        new_update AS (
+            INSERT INTO numbeo_col.updates (city_id, date)
+            SELECT city_id, CURRENT_TIMESTAMP
+            FROM (
+                SELECT city_id FROM existing_city
+                UNION ALL
+                SELECT city_id FROM new_city
+            ) city
+            RETURNING update_id, city_id, date
+        ),
+        -- Numbeo has costs for the city now
+        cleared_miss AS (
+            DELETE FROM numbeo_col.city_misses
+            WHERE city_key = %(city_key)s AND country_key = %(country_key)s
+        ){cost_inserts},
+        latest_costs AS (
+            INSERT INTO numbeo_col.city_latest_costs AS latest
+                (city_id, update_id, last_updated, {latest_columns})
+            SELECT city_id, update_id, date, {latest_values} FROM new_update
+            ON CONFLICT (city_id) DO UPDATE SET
+                update_id = EXCLUDED.update_id,
+                last_updated = EXCLUDED.last_updated,
+                {latest_updates}
+            -- A concurrent writer that committed a newer update wins
+            WHERE (latest.last_updated, latest.update_id)
+                < (EXCLUDED.last_updated, EXCLUDED.update_id)
+        )
+        SELECT update_id, city_id FROM new_update
+    """).format(
+        cost_inserts=sql.SQL('').join(
+            sql.SQL(',') + cost_insert for cost_insert in cost_inserts
+        ),
+        latest_columns=sql.SQL(', ').join(map(sql.Identifier, all_columns)),
+        latest_values=sql.SQL(', ').join(
+            sql.SQL('{}::numeric').format(sql.Placeholder(column))
+            if column in scraped_columns else sql.NULL
+            for column in all_columns
+        ),
+        latest_updates=sql.SQL(', ').join(
+            sql.SQL('{0} = EXCLUDED.{0}').format(sql.Identifier(column))
+            for column in all_columns
+        )
+    )
+
+async def _store_scraped_data(cur, city_name: str, country: str,
+                              scraped_data: CostData) -> int:
+    """
+    Insert a scraped snapshot for a city, creating the city if needed,
+    in a single round trip
+    """
+    # Categories without any scraped value get no row, as before
+    categories = tuple(
+        category for category in COST_CATEGORIES if scraped_data.get(category)
+    )
+    city_key, country_key = normalize_city_key(city_name, country)
+    # A new city is stored under the normalized spelling
+    params: Dict[str, Any] = {
+        'city_name': normalize_city_name(city_name),
+        'country': normalize_city_name(country),
+        'city_key': city_key, 'country_key': country_key
+    }
+    for category in categories:
+        for column in category_columns(category):
+            params[column] = scraped_data[category].get(column)
+
+    with DB_QUERY_SECONDS.time(query='store_snapshot'):
+        await cur.execute(_snapshot_insert_query(categories), params)
+        update_id, city_id = await cur.fetchone()
+    logger.info(
+        "Stored update %s for city %s with %s cost categories",
+        update_id, city_id, len(categories)
+    )
+    return update_id
+
 async def fetch_and_store_numbeo_data(city_name: str, country: str) -> Optional[Dict[str, Any]]:
     """Fetch data from Numbeo and store in local database"""
     try:
         # Import the scraper only when needed
-        from src.data.numbeo.scraper import scrape_city_data
+        from src.data.numbeo.scraper import NOT_AVAILABLE, scrape_city
         
-        # First, check if city exists in our database
-        with get_numbeo_db_connection() as conn:
-            with conn.cursor() as cur:
-                # Try to get existing city_id first
-                cur.execute("""
-                    SELECT city_id 
-                    FROM numbeo_col.cities 
-                    WHERE LOWER(city_name) = LOWER(%s) 
-                    AND LOWER(country) = LOWER(%s)
-                """, (city_name, country))
-                
-                result = cur.fetchone()
-                if result:
-                    city_id = result[0]
-                    logger.info(f"Found existing city_id: {city_id}")
-                else:
-                    # Create new city if it doesn't exist
-                    cur.execute("""
-                        INSERT INTO numbeo_col.cities (city_name, country, region)
-                        VALUES (%s, %s, %s)
-                        RETURNING city_id
-                    """, (city_name, country, ''))
-                    city_id = cur.fetchone()[0]
-                    logger.info(f"Created new city with id: {city_id}")
-                
-                # Scrape data from Numbeo
-                scraped_data = await scrape_city_data(city_name)
-                if not scraped_data:
-                    logger.error(f"Failed to scrape data for {city_name}")
-                    return None
-                
-                logger.info(f"Scraped data: {scraped_data}")
-                
-                # Insert update record
-                cur.execute("""
-                    INSERT INTO numbeo_col.updates (city_id, date)
-                    VALUES (%s, CURRENT_TIMESTAMP)
-                    RETURNING update_id
-                """, (city_id,))
-                update_id = cur.fetchone()[0]
-                logger.info(f"Created update record with id: {update_id}")
-                
-                # Insert cost data
-                if 'restaurant' in scraped_data and scraped_data['restaurant']:
-                    restaurant_data = scraped_data['restaurant']
-                    logger.info(f"Restaurant data: {restaurant_data}")
-                    try:
-                        cur.execute("""
-                            INSERT INTO numbeo_col.restaurant_cost_sets
-                            (update_id, cheap_meal_for_one, meal_for_two, mcdonalds_meal,
-                             domestic_beer, imported_beer, cappuccino, coke_or_pepsi, water)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """, (update_id, *restaurant_data[:8]))
-                    except Exception as e:
-                        logger.error(f"Error inserting restaurant data: {e}")
-
-                # Similar blocks for other cost sets...
-                
-                conn.commit()
+        # Scrape data from Numbeo before taking a pooled connection, so
+        # the connection is not held for the duration of the HTTP request.
+        # Nothing is stored unless the scrape found costs.
+        outcome, scraped_data = await scrape_city(city_name)
+        if not scraped_data:
+            logger.error("Failed to scrape data for %s", city_name)
+            if outcome in NOT_AVAILABLE:
+                await record_city_miss(city_name, country, outcome)
+            return None
+        
+        # The whole payload, only wanted when debugging the scraper
+        logger.debug("Scraped data for %s: %s", city_name, scraped_data)
+        
+        async with get_numbeo_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await _store_scraped_data(cur, city_name, country, scraped_data)
+                await conn.commit()
                 logger.info("Successfully committed all data")
                 
-                # Return the newly scraped and stored data
-                return await get_local_city_data(city_name, country)
+        # The cached snapshot, if any, is superseded by the new update,
+        # and a miss recorded before, if any, was cleared with it
+        invalidate_city_cache(city_name, country)
+        _city_misses.invalidate(normalize_city_key(city_name, country))
+
+        # Return the newly scraped and stored data, after the connection
+        # has gone back to the pool. It is read from the database, as the
+        # memory-mapped snapshot predates it; once cached, it is also what
+        # later lookups get until the next snapshot is published.
+        city_data = await get_local_city_data(city_name, country, use_snapshot=False)
+        if city_data is not None:
+            update_cost_index(city_data)
+        return city_data
 
     except Exception as e:
-        logger.error(f"Error fetching and storing Numbeo data: {e}", exc_info=True)
+        logger.error("Error fetching and storing Numbeo data: %s", e, exc_info=True)
         return None
+
+async def store_numbeo_batch(
+    batch: List[Tuple[str, str, CostData]]
+) -> List[Tuple[str, str]]:
+    """
+    Store already scraped snapshots for several cities in one transaction.
+    Each city is written under its own savepoint, so one bad row does not
+    discard the rest of the batch. Returns the (city, country) pairs stored.
+    """
+    stored = []
+    async with get_numbeo_db_connection() as conn:
+        async with conn.transaction(), conn.cursor() as cur:
+            for city_name, country, scraped_data in batch:
+                try:
+                    # Nested transaction blocks are savepoints
+                    async with conn.transaction():
+                        await _store_scraped_data(cur, city_name, country, scraped_data)
+                    stored.append((city_name, country))
+                except Exception as e:
+                    logger.error("Error storing Numbeo data for %s, %s: %s", city_name, country, e)
+
+    for city_name, country in stored:
+        invalidate_city_cache(city_name, country)
+    return stored
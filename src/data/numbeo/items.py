@@ -0,0 +1,121 @@
+# src/data/numbeo/items.py
+"""
+Numbeo cost-of-living items and where they are stored.
+
+Every category maps to one numbeo_col.*_cost_sets table. Items are listed
+in table column order together with the label Numbeo shows for them, so
+scraped rows can be matched to columns by label instead of by position.
+"""
+from typing import Dict, List, Optional, Tuple
+
+# category -> (table, [(column, Numbeo label), ...])
+COST_CATEGORIES: Dict[str, Tuple[str, List[Tuple[str, str]]]] = {
+    'restaurant': ('restaurant_cost_sets', [
+        ('cheap_meal_for_one', 'Meal, Inexpensive Restaurant'),
+        ('meal_for_two', 'Meal for 2 People, Mid-range Restaurant, Three-course'),
+        ('mcdonalds_meal', 'McMeal at McDonalds (or Equivalent Combo Meal)'),
+        ('domestic_beer', 'Domestic Beer (0.5 liter draught)'),
+        ('imported_beer', 'Imported Beer (0.33 liter bottle)'),
+        ('cappuccino', 'Cappuccino (regular)'),
+        ('coke_or_pepsi', 'Coke/Pepsi (0.33 liter bottle)'),
+        ('water', 'Water (0.33 liter bottle)'),
+    ]),
+    'market': ('market_cost_sets', [
+        ('milk_one_liter', 'Milk (regular), (1 liter)'),
+        ('bread_loaf', 'Loaf of Fresh White Bread (500g)'),
+        ('white_rice_one_kg', 'Rice (white), (1kg)'),
+        ('dozen_eggs', 'Eggs (regular) (12)'),
+        ('cheese_one_kg', 'Local Cheese (1kg)'),
+        ('chicken_breast_one_kg', 'Chicken Fillets (1kg)'),
+        ('beef_round_one_kg', 'Beef Round (1kg) (or Equivalent Back Leg Red Meat)'),
+        ('apples_one_kg', 'Apples (1kg)'),
+        ('bananas_one_kg', 'Banana (1kg)'),
+        ('oranges_one_kg', 'Oranges (1kg)'),
+        ('tomatoes_one_kg', 'Tomato (1kg)'),
+        ('potatoes_one_kg', 'Potato (1kg)'),
+        ('onions_one_kg', 'Onion (1kg)'),
+        ('lettuce_head', 'Lettuce (1 head)'),
+        ('water_one_and_half_liter', 'Water (1.5 liter bottle)'),
+        ('wine_mid_range', 'Bottle of Wine (Mid-Range)'),
+        ('domestic_beer_half_liter', 'Domestic Beer (0.5 liter bottle)'),
+        ('imported_beer_third_liter', 'Imported Beer (0.33 liter bottle)'),
+        ('cigarettes_pack', 'Cigarettes 20 Pack (Marlboro)'),
+    ]),
+    'transportation': ('transportation_cost_sets', [
+        ('local_transit_one_way', 'One-way Ticket (Local Transport)'),
+        ('monthly_transit_pass', 'Monthly Pass (Regular Price)'),
+        ('taxi_base_fare', 'Taxi Start (Normal Tariff)'),
+        ('taxi_one_km', 'Taxi 1km (Normal Tariff)'),
+        ('taxi_one_hr', 'Taxi 1hour Waiting (Normal Tariff)'),
+        ('gasoline_one_liter', 'Gasoline (1 liter)'),
+        ('volkswagen_golf', 'Volkswagen Golf 1.4 90 KW Trendline (Or Equivalent New Car)'),
+        ('toyota_corolla', 'Toyota Corolla Sedan 1.6l 97kW Comfort (Or Equivalent New Car)'),
+    ]),
+    'utilities': ('utilities_cost_sets', [
+        ('all_basic', 'Basic (Electricity, Heating, Cooling, Water, Garbage) for 85m2 Apartment'),
+        ('prepaid_mobile_one_min', '1 min. of Prepaid Mobile Tariff Local (No Discounts or Plans)'),
+        ('internet_sixty_mbps', 'Internet (60 Mbps or More, Unlimited Data, Cable/ADSL)'),
+    ]),
+    'leisure': ('leisure_cost_sets', [
+        ('fit_club_one_month', 'Fitness Club, Monthly Fee for 1 Adult'),
+        ('tennis_court_one_hr', 'Tennis Court Rent (1 Hour on Weekend)'),
+        ('cinema_ticket_one_seat', 'Cinema, International Release, 1 Seat'),
+    ]),
+    'clothing': ('clothing_cost_sets', [
+        ('pair_of_jeans', '1 Pair of Jeans (Levis 501 Or Similar)'),
+        ('summer_dress', '1 Summer Dress in a Chain Store (Zara, H&M, ...)'),
+        ('nike_running_shoes', '1 Pair of Nike Running Shoes (Mid-Range)'),
+        ('leather_business_shoes', '1 Pair of Men Leather Business Shoes'),
+    ]),
+    'rent': ('rent_cost_sets', [
+        ('apt_one_bdrm_ctr', 'Apartment (1 bedroom) in City Centre'),
+        ('apt_one_bdrm_out', 'Apartment (1 bedroom) Outside of Centre'),
+        ('apt_three_bdrm_ctr', 'Apartment (3 bedrooms) in City Centre'),
+        ('apt_three_bdrm_out', 'Apartment (3 bedrooms) Outside of Centre'),
+    ]),
+}
+
+# Numbeo section headings of the cost table -> category
+SECTION_CATEGORIES: Dict[str, str] = {
+    'Restaurants': 'restaurant',
+    'Markets': 'market',
+    'Transportation': 'transportation',
+    'Utilities (Monthly)': 'utilities',
+    'Sports And Leisure': 'leisure',
+    'Clothing And Shoes': 'clothing',
+    'Rent Per Month': 'rent',
+}
+
+# Other spellings Numbeo has used for the same item. Only the same item:
+# the monthly mobile plan that replaced the per-minute prepaid tariff is
+# priced differently, so it is not stored as prepaid_mobile_one_min.
+LABEL_ALIASES: Dict[Tuple[str, str], str] = {
+    ('transportation', 'Monthly Pass (Regular Price) (Local Transport)'): 'monthly_transit_pass',
+}
+
+def normalize_label(label: str) -> str:
+    """Normalize an item label or section heading for matching"""
+    return ' '.join(label.split()).casefold()
+
+def category_columns(category: str) -> List[str]:
+    """Column names of a category, in table order"""
+    return [column for column, _ in COST_CATEGORIES[category][1]]
+
+# (category, normalized label) -> column
+LABEL_COLUMNS: Dict[Tuple[str, str], str] = {
+    (category, normalize_label(label)): column
+    for category, (_, items) in COST_CATEGORIES.items()
+    for column, label in items
+}
+LABEL_COLUMNS.update({
+    (category, normalize_label(label)): column
+    for (category, label), column in LABEL_ALIASES.items()
+})
+
+# normalized section heading -> category
+SECTION_LOOKUP: Dict[str, str] = {
+    normalize_label(section): category for section, category in SECTION_CATEGORIES.items()
+}
+
+# Scraped costs: category -> column -> price in USD
+CostData = Dict[str, Dict[str, Optional[float]]]
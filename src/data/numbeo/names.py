@@ -0,0 +1,219 @@
+# src/data/numbeo/names.py
+"""
+In-memory index of the names of known cities and countries, for
+correcting typos and completing what a user has started typing.
+
+Names are normalized (case, accents and punctuation dropped) and split
+into trigrams, with each trigram pointing at the names that contain it.
+A fuzzy lookup counts, per name, the trigrams it shares with the query
+(one bincount over the posting lists of the query's trigrams) and scores
+names by their Dice coefficient, so "berln" finds "berlin" without
+comparing the query with every name. Prefix lookups bisect a
+sorted list of the names.
+
+The known cities are those in the cost index, so the index follows it:
+it is rebuilt when a new cost index is built and extended when cities
+are added to it.
+"""
+import asyncio
+import bisect
+import logging
+import re
+import unicodedata
+from array import array
+from collections import defaultdict
+from typing import Dict, Generic, Hashable, List, Optional, Set, Tuple, TypeVar
+
+import numpy as np
+
+from src.data.numbeo.analysis import CostIndex, get_cost_index
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T', bound=Hashable)
+
+# Lowest Dice coefficient of a suggestion
+MIN_SCORE = 0.4
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+def normalize_name(text: str) -> str:
+    """Lower case ASCII letters and digits separated by single spaces"""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    ascii_only = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(' ', ascii_only).strip()
+
+def trigrams(name: str) -> Set[str]:
+    """Trigrams of a normalized name, padded so its start and end weigh more"""
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NameIndex(Generic[T]):
+    """Exact, prefix and fuzzy lookups of entries by name"""
+
+    def __init__(self):
+        # Distinct normalized names; entries are found through them
+        self._names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._entries: List[List[T]] = []
+        # Trigram counts of the names, and the names containing each trigram,
+        # as int32 arrays that numpy reads without copying
+        self._sizes = array('i')
+        self._postings: Dict[str, array] = defaultdict(lambda: array('i'))
+        # Sorted for prefix lookups when next needed
+        self._sorted: List[str] = []
+        self._unsorted = False
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str, entry: T) -> None:
+        normalized = normalize_name(name)
+        if not normalized:
+            return
+        name_id = self._ids.get(normalized)
+        if name_id is None:
+            name_id = len(self._names)
+            self._ids[normalized] = name_id
+            self._names.append(normalized)
+            self._entries.append([])
+            grams = trigrams(normalized)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(name_id)
+            self._sorted.append(normalized)
+            self._unsorted = True
+        if entry not in self._entries[name_id]:
+            self._entries[name_id].append(entry)
+
+    def exact(self, text: str) -> List[T]:
+        """Entries whose name is text, once normalized"""
+        name_id = self._ids.get(normalize_name(text))
+        return [] if name_id is None else list(self._entries[name_id])
+
+    def prefix(self, text: str, limit: int) -> List[T]:
+        """Entries whose name starts with text, shortest names first"""
+        normalized = normalize_name(text)
+        if not normalized:
+            return []
+        if self._unsorted:
+            self._sorted.sort()
+            self._unsorted = False
+        start = bisect.bisect_left(self._sorted, normalized)
+        names = []
+        # A bounded scan, as common prefixes match many names
+        for name in self._sorted[start:start + limit * 4]:
+            if not name.startswith(normalized):
+                break
+            names.append(name)
+        names.sort(key=len)
+        return self._collect(names, limit)
+
+    def search(self, text: str, limit: int,
+               min_score: float = MIN_SCORE) -> List[Tuple[T, float]]:
+        """Entries whose names are most alike text, by Dice coefficient of their trigrams"""
+        normalized = normalize_name(text)
+        if not normalized:
+            return []
+        grams = trigrams(normalized)
+        postings = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not postings or limit <= 0:
+            return []
+        # Trigrams shared with the query, per name
+        shared = np.bincount(
+            np.concatenate([np.frombuffer(posting, dtype=np.int32) for posting in postings]),
+            minlength=len(self._names)
+        )
+        scores = 2 * shared / (len(grams) + np.frombuffer(self._sizes, dtype=np.int32))
+        candidates = np.flatnonzero(scores >= min_score)
+        if len(candidates) > limit:
+            # The best limit names, and any tied with the last of them
+            cutoff = -np.partition(-scores[candidates], limit - 1)[limit - 1]
+            candidates = candidates[scores[candidates] >= cutoff]
+        best = sorted(((float(scores[name_id]), name_id) for name_id in candidates.tolist()),
+                      key=lambda item: (-item[0], self._names[item[1]]))
+        results: List[Tuple[T, float]] = []
+        for score, name_id in best:
+            for entry in self._entries[name_id]:
+                results.append((entry, score))
+                if len(results) == limit:
+                    return results
+        return results
+
+    def complete(self, text: str, limit: int) -> List[T]:
+        """Entries whose names start with text, then those alike it"""
+        found = self.prefix(text, limit)
+        if len(found) < limit:
+            for entry, _ in self.search(text, limit):
+                if entry not in found:
+                    found.append(entry)
+                    if len(found) == limit:
+                        break
+        return found
+
+    def _collect(self, names: List[str], limit: int) -> List[T]:
+        entries: List[T] = []
+        for name in names:
+            for entry in self._entries[self._ids[name]]:
+                entries.append(entry)
+                if len(entries) == limit:
+                    return entries
+        return entries
+
+class CityNames:
+    """Names of the known cities, each entry its (city, country), and of their countries"""
+
+    def __init__(self, cities: List[Tuple[str, str]] = ()):
+        self.cities: NameIndex[Tuple[str, str]] = NameIndex()
+        self.countries: NameIndex[str] = NameIndex()
+        self.count = 0
+        self.extend(cities)
+
+    def extend(self, cities: List[Tuple[str, str]]) -> None:
+        for city, country in cities:
+            self.cities.add(city, (city, country))
+            self.countries.add(country, country)
+            self.count += 1
+
+    def is_known_city(self, city: str) -> bool:
+        return bool(self.cities.exact(city))
+
+    def is_known_country(self, country: str) -> bool:
+        return bool(self.countries.exact(country))
+
+    def known_pair(self, text: str) -> Optional[Tuple[str, str]]:
+        """The known (city, country) text names as "city, country", if any"""
+        city, separator, country = text.rpartition(',')
+        if not separator:
+            return None
+        wanted = normalize_name(country)
+        for entry in self.cities.exact(city):
+            if normalize_name(entry[1]) == wanted:
+                return entry
+        return None
+
+    def suggest_cities(self, text: str, limit: int) -> List[Tuple[str, str]]:
+        return [entry for entry, _ in self.cities.search(text, limit)]
+
+    def suggest_countries(self, text: str, limit: int) -> List[str]:
+        return [entry for entry, _ in self.countries.search(text, limit)]
+
+# The index in use and the cost index it follows
+_city_names: Optional[CityNames] = None
+_source: Optional[CostIndex] = None
+
+async def get_city_names() -> Optional[CityNames]:
+    """The names of the known cities, None if they cannot be read"""
+    global _city_names, _source
+    cost_index = await get_cost_index()
+    if cost_index is None:
+        return _city_names
+    if _city_names is None or _source is not cost_index:
+        # Indexing thousands of names takes a while, keep it off the event loop
+        city_names = await asyncio.to_thread(CityNames, list(cost_index.names))
+        _city_names, _source = city_names, cost_index
+        logger.info("Indexed the names of %s cities", len(cost_index))
+    elif len(cost_index) > _city_names.count:
+        # The cost index only ever appends cities
+        _city_names.extend(cost_index.names[_city_names.count:])
+    return _city_names
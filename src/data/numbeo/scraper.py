@@ -1,14 +1,88 @@
 # src/data/numbeo/scraper.py
-from bs4 import BeautifulSoup
-import requests
+import aiohttp
+import asyncio
+import lxml.html
 import unicodedata
 import logging
-import time
+import os
 import random
-from typing import Dict, List, Optional, Union
+import time
+from typing import FrozenSet, Optional, Tuple
+from src.data.numbeo.items import (
+    COST_CATEGORIES,
+    LABEL_COLUMNS,
+    SECTION_LOOKUP,
+    CostData,
+    normalize_label
+)
+from src.utils.metrics import counter, gauge, histogram
 
 logger = logging.getLogger(__name__)
 
+# Scraper configuration
+SCRAPER_CONFIG = {
+    'base_url': os.getenv('NUMBEO_BASE_URL', 'https://www.numbeo.com'),
+    # Seconds allowed to establish a connection and to wait for each read
+    'connect_timeout': float(os.getenv('SCRAPER_CONNECT_TIMEOUT', '5')),
+    'read_timeout': float(os.getenv('SCRAPER_READ_TIMEOUT', '15')),
+    # Maximum number of open keep-alive connections to Numbeo
+    'pool_size': int(os.getenv('SCRAPER_POOL_SIZE', '4')),
+    # Random politeness delay before each request, in seconds
+    'min_delay': float(os.getenv('SCRAPER_MIN_DELAY', '1')),
+    'max_delay': float(os.getenv('SCRAPER_MAX_DELAY', '3')),
+}
+
+SCRAPE_SECONDS = histogram(
+    'shakespr_scrape_seconds',
+    'Time spent on the Numbeo page request and on parsing it',
+    labels=('phase',)
+)
+SCRAPES = counter(
+    'shakespr_scrapes_total',
+    'Numbeo scrapes by outcome',
+    labels=('outcome',)
+)
+SCRAPES_IN_PROGRESS = gauge(
+    'shakespr_scrapes_in_progress',
+    'Numbeo scrapes currently running, politeness delay included'
+)
+
+# Outcomes meaning Numbeo has no costs for the city, as opposed to a
+# failure that may not happen again (timeouts, server errors)
+NOT_AVAILABLE: FrozenSet[str] = frozenset({'not_found', 'no_table', 'empty'})
+
+# Use headers to mimic browser request
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# Shared keep-alive session, created lazily inside the running event loop
+_session: Optional[aiohttp.ClientSession] = None
+
+def get_scraper_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it on first use"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            headers=HEADERS,
+            connector=aiohttp.TCPConnector(
+                limit=SCRAPER_CONFIG['pool_size'],
+                ttl_dns_cache=300
+            ),
+            timeout=aiohttp.ClientTimeout(
+                connect=SCRAPER_CONFIG['connect_timeout'],
+                sock_read=SCRAPER_CONFIG['read_timeout']
+            )
+        )
+    return _session
+
+async def close_scraper_session() -> None:
+    """Close the shared HTTP session"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
 def clean_cost_value(cost_text: str) -> Optional[float]:
     """Clean and convert cost text to float"""
     try:
@@ -16,80 +90,128 @@ def clean_cost_value(cost_text: str) -> Optional[float]:
         cost = cost.replace(',', '').strip(' $')
         return float(cost)
     except (ValueError, AttributeError) as e:
-        logger.error(f"Error cleaning cost value '{cost_text}': {str(e)}")
+        logger.error("Error cleaning cost value '%s': %s", cost_text, e)
         return None
 
-def extract_costs(rows: List[BeautifulSoup]) -> List[Optional[float]]:
-    """Extract costs from HTML rows"""
-    costs = []
-    for row in rows:
-        try:
-            cost_cell = row.find('td', {'class': 'priceValue'})
-            if cost_cell:
-                cost = clean_cost_value(cost_cell.text)
-                costs.append(cost)
-        except Exception as e:
-            logger.error(f"Error extracting cost: {str(e)}")
-            costs.append(None)
-    return costs
+# Class of the table holding every priced item on a city page
+COST_TABLE_CLASS = 'data_wide_table'
+
+def _cost_table_html(page_text: str) -> Optional[str]:
+    """Cut the cost table out of the page so only it has to be parsed"""
+    marker = page_text.find(COST_TABLE_CLASS)
+    if marker == -1:
+        return None
+    start = page_text.rfind('<table', 0, marker)
+    end = page_text.find('</table>', marker)
+    if start == -1 or end == -1:
+        return None
+    return page_text[start:end + len('</table>')]
+
+def parse_cost_table(page_text: str) -> Optional[CostData]:
+    """
+    Extract costs from a city page. Section headings select the category
+    and item labels select the column, so added, removed or reordered rows
+    do not shift values into the wrong columns.
+    """
+    table_html = _cost_table_html(page_text)
+    if table_html is None:
+        return None
+
+    table = lxml.html.fragment_fromstring(table_html)
+    data: CostData = {category: {} for category in COST_CATEGORIES}
+    category = None
+    for row in table.iter('tr'):
+        heading = row.find('th')
+        if heading is not None:
+            # Sections we do not store (childcare, salaries...) map to None
+            category = SECTION_LOOKUP.get(normalize_label(heading.text_content()))
+            continue
+        if category is None:
+            continue
+
+        cells = row.findall('td')
+        if not cells:
+            continue
+        label = normalize_label(cells[0].text_content())
+        column = LABEL_COLUMNS.get((category, label))
+        if column is None:
+            logger.debug("Skipping unknown %s item '%s'", category, label)
+            continue
+        price_cell = next((cell for cell in cells if 'priceValue' in cell.get('class', '')), None)
+        if price_cell is not None:
+            data[category][column] = clean_cost_value(price_cell.text_content())
+    return data
 
 # src/data/numbeo/scraper.py
-async def scrape_city_data(city_name: str) -> Optional[Dict[str, List[float]]]:
-    """Scrape cost data for a specific city"""
-    city_name = city_name.title().replace(' ', '-')
-    req_url = f'https://www.numbeo.com/cost-of-living/in/{city_name}?displayCurrency=USD'
+async def scrape_city_data(city_name: str, polite: bool = True) -> Optional[CostData]:
+    """
+    Scrape cost data for a specific city. Callers that pace requests
+    themselves can pass polite=False to skip the random delay.
+    """
+    return (await scrape_city(city_name, polite))[1]
+
+async def scrape_city(city_name: str, polite: bool = True) -> Tuple[str, Optional[CostData]]:
+    """
+    Scrape cost data for a specific city, along with the outcome: 'ok',
+    one of NOT_AVAILABLE if Numbeo has no costs for it, or the failure
+    """
+    city_name = '-'.join(city_name.title().split())
+    req_url = f"{SCRAPER_CONFIG['base_url']}/cost-of-living/in/{city_name}?displayCurrency=USD"
     
-    logger.info(f"Scraping data from: {req_url}")
+    logger.info("Scraping data from: %s", req_url)
     
+    with SCRAPES_IN_PROGRESS.track_in_progress():
+        outcome = await _scrape(city_name, req_url, polite)
+    SCRAPES.inc(outcome=outcome[0])
+    return outcome
+
+async def _scrape(city_name: str, req_url: str, polite: bool) -> Tuple[str, Optional[CostData]]:
+    """Scrape a page, returning the outcome for the metrics and the data"""
     try:
-        # Add random delay to avoid overwhelming the server
-        time.sleep(random.uniform(1, 3))
-        
-        # Use headers to mimic browser request
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
+        # Add random delay to avoid overwhelming the server, without
+        # holding up other updates on the event loop
+        if polite:
+            await asyncio.sleep(
+                random.uniform(SCRAPER_CONFIG['min_delay'], SCRAPER_CONFIG['max_delay'])
+            )
         
-        response = requests.get(req_url, headers=headers)
-        response.raise_for_status()
+        session = get_scraper_session()
+        with SCRAPE_SECONDS.time(phase='http'):
+            async with session.get(req_url) as response:
+                if response.status == 404:
+                    logger.warning("No Numbeo page for %s", city_name)
+                    return 'not_found', None
+                response.raise_for_status()
+                page_text = await response.text()
         
-        page_soup = BeautifulSoup(response.text, 'html.parser')
-        all_rows_html = page_soup.find_all('tr')
-
-        if not all_rows_html:
-            logger.error(f"No data rows found for {city_name}")
-            return None
-
-        # Extract data for each category
-        data = {
-            'restaurant': extract_costs(all_rows_html[2:10]),
-            'market': extract_costs(all_rows_html[11:30]),
-            'transportation': extract_costs(all_rows_html[31:39]),
-            'utilities': extract_costs(all_rows_html[40:43]),
-            'leisure': extract_costs(all_rows_html[44:47]),
-            'clothing': extract_costs(all_rows_html[51:55]),
-            'rent': extract_costs(all_rows_html[56:60])
-        }
+        with SCRAPE_SECONDS.time(phase='parse'):
+            data = parse_cost_table(page_text)
+        if data is None:
+            logger.error("No cost table found for %s", city_name)
+            return 'no_table', None
 
         # Log extracted data for debugging
-        logger.debug(f"Extracted data for {city_name}: {data}")
+        logger.debug("Extracted data for %s: %s", city_name, data)
 
         # Verify we have data
         if not any(data.values()):
-            logger.error(f"No costs found for {city_name}")
-            return None
+            logger.error("No costs found for %s", city_name)
+            return 'empty', None
 
         # Verify required fields
         required_fields = ['restaurant', 'market', 'transportation', 'utilities', 'rent']
         for field in required_fields:
             if not data.get(field):
-                logger.warning(f"Missing {field} data for {city_name}")
+                logger.warning("Missing %s data for %s", field, city_name)
 
-        return data
+        return 'ok', data
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request error for {city_name}: {str(e)}")
-        return None
+    except asyncio.TimeoutError:
+        logger.error("Request timed out for %s", city_name)
+        return 'timeout', None
+    except aiohttp.ClientError as e:
+        logger.error("Request error for %s: %s", city_name, e)
+        return 'http_error', None
     except Exception as e:
-        logger.error(f"Error scraping {city_name}: {str(e)}")
-        return None
+        logger.error("Error scraping %s: %s", city_name, e)
+        return 'error', None
@@ -0,0 +1,253 @@
+# src/data/numbeo/snapshot.py
+"""
+Columnar snapshot of the latest costs of every city, for reads that do
+not touch Postgres.
+
+The file holds a fixed header, a JSON index (item names and, per city,
+its identity and when it was scraped), and a float32 matrix with one row
+per city and one column per item, NULL costs stored as NaN:
+
+    magic, version, cities, items, index length   (little-endian)
+    JSON index, padded to a multiple of 64 bytes
+    float32[cities][items]
+
+Workers memory-map the file, so its pages are shared between processes
+and read lazily. A new snapshot is published by writing a temporary file
+next to the current one and renaming it over it; workers notice the new
+file within check_interval seconds and switch to it.
+"""
+import asyncio
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from psycopg.rows import dict_row
+from src.data.numbeo.items import COST_CATEGORIES, category_columns
+from src.utils.database import get_numbeo_db_connection
+from src.utils.metrics import callback_metric
+
+logger = logging.getLogger(__name__)
+
+# Snapshot configuration
+SNAPSHOT_CONFIG = {
+    # Snapshot file; empty to always read from the database
+    'path': os.getenv('CITY_SNAPSHOT_PATH', ''),
+    # Seconds between checks for a newly published file
+    'check_interval': float(os.getenv('CITY_SNAPSHOT_CHECK_INTERVAL', '30')),
+}
+
+MAGIC = b'SHKSNAP\x00'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<8sIIII')
+# Start of the matrix, so the float32 values are aligned
+_ALIGNMENT = 64
+
+# Every cost column, in table order
+ITEM_COLUMNS: List[str] = [
+    column for category in COST_CATEGORIES for column in category_columns(category)
+]
+
+# The latest snapshot of every city, from the denormalized table that
+# holds the newest row of all seven cost tables
+EXPORT_QUERY = """
+    SELECT c.city_id, c.city_name, c.country, c.region, l.*
+    FROM numbeo_col.city_latest_costs l
+    JOIN numbeo_col.cities c ON c.city_id = l.city_id
+    ORDER BY c.city_id
+"""
+
+def write_snapshot(path: str, rows: List[Dict[str, Any]]) -> int:
+    """
+    Write rows shaped like EXPORT_QUERY results as a snapshot file,
+    replacing the file at path atomically. Returns its size in bytes.
+    """
+    index = json.dumps({
+        'exported_at': datetime.now().isoformat(),
+        'items': ITEM_COLUMNS,
+        'cities': [
+            [row['city_id'], row['city_name'], row['country'], row['region'],
+             row['update_id'], row['last_updated'].isoformat()]
+            for row in rows
+        ],
+    }).encode()
+    header_size = _HEADER.size + len(index)
+    padding = b'\0' * (-header_size % _ALIGNMENT)
+    values = array('f', (
+        math.nan if row.get(column) is None else float(row[column])
+        for row in rows for column in ITEM_COLUMNS
+    ))
+    if values.itemsize != 4:
+        raise RuntimeError("float32 is not available as array type 'f'")
+
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temporary = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        with open(temporary, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(rows), len(ITEM_COLUMNS), len(index)))
+            f.write(index)
+            f.write(padding)
+            f.write(values.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        # Readers see either the old file or the new one, never a partial one
+        os.replace(temporary, target)
+    finally:
+        temporary.unlink(missing_ok=True)
+    return header_size + len(padding) + len(values) * 4
+
+async def export_snapshot(path: str = SNAPSHOT_CONFIG['path']) -> Optional[int]:
+    """Export the latest snapshot of every city to path; returns the number of cities"""
+    try:
+        async with get_numbeo_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(EXPORT_QUERY)
+                rows = await cur.fetchall()
+        # Writing and syncing the file blocks, keep it off the event loop
+        size = await asyncio.to_thread(write_snapshot, path, rows)
+        logger.info("Exported %s cities to %s (%s bytes)", len(rows), path, size)
+        return len(rows)
+    except Exception as e:
+        logger.error("Error exporting city snapshot: %s", e)
+        return None
+
+class CitySnapshot:
+    """A memory-mapped snapshot file, indexed by normalized city and country"""
+
+    def __init__(self, path: str):
+        # The fetcher imports this module, so its helper is imported late
+        from src.data.numbeo.fetcher import normalize_city_key
+
+        self.path = path
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        try:
+            magic, version, cities, items, index_length = _HEADER.unpack_from(self._mmap)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {FORMAT_VERSION} city snapshot")
+            start = _HEADER.size + index_length
+            start += -start % _ALIGNMENT
+            index = json.loads(self._mmap[_HEADER.size:_HEADER.size + index_length])
+            if start + cities * items * 4 > len(self._mmap):
+                raise ValueError(f"{path} is truncated")
+        except Exception:
+            self._mmap.close()
+            raise
+
+        self.items: List[str] = index['items']
+        self.exported_at = datetime.fromisoformat(index['exported_at'])
+        self._cities: List[list] = index['cities']
+        self._rows: Dict[Tuple[str, str], int] = {
+            normalize_city_key(city[1], city[2]): row for row, city in enumerate(self._cities)
+        }
+        self._width = items
+        # float32 view of the matrix, nothing is copied
+        self.values = memoryview(self._mmap)[start:start + cities * items * 4].cast('f')
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    def names(self) -> List[Tuple[str, str]]:
+        """(city, country) of every row, as scraped"""
+        return [(city[1], city[2]) for city in self._cities]
+
+    def row(self, key: Tuple[str, str]) -> Optional[int]:
+        """Matrix row of a normalized (city, country) key"""
+        return self._rows.get(key)
+
+    def city(self, row: int) -> Dict[str, Any]:
+        """A row as the dict the latest-snapshot query returns"""
+        city_id, city_name, country, region, update_id, last_updated = self._cities[row]
+        data: Dict[str, Any] = {
+            'city_name': city_name,
+            'country': country,
+            'region': region,
+            'city_id': city_id,
+            'update_id': update_id,
+            'last_updated': datetime.fromisoformat(last_updated),
+        }
+        offset = row * self._width
+        # Costs have two decimals, so rounding to whole cents undoes the
+        # float32 rounding (up to 131072, beyond which float32 cannot tell
+        # cents apart). NaN, the only value unequal to itself, is NULL.
+        data.update(zip(self.items, [
+            round(value * 100) / 100 if value == value else None
+            for value in self.values[offset:offset + self._width].tolist()
+        ]))
+        data['utilities_basic'] = data.get('all_basic')
+        data['rent_1br_center'] = data.get('apt_one_bdrm_ctr')
+        return data
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        row = self._rows.get(key)
+        return None if row is None else self.city(row)
+
+    def close(self) -> None:
+        self.values.release()
+        self._mmap.close()
+
+# The snapshot in use, and when the file was last checked for a new one
+_snapshot: Optional[CitySnapshot] = None
+_last_check = 0.0
+
+def _file_identity(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def load_city_snapshot(path: str = SNAPSHOT_CONFIG['path']) -> bool:
+    """
+    Map the snapshot at path, replacing the one in use if the file is a
+    newly published one. Returns whether a new snapshot was loaded.
+    """
+    global _snapshot, _last_check
+    _last_check = time.monotonic()
+    identity = _file_identity(path)
+    if identity is None or (_snapshot is not None and _snapshot.identity == identity):
+        return False
+    try:
+        start = time.perf_counter()
+        snapshot = CitySnapshot(path)
+    except Exception as e:
+        logger.error("Error loading city snapshot %s: %s", path, e)
+        return False
+    previous, _snapshot = _snapshot, snapshot
+    logger.info(
+        "Loaded city snapshot of %s cities exported at %s in %.1f ms",
+        len(snapshot), snapshot.exported_at, (time.perf_counter() - start) * 1000
+    )
+    if previous is not None:
+        # Lookups never hold on to the views, so nothing still uses it
+        previous.close()
+    return True
+
+def get_city_snapshot() -> Optional[CitySnapshot]:
+    """The snapshot in use, after checking for a new file if it is time to"""
+    if SNAPSHOT_CONFIG['path'] and (
+        time.monotonic() - _last_check >= SNAPSHOT_CONFIG['check_interval']
+    ):
+        load_city_snapshot(SNAPSHOT_CONFIG['path'])
+    return _snapshot
+
+def close_city_snapshot() -> None:
+    """Unmap the snapshot in use"""
+    global _snapshot
+    if _snapshot is not None:
+        _snapshot.close()
+        _snapshot = None
+
+callback_metric(
+    'shakespr_city_snapshot_cities', 'Cities in the memory-mapped snapshot in use',
+    'gauge', lambda: len(_snapshot) if _snapshot is not None else 0
+)
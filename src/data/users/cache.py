@@ -0,0 +1,48 @@
+# src/data/users/cache.py
+import os
+from typing import Any, Dict, Optional
+from ...utils.cache import TTLCache
+
+# Stored for users known to have no profile, so that looking them up again
+# does not query the database; never handed out to callers
+NO_PROFILE: Dict[str, Any] = {}
+
+# Recently read profiles by user id. Writes invalidate their entry, the TTL
+# bounds how long a change made by another process can go unnoticed.
+_profile_cache: TTLCache[Dict[str, Any]] = TTLCache(
+    'user_profiles',
+    max_size=int(os.getenv('PROFILE_CACHE_SIZE', '10000')),
+    default_ttl=float(os.getenv('PROFILE_CACHE_TTL', '600'))
+)
+
+# Bumped by every profile write, so that a database read overlapping a
+# write does not cache the row as it was before
+_generation = 0
+
+def get_cached_profile(user_id: int) -> Optional[Dict[str, Any]]:
+    """Return the cached profile, NO_PROFILE, or None on a miss"""
+    return _profile_cache.get(user_id)
+
+def profile_generation() -> int:
+    """Current write generation, to pass to cache_profile after a read"""
+    return _generation
+
+def cache_profile(user_id: int, profile: Optional[Dict[str, Any]],
+                  generation: Optional[int] = None) -> None:
+    """
+    Cache a profile, or the absence of one, unless a profile was written
+    since generation was taken
+    """
+    if generation is not None and generation != _generation:
+        return
+    _profile_cache.set(user_id, NO_PROFILE if profile is None else profile)
+
+def invalidate_profile(user_id: int) -> None:
+    """Drop the cached profile of a user after it was written"""
+    global _generation
+    _generation += 1
+    _profile_cache.invalidate(user_id)
+
+def get_profile_cache_stats() -> Dict[str, Any]:
+    """Return hit/miss/eviction statistics of the profile cache"""
+    return _profile_cache.stats()
@@ -1,26 +1,76 @@
 # src/data/users/crud.py
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import Optional, Dict, Any
+from psycopg.rows import dict_row
+from typing import Optional, Dict, Any, List, Tuple
 import logging
 from ...utils.database import get_user_db_connection
+from ...utils.metrics import histogram, timed
+from .cache import (
+    NO_PROFILE,
+    cache_profile,
+    get_cached_profile,
+    invalidate_profile,
+    profile_generation
+)
+from .writer import get_user_writer
 
 logger = logging.getLogger(__name__)
 
-async def get_user_profile(user_id: int) -> Optional[Dict[str, Any]]:
-    """Get user profile from database"""
+USER_CRUD_SECONDS = histogram(
+    'shakespr_user_crud_seconds',
+    'Latency of user data operations, cache hits included',
+    labels=('operation',)
+)
+
+# Most simulated destinations over the last N months, the current one
+# included, summed from the rollup's rows per destination and month
+POPULAR_DESTINATIONS_QUERY = """
+    SELECT target_city, SUM(simulations)::bigint AS simulations
+    FROM bot.destination_popularity
+    WHERE month >= (
+        date_trunc('month', CURRENT_DATE) - make_interval(months => %s - 1)
+    )::date
+    GROUP BY target_city
+    ORDER BY simulations DESC, target_city
+    LIMIT %s
+"""
+
+@timed(USER_CRUD_SECONDS, operation='get_user_profile')
+async def get_user_profile(
+    user_id: int,
+    user_data: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Get user profile: an update still waiting to be written, then the
+    profile cache, then the copy the bot keeps in the user's user_data,
+    and only then the database
+    """
+    pending = get_user_writer().pending_profile(user_id)
+    if pending is not None:
+        return pending
+    cached = get_cached_profile(user_id)
+    if cached is not None:
+        return None if cached is NO_PROFILE else cached
+    if user_data is not None:
+        profile = user_data.get('profile')
+        if profile is not None and profile.get('user_id') == user_id:
+            cache_profile(user_id, profile)
+            return profile
+    generation = profile_generation()
     try:
-        with get_user_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
+        async with get_user_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute("""
                     SELECT * FROM bot.user_profiles 
                     WHERE user_id = %s
-                """, (user_id,))
-                return cur.fetchone()
+                """, (user_id,), prepare=True)
+                profile = await cur.fetchone()
+                cache_profile(user_id, profile, generation)
+                return profile
     except Exception as e:
-        logger.error(f"Error fetching user profile: {e}")
+        logger.error("Error fetching user profile: %s", e)
         return None
 
+@timed(USER_CRUD_SECONDS, operation='update_user_profile')
 async def update_user_profile(
     user_id: int,
     first_name: str,
@@ -32,11 +82,11 @@ async def update_user_profile(
     monthly_income: Optional[float] = None,
     currency: str = 'USD'
 ) -> bool:
-    """Update or create user profile"""
+    """Update or create user profile; a None occupation or income keeps the stored one"""
     try:
-        with get_user_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
+        async with get_user_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
                     INSERT INTO bot.user_profiles (
                         user_id, username, first_name, last_name,
                         current_city, current_country, current_occupation,
@@ -48,20 +98,27 @@ async def update_user_profile(
                         last_name = EXCLUDED.last_name,
                         current_city = EXCLUDED.current_city,
                         current_country = EXCLUDED.current_country,
-                        current_occupation = EXCLUDED.current_occupation,
-                        monthly_income = EXCLUDED.monthly_income,
-                        currency = EXCLUDED.currency
+                        current_occupation = COALESCE(
+                            EXCLUDED.current_occupation, bot.user_profiles.current_occupation
+                        ),
+                        monthly_income = COALESCE(
+                            EXCLUDED.monthly_income, bot.user_profiles.monthly_income
+                        ),
+                        currency = CASE WHEN EXCLUDED.monthly_income IS NULL
+                            THEN bot.user_profiles.currency ELSE EXCLUDED.currency END
                 """, (
                     user_id, username, first_name, last_name,
                     current_city, current_country, current_occupation,
                     monthly_income, currency
                 ))
-                conn.commit()
+                await conn.commit()
+                invalidate_profile(user_id)
                 return True
     except Exception as e:
-        logger.error(f"Error updating user profile: {e}")
+        logger.error("Error updating user profile: %s", e)
         return False
 
+@timed(USER_CRUD_SECONDS, operation='record_simulation')
 async def record_simulation(
     user_id: int,
     simulation_type: str,
@@ -72,9 +129,9 @@ async def record_simulation(
 ) -> bool:
     """Record a simulation in history"""
     try:
-        with get_user_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
+        async with get_user_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
                     INSERT INTO bot.simulations (
                         user_id, simulation_type, source_city,
                         target_city, source_occupation, target_occupation
@@ -83,24 +140,85 @@ async def record_simulation(
                     user_id, simulation_type, source_city,
                     target_city, source_occupation, target_occupation
                 ))
-                conn.commit()
+                await conn.commit()
                 return True
     except Exception as e:
-        logger.error(f"Error recording simulation: {e}")
+        logger.error("Error recording simulation: %s", e)
         return False
 
+@timed(USER_CRUD_SECONDS, operation='get_user_simulations')
 async def get_user_simulations(user_id: int, limit: int = 5) -> list:
     """Get user's recent simulations"""
     try:
-        with get_user_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
+        async with get_user_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute("""
                     SELECT * FROM bot.simulations 
                     WHERE user_id = %s 
                     ORDER BY simulated_at DESC 
                     LIMIT %s
                 """, (user_id, limit))
-                return cur.fetchall()
+                return await cur.fetchall()
+    except Exception as e:
+        logger.error("Error fetching user simulations: %s", e)
+        return []
+
+@timed(USER_CRUD_SECONDS, operation='get_popular_destinations')
+async def get_popular_destinations(limit: int = 10, months: int = 3) -> List[Dict[str, Any]]:
+    """
+    Most simulated destinations of the current and previous months, read
+    from the destination_popularity rollup rather than the history itself
+    """
+    try:
+        async with get_user_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(POPULAR_DESTINATIONS_QUERY, (months, limit))
+                return await cur.fetchall()
     except Exception as e:
-        logger.error(f"Error fetching user simulations: {e}")
+        logger.error("Error fetching popular destinations: %s", e)
         return []
+
+@timed(USER_CRUD_SECONDS, operation='refresh_destination_popularity')
+async def refresh_destination_popularity() -> Optional[int]:
+    """Count the simulations recorded since the last refresh in the rollup"""
+    try:
+        async with get_user_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT bot.refresh_destination_popularity()")
+                counted = (await cur.fetchone())[0]
+                await conn.commit()
+                return counted
+    except Exception as e:
+        logger.error("Error refreshing destination popularity: %s", e)
+        return None
+
+@timed(USER_CRUD_SECONDS, operation='maintain_simulation_partitions')
+async def maintain_simulation_partitions(
+    months_ahead: int,
+    retention_months: int
+) -> Optional[Tuple[int, int]]:
+    """
+    Create the monthly simulation partitions up to months_ahead months from
+    now and, unless retention_months is 0, drop those older than that.
+    Returns the number of partitions created and dropped.
+    """
+    try:
+        async with get_user_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT bot.create_simulation_partitions(CURRENT_DATE, %s)",
+                    (months_ahead + 1,)
+                )
+                created = (await cur.fetchone())[0]
+                dropped = 0
+                if retention_months > 0:
+                    await cur.execute(
+                        "SELECT bot.drop_simulation_partitions(%s)",
+                        (retention_months,)
+                    )
+                    dropped = (await cur.fetchone())[0]
+                await conn.commit()
+                return created, dropped
+    except Exception as e:
+        logger.error("Error maintaining simulation partitions: %s", e)
+        return None
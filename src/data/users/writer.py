@@ -0,0 +1,336 @@
+# src/data/users/writer.py
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import psycopg
+from ...utils.database import get_user_db_connection
+from ...utils.metrics import callback_metric
+from .cache import invalidate_profile
+
+logger = logging.getLogger(__name__)
+
+# Write-behind configuration
+USER_WRITE_CONFIG = {
+    # Pending rows that trigger a flush before the interval is up
+    'batch_size': int(os.getenv('USER_WRITE_BATCH_SIZE', '500')),
+    # Seconds between two flushes
+    'flush_interval': float(os.getenv('USER_WRITE_FLUSH_INTERVAL', '2')),
+    # Profiles, and simulations, kept for retry while the database is unavailable
+    'max_pending': int(os.getenv('USER_WRITE_MAX_PENDING', '10000')),
+    # Failed batch writes before rows are written one by one, so a row
+    # the database rejects is dropped instead of holding up the others
+    'max_attempts': int(os.getenv('USER_WRITE_MAX_ATTEMPTS', '3')),
+}
+
+PROFILE_COLUMNS = (
+    'user_id', 'username', 'first_name', 'last_name',
+    'current_city', 'current_country', 'current_occupation',
+    'monthly_income', 'currency'
+)
+
+# One multi-row upsert; the arrays hold one element per profile. A NULL
+# occupation or income keeps the stored one, so a caller that could not read
+# the profile first does not wipe them; the currency goes with the income.
+UPSERT_PROFILES = """
+    INSERT INTO bot.user_profiles (
+        user_id, username, first_name, last_name,
+        current_city, current_country, current_occupation,
+        monthly_income, currency
+    )
+    SELECT * FROM unnest(
+        %s::bigint[], %s::text[], %s::text[], %s::text[],
+        %s::text[], %s::text[], %s::text[],
+        %s::numeric[], %s::text[]
+    )
+    ON CONFLICT (user_id) DO UPDATE SET
+        username = EXCLUDED.username,
+        first_name = EXCLUDED.first_name,
+        last_name = EXCLUDED.last_name,
+        current_city = EXCLUDED.current_city,
+        current_country = EXCLUDED.current_country,
+        current_occupation = COALESCE(
+            EXCLUDED.current_occupation, bot.user_profiles.current_occupation
+        ),
+        monthly_income = COALESCE(EXCLUDED.monthly_income, bot.user_profiles.monthly_income),
+        currency = CASE WHEN EXCLUDED.monthly_income IS NULL
+            THEN bot.user_profiles.currency ELSE EXCLUDED.currency END
+"""
+
+# One multi-row insert. Simulations of users without a stored profile
+# would violate the foreign key, so they are skipped instead of failing
+# the whole batch.
+INSERT_SIMULATIONS = """
+    INSERT INTO bot.simulations (
+        user_id, simulation_type, source_city, target_city,
+        source_occupation, target_occupation, simulated_at
+    )
+    SELECT s.*
+    FROM unnest(
+        %s::bigint[], %s::text[], %s::text[], %s::text[],
+        %s::text[], %s::text[], %s::timestamp[]
+    ) AS s(user_id, simulation_type, source_city, target_city,
+           source_occupation, target_occupation, simulated_at)
+    WHERE EXISTS (
+        SELECT 1 FROM bot.user_profiles p WHERE p.user_id = s.user_id
+    )
+"""
+
+def _columns(rows: List[Tuple]) -> List[List[Any]]:
+    """Turn rows into one list per column, for unnest()"""
+    return [list(column) for column in zip(*rows)]
+
+class UserDataWriter:
+    """
+    Write-behind buffer for profile upserts and simulation records.
+
+    Callers queue rows without waiting for the database. Pending rows are
+    written in one transaction whenever batch_size rows are waiting or
+    flush_interval seconds have passed: profiles first (only the latest
+    upsert per user), so the simulations referencing them can follow.
+
+    A failed batch is retried with the next flush. After max_attempts
+    failures in a row, rows are written one by one, each under its own
+    savepoint, and those the database rejects are logged and dropped.
+    """
+
+    def __init__(self, batch_size: int = USER_WRITE_CONFIG['batch_size'],
+                 flush_interval: float = USER_WRITE_CONFIG['flush_interval'],
+                 max_pending: int = USER_WRITE_CONFIG['max_pending'],
+                 max_attempts: int = USER_WRITE_CONFIG['max_attempts']):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        # Batch writes that failed since the last successful flush
+        self._failures = 0
+        self._profiles: Dict[int, Tuple] = {}
+        # Profiles taken by the flush in progress, still served to readers
+        # until they are committed or put back
+        self._inflight: Dict[int, Tuple] = {}
+        self._simulations: List[Tuple] = []
+        self._batch_ready = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.flushes = 0
+        self.profiles_written = 0
+        self.simulations_written = 0
+        self.simulations_dropped = 0
+        self.profiles_dropped = 0
+        self.profiles_rejected = 0
+        self.simulations_rejected = 0
+
+    def pending(self) -> int:
+        return len(self._profiles) + len(self._simulations)
+
+    def stats(self) -> Dict[str, int]:
+        """Return write-behind counters"""
+        return {
+            'pending': self.pending(),
+            'flushes': self.flushes,
+            'profiles_written': self.profiles_written,
+            'simulations_written': self.simulations_written,
+            'simulations_dropped': self.simulations_dropped,
+            'profiles_dropped': self.profiles_dropped,
+            'profiles_rejected': self.profiles_rejected,
+            'simulations_rejected': self.simulations_rejected,
+        }
+
+    def pending_profile(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """The queued, or being written, profile of a user, if any"""
+        row = self._profiles.get(user_id)
+        if row is None:
+            row = self._inflight.get(user_id)
+        return dict(zip(PROFILE_COLUMNS, row)) if row is not None else None
+
+    def _queued(self) -> None:
+        if self.pending() >= self.batch_size:
+            self._batch_ready.set()
+
+    def queue_profile(self, user_id: int, first_name: str, last_name: Optional[str],
+                      username: Optional[str], current_city: str, current_country: str,
+                      current_occupation: Optional[str] = None,
+                      monthly_income: Optional[float] = None, currency: str = 'USD') -> None:
+        """Queue a profile upsert, replacing any upsert still pending for the user"""
+        self._profiles[user_id] = (
+            user_id, username, first_name, last_name,
+            current_city, current_country, current_occupation,
+            monthly_income, currency
+        )
+        # A cached row, or the absence of one, is out of date from now on,
+        # and so is any database read already under way
+        invalidate_profile(user_id)
+        self._queued()
+
+    def queue_simulation(self, user_id: int, simulation_type: str, source_city: str,
+                         target_city: str, source_occupation: Optional[str] = None,
+                         target_occupation: Optional[str] = None) -> None:
+        """Queue a simulation record, timestamped now rather than when written"""
+        self._simulations.append((
+            user_id, simulation_type, source_city, target_city,
+            source_occupation, target_occupation, datetime.now()
+        ))
+        self._queued()
+
+    async def _write_batch(self, profiles: Dict[int, Tuple],
+                           simulations: List[Tuple]) -> Tuple[Dict[int, Tuple], int]:
+        """Write every row in one statement per table; returns the profiles and simulations written"""
+        written = len(simulations)
+        async with get_user_db_connection() as conn:
+            async with conn.transaction(), conn.cursor() as cur:
+                if profiles:
+                    await cur.execute(UPSERT_PROFILES, _columns(list(profiles.values())))
+                if simulations:
+                    await cur.execute(INSERT_SIMULATIONS, _columns(simulations))
+                    written = cur.rowcount
+        return profiles, written
+
+    async def _write_rows(self, profiles: Dict[int, Tuple],
+                          simulations: List[Tuple]) -> Tuple[Dict[int, Tuple], int]:
+        """
+        Write the rows one by one, dropping those the database rejects;
+        returns the profiles and simulations written. Losing the
+        connection still fails the whole batch, as no row is at fault.
+        """
+        stored: Dict[int, Tuple] = {}
+        written = 0
+        async with get_user_db_connection() as conn:
+            async with conn.transaction(), conn.cursor() as cur:
+                for user_id, row in profiles.items():
+                    try:
+                        # Nested transaction blocks are savepoints
+                        async with conn.transaction():
+                            await cur.execute(UPSERT_PROFILES, _columns([row]))
+                        stored[user_id] = row
+                    except psycopg.OperationalError:
+                        raise
+                    except psycopg.Error as e:
+                        self.profiles_rejected += 1
+                        logger.error("Dropped the profile of user %s, rejected: %s", user_id, e)
+                for row in simulations:
+                    try:
+                        async with conn.transaction():
+                            await cur.execute(INSERT_SIMULATIONS, _columns([row]))
+                        written += cur.rowcount
+                    except psycopg.OperationalError:
+                        raise
+                    except psycopg.Error as e:
+                        self.simulations_rejected += 1
+                        logger.error("Dropped a simulation of user %s, rejected: %s", row[0], e)
+        return stored, written
+
+    async def flush(self) -> None:
+        """Write everything pending in one transaction"""
+        async with self._flush_lock:
+            profiles, self._profiles = self._profiles, {}
+            simulations, self._simulations = self._simulations, []
+            if not profiles and not simulations:
+                return
+            self._inflight = profiles
+
+            rejected = self.simulations_rejected
+            try:
+                if self._failures < self.max_attempts:
+                    stored, written = await self._write_batch(profiles, simulations)
+                else:
+                    # The batch keeps failing: find the rows at fault
+                    stored, written = await self._write_rows(profiles, simulations)
+            except Exception as e:
+                self._failures += 1
+                logger.error(
+                    "Error writing %s profiles and %s simulations (attempt %s): %s",
+                    len(profiles), len(simulations), self._failures, e
+                )
+                self._requeue(profiles, simulations)
+                self._inflight = {}
+                return
+            self._failures = 0
+            skipped = len(simulations) - written - (self.simulations_rejected - rejected)
+            if skipped:
+                logger.warning("Skipped %s simulations of users without a profile", skipped)
+
+            # Until now reads were served from the pending profiles; the
+            # cached rows read before those were queued are out of date
+            for user_id in profiles:
+                invalidate_profile(user_id)
+            self._inflight = {}
+            self.flushes += 1
+            self.profiles_written += len(stored)
+            self.simulations_written += written
+            logger.debug("Wrote %s profiles and %s simulations", len(profiles), len(simulations))
+
+    def _requeue(self, profiles: Dict[int, Tuple], simulations: List[Tuple]) -> None:
+        """
+        Put a failed batch back, ahead of anything queued since, keeping
+        at most max_pending profiles and max_pending simulations
+        """
+        # Upserts queued since replace the failed ones of the same users
+        profiles = dict(profiles)
+        profiles.update(self._profiles)
+        excess = len(profiles) - self.max_pending
+        if excess > 0:
+            for user_id in list(profiles)[:excess]:
+                del profiles[user_id]
+            self.profiles_dropped += excess
+            logger.error("Dropped %s profiles, too many pending writes", excess)
+        self._profiles = profiles
+
+        self._simulations[:0] = simulations
+        excess = len(self._simulations) - self.max_pending
+        if excess > 0:
+            del self._simulations[:excess]
+            self.simulations_dropped += excess
+            logger.error("Dropped %s simulations, too many pending writes", excess)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """Start flushing in the background"""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background flushes and write what is still pending"""
+        if self._task is not None:
+            # Let the loop finish the batch it may be writing, rather than
+            # cancelling it halfway through
+            self._stopping = True
+            self._batch_ready.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+# Created on first use, inside the running event loop
+_writer: Optional[UserDataWriter] = None
+
+def get_user_writer() -> UserDataWriter:
+    """Return the shared write-behind buffer"""
+    global _writer
+    if _writer is None:
+        _writer = UserDataWriter()
+    return _writer
+
+def start_user_writer() -> None:
+    """Start background flushes of the shared buffer"""
+    get_user_writer().start()
+
+async def stop_user_writer() -> None:
+    """Stop background flushes and write everything still pending"""
+    if _writer is not None:
+        await _writer.stop()
+
+callback_metric(
+    'shakespr_user_writes_pending',
+    'Profile upserts and simulation records waiting to be written',
+    'gauge', lambda: _writer.pending() if _writer is not None else 0
+)
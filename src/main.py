@@ -1,22 +1,56 @@
 # src/main.py
 import os
+from functools import partial
 from pathlib import Path
 from dotenv import load_dotenv
-from telegram.ext import ApplicationBuilder, CommandHandler
-from src.utils.logging import setup_logging, logger
-from src.bot.handlers.profile import get_profile_handler
-from src.bot.handlers.relocation import get_relocation_handler
+from telegram import Bot
+from telegram.ext import Application, ApplicationBuilder, CommandHandler
 
-# Load environment variables
+# Load environment variables before importing src modules, as several of
+# them read their configuration when imported
 env_path = Path(__file__).parent.parent / 'config' / '.env'
 load_dotenv(dotenv_path=env_path)
 
+from src.utils.logging import setup_logging, logger
+from src.utils.database import init_db_pools, close_db_pools
+from src.utils.metrics import METRICS_CONFIG, start_metrics_server, stop_metrics_server, timed
+from src.data.numbeo.analysis import load_cost_index
+from src.data.numbeo.scraper import close_scraper_session
+from src.data.numbeo.snapshot import SNAPSHOT_CONFIG, close_city_snapshot, load_city_snapshot
+from src.data.users.writer import start_user_writer, stop_user_writer
+from src.bot.handlers import HANDLER_SECONDS
+from src.bot.handlers.afford import get_afford_handler
+from src.bot.handlers.cities import get_city_search_handler
+from src.bot.handlers.profile import get_profile_handler
+from src.bot.handlers.relocation import get_relocation_handler
+from src.bot.jobs import schedule_jobs
+from src.bot.webhook import run_webhook
+from src.bot.persistence import PostgresPersistence
+from src.bot.request import InstrumentedRequest
+
 # Setup logging
 logger = setup_logging()
 
+# Bot configuration
+BOT_CONFIG = {
+    # 'polling' or 'webhook' (see src/bot/webhook.py for its settings)
+    'mode': os.getenv('BOT_MODE', 'polling'),
+    # Number of updates processed at the same time, per process
+    'concurrent_updates': int(os.getenv('BOT_CONCURRENT_UPDATES', '1')),
+    # 'postgres' keeps conversations and user_data in the user database,
+    # 'memory' loses them on restart
+    'persistence': os.getenv('BOT_PERSISTENCE', 'postgres'),
+    # Bot API server, e.g. a local one; empty for api.telegram.org
+    'api_base_url': os.getenv('TELEGRAM_API_BASE_URL', ''),
+}
+
+# Update types the bot has handlers for
+ALLOWED_UPDATES = ["message", "callback_query", "inline_query"]
+
+@timed(HANDLER_SECONDS, handler='start')
 async def start(update, context):
     """Handle the /start command"""
-    logger.info(f"Start command received from user {update.effective_user.id}")
+    logger.info("Start command received from user %s", update.effective_user.id)
     await update.message.reply_text(
         "👋 Welcome to Shakespr - Your AI-Empowered Life Path Simulator!\n\n"
         "I can help you simulate life decisions like:\n"
@@ -25,18 +59,109 @@ async def start(update, context):
         "To get started, use /profile to set up your profile."
     )
 
+@timed(HANDLER_SECONDS, handler='help')
 async def help(update, context):
     """Handle the /help command"""
-    logger.info(f"Help command received from user {update.effective_user.id}")
+    logger.info("Help command received from user %s", update.effective_user.id)
     await update.message.reply_text(
         "🤖 Shakespr Bot Commands:\n\n"
         "/start - Start the bot\n"
         "/profile - Set up or update your profile\n"
         "/relocate - Simulate relocating to a new city\n"
+        "/afford - Find the cities your income covers\n"
         "/career - Explore career transitions\n"
         "/help - Show this help message"
     )
 
+async def post_init(application, metrics_port: int = 0):
+    """Open shared resources once the application is initialized"""
+    logger.info("Opening database connection pools")
+    await init_db_pools()
+    logger.info("Starting user data writer")
+    start_user_writer()
+    if SNAPSHOT_CONFIG['path'] and not load_city_snapshot(SNAPSHOT_CONFIG['path']):
+        logger.warning("No city snapshot at %s yet, reading cities from the database", SNAPSHOT_CONFIG['path'])
+    # Built now, so the first budget search does not wait for it
+    await load_cost_index()
+    await start_metrics_server(metrics_port)
+
+async def post_shutdown(application):
+    """Release shared resources when the application shuts down"""
+    # Before the pools close, so pending profiles and simulations are written
+    logger.info("Flushing user data writer")
+    await stop_user_writer()
+    logger.info("Closing database connection pools")
+    await close_db_pools()
+    logger.info("Closing scraper HTTP session")
+    await close_scraper_session()
+    close_city_snapshot()
+    await stop_metrics_server()
+
+def build_application(run_jobs: bool = True,
+                      metrics_port: int = METRICS_CONFIG['port']) -> Application:
+    """
+    Create the application and register its handlers and jobs. Metrics
+    are served on metrics_port once initialized, unless it is 0.
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(os.getenv('TELEGRAM_BOT_TOKEN'))
+        # Same pool size as the default request, with Bot API call timing
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .concurrent_updates(BOT_CONFIG['concurrent_updates'])
+        .post_init(partial(post_init, metrics_port=metrics_port))
+        .post_shutdown(post_shutdown)
+    )
+    if BOT_CONFIG['api_base_url']:
+        builder = builder.base_url(BOT_CONFIG['api_base_url'])
+    persistent = BOT_CONFIG['persistence'] == 'postgres'
+    if persistent:
+        builder = builder.persistence(PostgresPersistence())
+    application = builder.build()
+
+    # Add handlers
+    logger.info("Registering command handlers")
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help))
+    
+    # Add profile handler
+    logger.info("Registering profile conversation handler")
+    application.add_handler(get_profile_handler(persistent))
+    
+    # Add budget search handler, ahead of the relocation handler, whose
+    # city buttons would otherwise take its button presses
+    logger.info("Registering budget search conversation handler")
+    application.add_handler(get_afford_handler(persistent))
+
+    # Add relocation handler
+    logger.info("Registering relocation conversation handler")
+    application.add_handler(get_relocation_handler(persistent))
+
+    # Add inline city autocomplete
+    logger.info("Registering inline city search handler")
+    application.add_handler(get_city_search_handler())
+
+    # Add background jobs
+    if run_jobs:
+        logger.info("Scheduling background jobs")
+        schedule_jobs(application)
+
+    return application
+
+def build_worker_application(worker_index: int) -> Application:
+    """
+    Application for a webhook worker; only the first one runs background
+    jobs. Each worker serves its own metrics, on the next port up.
+    """
+    metrics_port = METRICS_CONFIG['port'] + worker_index if METRICS_CONFIG['port'] else 0
+    return build_application(run_jobs=worker_index == 0, metrics_port=metrics_port)
+
+def build_bot() -> Bot:
+    """A bare Bot, without handlers, persistence or jobs"""
+    if BOT_CONFIG['api_base_url']:
+        return Bot(os.getenv('TELEGRAM_BOT_TOKEN'), base_url=BOT_CONFIG['api_base_url'])
+    return Bot(os.getenv('TELEGRAM_BOT_TOKEN'))
+
 def main():
     """Start the bot"""
     # Get bot token from environment variables
@@ -46,28 +171,20 @@ def main():
         return
 
     try:
+        if BOT_CONFIG['mode'] == 'webhook':
+            logger.info("Starting bot in webhook mode...")
+            run_webhook(build_worker_application, build_bot, allowed_updates=ALLOWED_UPDATES)
+            return
+
         # Create application
-        application = ApplicationBuilder().token(token).build()
-
-        # Add handlers
-        logger.info("Registering command handlers")
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("help", help))
-        
-        # Add profile handler
-        logger.info("Registering profile conversation handler")
-        application.add_handler(get_profile_handler())
-        
-        # Add relocation handler
-        logger.info("Registering relocation conversation handler")
-        application.add_handler(get_relocation_handler())
+        application = build_application()
 
         # Start the bot
         logger.info("Starting bot...")
-        application.run_polling(allowed_updates=["message", "callback_query"])
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
     except Exception as e:
-        logger.error(f"Error starting bot: {e}", exc_info=True)
+        logger.error("Error starting bot: %s", e, exc_info=True)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,105 @@
+# src/utils/cache.py
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+from src.utils.metrics import callback_metric
+
+V = TypeVar('V')
+
+# Every live cache, for the metrics below
+_caches: 'weakref.WeakSet[TTLCache]' = weakref.WeakSet()
+
+class TTLCache(Generic[V]):
+    """In-process LRU cache with a size bound and per-entry expiry"""
+
+    def __init__(self, name: str, max_size: int, default_ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.name = name
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._clock = clock
+        # key -> (expires_at, value), least recently used first
+        self._entries: 'OrderedDict[Hashable, Tuple[float, V]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        _caches.add(self)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > self._clock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Return the cached value, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        """Store value for ttl seconds, evicting the least recently used entry if full"""
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            # Already expired, make sure no older copy survives
+            self.invalidate(key)
+            return
+        expires_at = float('inf') if ttl is None else self._clock() + ttl
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Drop key from the cache, returning whether it was present"""
+        if self._entries.pop(key, None) is None:
+            return False
+        self.invalidations += 1
+        return True
+
+    def clear(self) -> None:
+        """Drop every entry, keeping the statistics"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
+
+def _cache_stat(stat: str) -> Callable[[], Dict[Tuple[str], float]]:
+    return lambda: {(cache.name,): cache.stats()[stat] for cache in list(_caches)}
+
+callback_metric('shakespr_cache_hits_total', 'Cache lookups answered from the cache',
+                'counter', _cache_stat('hits'), labels=('cache',))
+callback_metric('shakespr_cache_misses_total', 'Cache lookups that missed or found an expired entry',
+                'counter', _cache_stat('misses'), labels=('cache',))
+callback_metric('shakespr_cache_hit_ratio', 'Share of cache lookups answered from the cache',
+                'gauge', _cache_stat('hit_ratio'), labels=('cache',))
+callback_metric('shakespr_cache_entries', 'Entries currently cached',
+                'gauge', _cache_stat('size'), labels=('cache',))
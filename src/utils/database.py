@@ -1,10 +1,14 @@
 # src/utils/database.py
 import os
-import psycopg2
-from contextlib import contextmanager
+import time
+from contextlib import asynccontextmanager
 import logging
 from pathlib import Path
+from typing import Dict, Any, AsyncIterator
 from dotenv import load_dotenv
+from psycopg import AsyncConnection
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from src.utils.metrics import callback_metric, histogram
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -30,53 +34,140 @@ USER_DB_CONFIG = {
     'port': os.getenv('USER_DB_PORT')
 }
 
+# Connection pool configuration, shared by both databases
+DB_POOL_CONFIG = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+    # Seconds a caller waits for a free connection before PoolTimeout
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    # Seconds an idle connection above min_size is kept open
+    'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+    # Seconds after which a connection is recycled
+    'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '3600')),
+}
+
+# Pools are created lazily, one per database
+_pools: Dict[str, AsyncConnectionPool] = {}
+
+DB_ACQUIRE_SECONDS = histogram(
+    'shakespr_db_acquire_seconds',
+    'Time spent waiting for a pooled connection',
+    labels=('database',)
+)
+
+# Shared by the modules querying either database
+DB_QUERY_SECONDS = histogram(
+    'shakespr_db_query_seconds',
+    'Latency of database queries, from execute to the fetched rows',
+    labels=('query',)
+)
+
 def test_config():
     """Print current configuration for debugging"""
     print("Numbeo DB Config:", NUMBEO_DB_CONFIG)
     print("User DB Config:", USER_DB_CONFIG)
+    print("DB Pool Config:", DB_POOL_CONFIG)
+
+def _conninfo_kwargs(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop unset values so libpq falls back to its own defaults"""
+    return {key: value for key, value in config.items() if value}
+
+async def _get_pool(name: str, config: Dict[str, Any]) -> AsyncConnectionPool:
+    """Return the named pool, creating and opening it on first use"""
+    pool = _pools.get(name)
+    if pool is None:
+        pool = AsyncConnectionPool(
+            kwargs=_conninfo_kwargs(config),
+            # Ping connections before handing them out so that
+            # connections dropped by the server are replaced transparently
+            check=AsyncConnectionPool.check_connection,
+            name=name,
+            open=False,
+            **DB_POOL_CONFIG
+        )
+        _pools[name] = pool
+        logger.info("Created %s connection pool: %s", name, DB_POOL_CONFIG)
+    # Safe to call on an already open pool
+    await pool.open()
+    return pool
+
+async def init_db_pools(wait: bool = False) -> None:
+    """Open both connection pools, optionally waiting for min_size connections"""
+    for name, config in (('numbeo', NUMBEO_DB_CONFIG), ('user', USER_DB_CONFIG)):
+        pool = await _get_pool(name, config)
+        if wait:
+            await pool.wait(timeout=DB_POOL_CONFIG['timeout'])
 
-@contextmanager
-def get_numbeo_db_connection():
-    """Context manager for Numbeo database connection"""
-    conn = None
+async def close_db_pools() -> None:
+    """Close all connection pools"""
+    for name, pool in list(_pools.items()):
+        await pool.close()
+        del _pools[name]
+        logger.info("Closed %s connection pool", name)
+
+def get_pool_stats() -> Dict[str, Dict[str, int]]:
+    """Return usage statistics for every open pool"""
+    return {name: pool.get_stats() for name, pool in _pools.items()}
+
+def _pool_gauges() -> Dict[tuple, int]:
+    return {
+        (name, stat): stats.get(stat, 0)
+        for name, stats in get_pool_stats().items()
+        for stat in ('pool_size', 'pool_available', 'requests_waiting')
+    }
+
+callback_metric(
+    'shakespr_db_pool',
+    'Connections in each pool, idle ones, and requests waiting for one',
+    'gauge', _pool_gauges, labels=('database', 'stat')
+)
+
+@asynccontextmanager
+async def get_numbeo_db_connection() -> AsyncIterator[AsyncConnection]:
+    """Async context manager for a pooled Numbeo database connection"""
     try:
-        conn = psycopg2.connect(**NUMBEO_DB_CONFIG)
-        yield conn
+        pool = await _get_pool('numbeo', NUMBEO_DB_CONFIG)
+        start = time.perf_counter()
+        async with pool.connection() as conn:
+            DB_ACQUIRE_SECONDS.observe(time.perf_counter() - start, database='numbeo')
+            yield conn
+    except PoolTimeout as e:
+        logger.error("Timed out waiting for a Numbeo database connection: %s", e)
+        raise
     except Exception as e:
-        logger.error(f"Error connecting to Numbeo database: {e}")
+        logger.error("Error connecting to Numbeo database: %s", e)
         raise
-    finally:
-        if conn is not None:
-            conn.close()
-
-@contextmanager
-def get_user_db_connection():
-    """Context manager for user database connection"""
-    conn = None
+
+@asynccontextmanager
+async def get_user_db_connection() -> AsyncIterator[AsyncConnection]:
+    """Async context manager for a pooled user database connection"""
     try:
-        conn = psycopg2.connect(**USER_DB_CONFIG)
-        yield conn
+        pool = await _get_pool('user', USER_DB_CONFIG)
+        start = time.perf_counter()
+        async with pool.connection() as conn:
+            DB_ACQUIRE_SECONDS.observe(time.perf_counter() - start, database='user')
+            yield conn
+    except PoolTimeout as e:
+        logger.error("Timed out waiting for a user database connection: %s", e)
+        raise
     except Exception as e:
-        logger.error(f"Error connecting to user database: {e}")
+        logger.error("Error connecting to user database: %s", e)
         raise
-    finally:
-        if conn is not None:
-            conn.close()
 
-def init_user_db():
+async def init_user_db():
     """Initialize user database schema"""
     try:
-        with get_user_db_connection() as conn:
-            with conn.cursor() as cur:
+        async with get_user_db_connection() as conn:
+            async with conn.cursor() as cur:
                 # Read and execute schema file
                 schema_path = os.path.join(
                     os.path.dirname(__file__),
                     '../../sql/user_data/schema/init.sql'
                 )
                 with open(schema_path, 'r') as f:
-                    cur.execute(f.read())
-                conn.commit()
+                    await cur.execute(f.read())
+                await conn.commit()
                 logger.info("User database schema initialized successfully")
     except Exception as e:
-        logger.error(f"Error initializing user database: {e}")
+        logger.error("Error initializing user database: %s", e)
         raise
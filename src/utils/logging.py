@@ -1,38 +1,201 @@
 # src/utils/logging.py
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
-import sentry_sdk
+import queue
+from datetime import datetime, timezone
+from fnmatch import fnmatchcase
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import sentry_sdk
 
-# Create logs directory if it doesn't exist
+# Default log file location
 log_dir = Path(__file__).parent.parent.parent / 'data' / 'logs'
-log_dir.mkdir(parents=True, exist_ok=True)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_dir / 'bot.log'),
-        logging.StreamHandler()
-    ]
-)
+
+# Logging and Sentry configuration, read from the environment by
+# setup_logging() once config/.env is loaded
+LOG_CONFIG: Dict[str, str] = {}
+SENTRY_CONFIG: Dict[str, Any] = {}
+
+def read_log_config() -> Dict[str, str]:
+    """Logging configuration"""
+    return {
+        'level': os.getenv('LOG_LEVEL', 'INFO').upper(),
+        # 'text', or 'json' for one JSON object per line
+        'format': os.getenv('LOG_FORMAT', 'text'),
+        # Levels of individual loggers, e.g. "httpx=WARNING,src.data.numbeo=DEBUG"
+        'levels': os.getenv('LOG_LEVELS', 'httpx=WARNING'),
+        # Empty to log to the console only
+        'file': os.getenv('LOG_FILE', str(log_dir / 'bot.log')),
+    }
+
+def read_sentry_config() -> Dict[str, Any]:
+    """Sentry configuration, used when SENTRY_DSN is set"""
+    return {
+        'dsn': os.getenv('SENTRY_DSN'),
+        'environment': os.getenv('ENVIRONMENT', 'development'),
+        # Share of transactions traced when no rule matches
+        'traces_sample_rate': float(os.getenv('SENTRY_TRACES_SAMPLE_RATE', '0.05')),
+        # Rates by transaction name pattern, first match wins,
+        # e.g. "refresh_hot_cities=1.0,*health*=0"
+        'traces_sample_rules': os.getenv('SENTRY_TRACES_SAMPLE_RULES', ''),
+    }
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for a listener in the same process. Only the message is
+    merged on the caller's thread, so arguments are captured as they were;
+    formatting, tracebacks included, is left to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Parse "logger=LEVEL,..." into a mapping of logger names to levels"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+def create_handlers(log_file: Optional[str], log_format: str) -> List[logging.Handler]:
+    """The handlers doing the actual I/O: console, and a file if configured"""
+    formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+def create_queue_handler(
+    handlers: List[logging.Handler]
+) -> Tuple[logging.Handler, logging.handlers.QueueListener]:
+    """A queue handler and the listener thread writing its records to handlers"""
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    return LocalQueueHandler(records), listener
+
+def _configure_logging() -> Tuple[logging.Handler, logging.handlers.QueueListener]:
+    """
+    Route all records through a queue, so the event loop never waits for
+    the console or the disk; a listener thread does the writing
+    """
+    handlers = create_handlers(LOG_CONFIG['file'], LOG_CONFIG['format'])
+    queue_handler, listener = create_queue_handler(handlers)
+    root = logging.getLogger()
+    root.setLevel(LOG_CONFIG['level'])
+    root.addHandler(queue_handler)
+    for name, level in parse_levels(LOG_CONFIG['levels']).items():
+        logging.getLogger(name).setLevel(level)
+    listener.start()
+    return queue_handler, listener
+
+# Set up by setup_logging()
+_queue_handler: Optional[logging.Handler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_configured = False
+
+def stop_logging() -> None:
+    """
+    Write out queued records and stop the listener thread. Later records
+    are written directly, so nothing logged during exit is lost.
+    """
+    global _listener
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    _listener = None
+
+atexit.register(stop_logging)
 
 # Create logger
 logger = logging.getLogger('shakespr')
 
+def parse_sample_rules(spec: str) -> List[Tuple[str, float]]:
+    """Parse "pattern=rate,..." into (pattern, rate) pairs, keeping their order"""
+    rules = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        pattern, _, rate = item.rpartition('=')
+        rules.append((pattern.strip(), float(rate)))
+    return rules
+
+def make_traces_sampler(default_rate: float,
+                        rules: List[Tuple[str, float]]) -> Callable[[Dict[str, Any]], float]:
+    """Sentry traces_sampler applying the first rule matching the transaction name"""
+    def traces_sampler(sampling_context: Dict[str, Any]) -> float:
+        # Follow the decision already taken for a distributed trace
+        parent_sampled = sampling_context.get('parent_sampled')
+        if parent_sampled is not None:
+            return float(parent_sampled)
+        name = (sampling_context.get('transaction_context') or {}).get('name') or ''
+        for pattern, rate in rules:
+            if fnmatchcase(name, pattern):
+                return rate
+        return default_rate
+    return traces_sampler
+
 def setup_logging():
-    """Initialize logging configuration"""
+    """
+    Initialize logging and Sentry from the environment, so call it after
+    config/.env is loaded. Later calls only return the logger.
+    """
+    global _queue_handler, _listener, _configured
+    if _configured:
+        return logger
+    _configured = True
+    LOG_CONFIG.update(read_log_config())
+    SENTRY_CONFIG.update(read_sentry_config())
+    _queue_handler, _listener = _configure_logging()
+
     # Initialize Sentry if DSN is provided
-    sentry_dsn = os.getenv('SENTRY_DSN')
-    if sentry_dsn:
+    if SENTRY_CONFIG['dsn']:
         sentry_sdk.init(
-            dsn=sentry_dsn,
-            traces_sample_rate=1.0,
-            environment=os.getenv('ENVIRONMENT', 'development')
+            dsn=SENTRY_CONFIG['dsn'],
+            traces_sampler=make_traces_sampler(
+                SENTRY_CONFIG['traces_sample_rate'],
+                parse_sample_rules(SENTRY_CONFIG['traces_sample_rules'])
+            ),
+            environment=SENTRY_CONFIG['environment']
         )
-    
+
     return logger
 
 # Export logger for use in other modules
-__all__ = ['logger', 'setup_logging']
+__all__ = ['logger', 'setup_logging', 'stop_logging']
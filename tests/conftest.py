@@ -0,0 +1,13 @@
+# tests/conftest.py
+import pytest
+
+from src.data.numbeo import scraper
+
+@pytest.fixture
+def scraper_config():
+    """SCRAPER_CONFIG without politeness delays, restored after the test"""
+    saved = dict(scraper.SCRAPER_CONFIG)
+    scraper.SCRAPER_CONFIG.update(min_delay=0, max_delay=0)
+    yield scraper.SCRAPER_CONFIG
+    scraper.SCRAPER_CONFIG.clear()
+    scraper.SCRAPER_CONFIG.update(saved)
@@ -0,0 +1,142 @@
+# tests/test_scraper.py
+"""Scraper outcomes, timeouts and session handling, against the local Numbeo stub"""
+import asyncio
+import time
+
+from benchmarks.stub_numbeo import StubNumbeoServer
+from src.data.numbeo import scraper
+
+def scrape(city, polite=False, **stub_options):
+    """Scrape one city from a stub started with stub_options"""
+    async def run():
+        async with StubNumbeoServer(**stub_options) as stub:
+            scraper.SCRAPER_CONFIG['base_url'] = stub.base_url
+            try:
+                return await scraper.scrape_city(city, polite)
+            finally:
+                await scraper.close_scraper_session()
+    return asyncio.run(run())
+
+def test_ok(scraper_config):
+    outcome, data = scrape('Berlin')
+    assert outcome == 'ok'
+    assert data['rent']['apt_one_bdrm_ctr'] > 0
+    assert data['restaurant']['cheap_meal_for_one'] > 0
+
+def test_scrape_city_data_returns_the_data(scraper_config):
+    async def run():
+        async with StubNumbeoServer() as stub:
+            scraper.SCRAPER_CONFIG['base_url'] = stub.base_url
+            try:
+                return await scraper.scrape_city_data('new york', polite=False)
+            finally:
+                await scraper.close_scraper_session()
+    data = asyncio.run(run())
+    assert data['transportation']['monthly_transit_pass'] > 0
+
+def test_not_found(scraper_config):
+    assert scrape('Atlantis') == ('not_found', None)
+    assert 'not_found' in scraper.NOT_AVAILABLE
+
+def test_no_table(scraper_config, tmp_path):
+    (tmp_path / 'Nowhere.html').write_text("<html><body><p>No costs yet</p></body></html>")
+    assert scrape('Nowhere', fixtures_dir=tmp_path) == ('no_table', None)
+
+def test_empty_table(scraper_config, tmp_path):
+    (tmp_path / 'Nowhere.html').write_text(
+        f"<html><body><table class='{scraper.COST_TABLE_CLASS}'></table></body></html>"
+    )
+    assert scrape('Nowhere', fixtures_dir=tmp_path) == ('empty', None)
+
+def test_timeout(scraper_config):
+    scraper_config['read_timeout'] = 0.2
+
+    async def run():
+        async with StubNumbeoServer(latency=2) as stub:
+            scraper.SCRAPER_CONFIG['base_url'] = stub.base_url
+            try:
+                start = time.monotonic()
+                result = await scraper.scrape_city('Berlin', polite=False)
+                return result, time.monotonic() - start
+            finally:
+                await scraper.close_scraper_session()
+    result, elapsed = asyncio.run(run())
+    assert result == ('timeout', None)
+    # Given up after the read timeout, not after the stub answered
+    assert elapsed < 1.5
+
+def test_http_error(scraper_config):
+    assert scrape('Berlin', statuses={'Berlin': 503}) == ('http_error', None)
+    assert 'http_error' not in scraper.NOT_AVAILABLE
+
+def test_session_uses_the_configured_timeouts(scraper_config):
+    scraper_config.update(connect_timeout=3, read_timeout=7, pool_size=2)
+
+    async def run():
+        session = scraper.get_scraper_session()
+        try:
+            return session.timeout, session.connector.limit
+        finally:
+            await scraper.close_scraper_session()
+    timeout, limit = asyncio.run(run())
+    assert timeout.connect == 3
+    assert timeout.sock_read == 7
+    assert limit == 2
+
+def test_session_is_shared_and_kept_alive(scraper_config):
+    async def run():
+        async with StubNumbeoServer() as stub:
+            scraper.SCRAPER_CONFIG['base_url'] = stub.base_url
+            try:
+                session = scraper.get_scraper_session()
+                outcomes = [(await scraper.scrape_city(city, polite=False))[0]
+                            for city in ('Berlin', 'London', 'Sydney')]
+                return outcomes, session is scraper.get_scraper_session(), stub.connections
+            finally:
+                await scraper.close_scraper_session()
+    outcomes, same_session, connections = asyncio.run(run())
+    assert outcomes == ['ok', 'ok', 'ok']
+    assert same_session
+    # One keep-alive connection for the three requests
+    assert len(connections) == 1
+
+def test_closed_session_is_replaced(scraper_config):
+    async def run():
+        first = scraper.get_scraper_session()
+        await scraper.close_scraper_session()
+        second = scraper.get_scraper_session()
+        await scraper.close_scraper_session()
+        return first, second
+    first, second = asyncio.run(run())
+    assert first is not second
+    assert first.closed
+
+def test_politeness_delay_does_not_block(scraper_config, monkeypatch):
+    scraper_config.update(min_delay=0.05, max_delay=0.05)
+    delays = []
+    sleep = asyncio.sleep
+
+    async def recording_sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        return await sleep(delay, *args, **kwargs)
+
+    def blocking_sleep(_):
+        raise AssertionError("time.sleep blocks the event loop")
+
+    monkeypatch.setattr(asyncio, 'sleep', recording_sleep)
+    monkeypatch.setattr(time, 'sleep', blocking_sleep)
+    assert scrape('Berlin', polite=True)[0] == 'ok'
+    assert 0.05 in delays
+
+def test_impolite_scrapes_skip_the_delay(scraper_config, monkeypatch):
+    scraper_config.update(min_delay=5, max_delay=5)
+    delays = []
+    sleep = asyncio.sleep
+
+    async def recording_sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        return await sleep(delay, *args, **kwargs)
+
+    monkeypatch.setattr(asyncio, 'sleep', recording_sleep)
+    assert scrape('Berlin', polite=False)[0] == 'ok'
+    assert 5 not in delays